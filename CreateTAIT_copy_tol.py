@@ -9,21 +9,20 @@
 #Import some libraries
 import arcpy
 import os
-import urllib2
-import json
-import numpy as np
-import pandas as pd
+
+from tait import apportion, builder, cache, derive, fetch, fips, geometry, geostore, indicators, layout, moe, output, planner, ranking, trace
 
 
 ## SOME VARIABLES YOU MIGHT NEED TO CHANGE ##
 
 # List of dictionaries describing the data you're requesting from the Census API at the BLOCK GROUP geography.
-# This has to be split into two queries because 50 variables is the upper limit for requests to this API.
+# 50 variables is the upper limit for requests to this API, but the list can be as long as needed: the request
+# planner (tait/planner.py) splits it into as few queries as that limit allows.
 # desc_name is a descriptive name of your choosing. This becomes part of the field name. Choose something tidy
 # that will result in a recognizable field name later.
 # census_name is the variable name as described here: https://api.census.gov/data/2019/acs/acs5/variables.html
 
-bg_desired_col1 =    [{'desc_name': 'Total_Pop', 'census_name': 'B01001_001E'},
+bg_desired_columns = [{'desc_name': 'Total_Pop', 'census_name': 'B01001_001E'},
                       {'desc_name': 'NotHispLatino_WhiteAlone', 'census_name': 'B03002_003E'},
                       {'desc_name': 'Hispanic', 'census_name': 'B03002_012E'},
                       {'desc_name': 'TotBlk', 'census_name': 'B02001_003E'},
@@ -61,8 +60,7 @@ bg_desired_col1 =    [{'desc_name': 'Total_Pop', 'census_name': 'B01001_001E'},
                       {'desc_name': 'SpeakAsian_65Over_EnglishVWell', 'census_name': 'B16004_059E'},
                       {'desc_name': 'SpeakOther_65Over', 'census_name': 'B16004_063E'},
                       {'desc_name': 'SpeakOther_65Over_EnglishVWell', 'census_name': 'B16004_064E'},
-                     ]
-bg_desired_col2 =    [{'desc_name': 'Age14Under1', 'census_name': 'B01001_003E'},
+                      {'desc_name': 'Age14Under1', 'census_name': 'B01001_003E'},
                       {'desc_name': 'Age14Under2', 'census_name': 'B01001_004E'},
                       {'desc_name': 'Age14Under3', 'census_name': 'B01001_005E'},
                       {'desc_name': 'Age14Under4', 'census_name': 'B01001_027E'},
@@ -108,22 +106,99 @@ tract_desired_columns = [{'desc_name': 'TotPopTract', 'census_name': 'B18101_001
                          {'desc_name': 'FemDisab65to74', 'census_name': 'B18101_035E'},
                          {'desc_name': 'FemDisab75over', 'census_name': 'B18101_038E'}
                         ]
+
+# List of dictionaries describing fields derived from the variables above. name becomes the field name and formula
+# is a sum or difference of census variables, field names or other derived fields. sum(B01001_020..025, 044..049)
+# adds up B01001_020E through B01001_025E and B01001_044E through B01001_049E. Adding an indicator only takes a new
+# entry here; every derived field is calculated in a single pass.
+
+bg_derived_fields = [{'name': 'TotalMin', 'formula': 'B01001_001 - B03002_003'},
+                     {'name': 'BlwPov', 'formula': 'sum(C17002_002..004)'},
+                     {'name': 'SpanishLEP', 'formula': 'B16004_004 - B16004_005 + B16004_026 - B16004_027 + B16004_048 - B16004_049'},
+                     {'name': 'IELEP', 'formula': 'B16004_009 - B16004_010 + B16004_031 - B16004_032 + B16004_053 - B16004_054'},
+                     {'name': 'AsianLEP', 'formula': 'B16004_014 - B16004_015 + B16004_036 - B16004_037 + B16004_058 - B16004_059'},
+                     {'name': 'OtherLEP', 'formula': 'B16004_019 - B16004_020 + B16004_041 - B16004_042 + B16004_063 - B16004_064'},
+                     {'name': 'TotalLEP', 'formula': 'SpanishLEP + IELEP + AsianLEP + OtherLEP'},
+                     {'name': 'Age65Over', 'formula': 'sum(B01001_020..025, 044..049)'},
+                     {'name': 'Age14Under', 'formula': 'sum(B01001_003..005, 027..029)'},
+                     {'name': 'TotalFHH', 'formula': 'B11005_007 + B11005_010'},
+                     {'name': 'NoCar', 'formula': 'B25044_003 + B25044_010'}
+                    ]
+
+tract_derived_fields = [{'name': 'WholeTract_PWD', 'formula': 'sum(B18101_004, 007, 010, 013, 016, 019, 023, 026, 029, 032, 035, 038)'}
+                       ]
+
+# List of dictionaries describing tract fields shared out among each tract's block groups. name becomes the block
+# group field, source is the tract field and weight the block group field it is shared out by (Total_Pop, TotalHH or
+# the block group universe that matches source). A tract's block groups always add back up to the tract's value.
+
+bg_apportioned_fields = [{'name': 'Sum_PWD', 'source': 'WholeTract_PWD', 'weight': 'Total_Pop'}
+                        ]
       
 ## VARIABLES YOU PROBABLY WON'T NEED TO CHANGE ##
 
 # Default output location for geoprocessing tools should be the 'in memory' workspace to keep clutter down and speed up execution.
 arcpy.env.workspace = 'in_memory'
 
-# All outputs will be in NAD 83 Texas State Plane North Central.
-arcpy.env.outputCoordinateSystem = arcpy.SpatialReference(2276)
+# All outputs will be in NAD 83 Texas State Plane North Central. Land area is measured in this CRS too.
+output_crs = 2276
+arcpy.env.outputCoordinateSystem = arcpy.SpatialReference(output_crs)
+
+# Tools used for the geography steps: 'arcpy' for the ArcGIS tools, or 'geopandas' to load, join, measure and write
+# the geography with GeoPandas (output goes to a GeoPackage instead of a file geodatabase). The geopandas backend
+# reads shapefiles, GeoPackages and geodatabase feature classes, not .lyr files.
+geometry_backend = 'arcpy'
 
 # Allows ArcGIS tools to overwrite existing output.
 arcpy.env.overwriteOutput = True
 
+# State FIPS code the script will request from the API.
+state = '48'
+
 # List of county FIPS codes the script will request from the API. Also clips the input
 # block group and tract geographies.
 counties = ['085','113','121','139','143','221','231','251','257','349','363','367','397','425','439','497']
 
+# Maximum number of Census API requests sent at the same time, and the number of seconds to wait on any one of them.
+max_requests = 8
+request_timeout = 60
+
+# Whether tract tables are requested once for the whole state and filtered down to the counties list (True),
+# once per county (False), or whichever needs fewer requests for the size of the counties list (None).
+state_wide_tracts = None
+
+# Folder where Census API responses are cached between runs. Published ACS vintages never change, so reruns for
+# the same year are answered from this folder without going back to the API. Set refresh_cache to True to
+# download everything again, and cache_size_mb caps how much disk the folder may use.
+cache_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'census_cache')
+cache_size_mb = 500
+refresh_cache = False
+
+# Block group and tract geography already cut down to the counties list is kept in this folder after the first run,
+# so later runs for the same vintage and counties skip reading the whole source layers. A changed source layer is
+# read again. Set to None to always read the sources.
+geography_cache_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geography_cache')
+
+# Formats the final block group and tract tables are written in: any of 'parquet', 'feather' and 'csv'. Parquet and
+# Feather keep every field's type and need pyarrow. Add 'csv' for a plain text copy; nothing else reads it.
+output_formats = ['parquet']
+
+# Set to True to time every stage and API request. The timings are written next to the outputs as
+# TAIT_<year>ACS_trace.json (Chrome trace format; open it in chrome://tracing or ui.perfetto.dev) and summarised in
+# the tool messages at the end of the run.
+trace_run = False
+
+# Set to True to keep the tables in a compact layout while they are calculated: counts in the smallest unsigned
+# integer type that holds them, State and County as categories, GEOIDs as packed integers and the Pct_/Rat_ fields as
+# float32 (about 7 significant digits). The tool messages report the megabytes saved for each table. The GEOIDs are
+# written out as text as before.
+compact_tables = False
+
+# Set to True to also request the margin of error of every estimate (the ...M variables) in the same requests. The
+# margins are carried through the derived, apportioned, Pct_ and Rat_ fields with the Census Bureau's approximation
+# formulas and written next to each field as <field>_MOE.
+margins_of_error = False
+
 ## VARIABLES POPULATED BY THE TOOL INTERFACE ##
 
 #"GetParameterAsText" is used to pull values that the user specifies before the tool is run.
@@ -162,207 +237,78 @@ tract_countyfield = arcpy.GetParameterAsText(7)
 
 ## INITIALIZE BLOCK GROUP AND TRACT LAYERS - EXECUTION BEGINS HERE ##
 
+if trace_run:
+    trace.start()
+
 #Makes copies of bg and tract geography from input layers including only GEOID field for later joining.
 
-countywhere = "{} IN (".format(bg_countyfield)
-for county in counties:
-    countywhere = countywhere + "'{}',".format(county)
-countywhere = countywhere[:-1] + ")"
+geography_store = geostore.GeographyStore(geography_cache_folder) if geography_cache_folder else None
+spatial = geometry.get_backend(geometry_backend, crs=output_crs, message=arcpy.AddMessage, store=geography_store)
 
 for fc in [[bg_lyr,'bg',bg_geoidfield,bg_countyfield],[tract_lyr,'tract',tract_geoidfield,tract_countyfield]]:
-    arcpy.AddMessage('Loading {} geography...'.format(fc[1]))
-
-    countywhere = "{} IN (".format(fc[3])
-    for county in counties:
-        countywhere = countywhere + "'{}',".format(county)
-    countywhere = countywhere[:-1] + ")"
-
-    fieldmappings = arcpy.FieldMappings()
-    fieldmap = arcpy.FieldMap()
-    fieldmap.addInputField(fc[0],fc[2])
-    fieldmappings.addFieldMap(fieldmap)
-    arcpy.FeatureClassToFeatureClass_conversion(fc[0],arcpy.env.workspace,fc[1],countywhere,fieldmappings)
-
-## TRACT API CALL ##
-
-# Initializes list of column names to be inserted into URL for TRACT API call.
-df_init_columns = []
-census_column_names = ''
-
-for x in tract_desired_columns:
-    df_init_columns.append('{}'.format(x['desc_name']))
-    census_column_names = census_column_names + x['census_name'] + ','
-
-df_init_columns.extend(['State','County','Tract'])
-census_column_names = census_column_names[:-1]
+    spatial.load(fc[0], fc[1], fc[2], fc[3], counties, vintage=year)
 
-# Establishes empty pandas dataframe to load data from API into.
-arcpy.AddMessage("Creating initial empty dataframe for tracts...")
-results_pd_all_tract = pd.DataFrame(columns = df_init_columns)
+## CENSUS API CALLS ##
 
-# Iterates through each county in counties list to connect to the URL, download the results in JSON format, and insert them into the empty data frame.
-for county in counties:
-    arcpy.AddMessage("Processing county {}...".format(county))
+# Stops here, before any requests are sent, if a county is not in the county name table.
+fips.county_names(state, counties)
 
-    url = 'https://api.census.gov/data/{}/acs/acs5?get={}&in=state:48%20county:{}&for=tract'.format(year,census_column_names,county)
+response_cache = cache.ResponseCache(cache_folder, max_bytes=cache_size_mb * 1024 * 1024, refresh=refresh_cache)
 
-    arcpy.AddMessage("Requesting URL...")
-    apicall = urllib2.urlopen(url)
+# Packs the block group and tract variables into as few requests as the API's variable limit allows.
+# Tract tables may be requested for the whole state at once and cut down to the counties list (see state_wide_tracts).
+request_concepts = [[bg_desired_columns, 'block group'], [tract_desired_columns, 'tract']]
+if margins_of_error:
+    request_concepts = [[moe.with_moe(specs), level] for specs, level in request_concepts]
+request_plan = planner.plan_requests(request_concepts, state=state, counties=counties, state_wide=state_wide_tracts)
 
-    arcpy.AddMessage("Loading results text...")
-    results = apicall.read()
+# Sends every planned request at the same time. Results come back per planned chunk as a list of JSON rows
+# for each of its requests, in the same order as the counties list.
+plan_results = fetch.fetch_plan(year, state, counties, request_plan,
+                                message=arcpy.AddMessage,
+                                max_workers=max_requests,
+                                timeout=request_timeout,
+                                cache=response_cache)
 
-    arcpy.AddMessage("Parsing into json...")
-    results_json = json.loads(results)[1:]
+## LOAD API RESULTS ##
 
-    arcpy.AddMessage("Loading JSON into Pandas dataframe...")
-    results_pd = pd.DataFrame(columns = df_init_columns, data = results_json)
+# Builds one dataframe per geography from every request's JSON results, with GEOIDs concatenated from the
+# State, County, Tract, and BG FIPS codes. Variables are parsed straight into integer columns; null or annotated
+# values (e.g. -666666666) are replaced with 0 and reported.
+results_frames = builder.load_plan(request_plan, plan_results, message=arcpy.AddMessage)
 
-    results_pd_all_tract = results_pd_all_tract.append(results_pd)
+results_pd_all_tract = results_frames['tract']
+results_pd_notract_bg = results_frames['block group']
 
-#Establish a new column in the dataframe with a concatenated GEOID from State, County, and Tract FIPS codes.
-arcpy.AddMessage("Calculating tract geoid for all counties...")
-results_pd_all_tract['Tract_GEOID'] = results_pd_all_tract['State'] + results_pd_all_tract['County'] + results_pd_all_tract['Tract']
+if compact_tables:
+    results_pd_all_tract = layout.compact(results_pd_all_tract, 'tract', message=arcpy.AddMessage)
+    results_pd_notract_bg = layout.compact(results_pd_notract_bg, 'block group', message=arcpy.AddMessage)
 
 ## TRACT CALCULATIONS AND REFORMATTING ##
 
 arcpy.AddMessage('Usings Pandas to calculate and reorder fields (Tracts)...')
 
-for col in list(results_pd_all_tract.columns):
-    if col not in ['Tract_GEOID','County']:
-        results_pd_all_tract[col] = results_pd_all_tract[col].astype('int64')
-
-results_pd_all_tract['WholeTract_PWD'] = 0
-for gender in ['Male','Fem']:
-    for age in ['Under5','5to17','18to34','35to64','65to74','75over']:
-        results_pd_all_tract['WholeTract_PWD'] = results_pd_all_tract['WholeTract_PWD'] + results_pd_all_tract['{}Disab{}'.format(gender,age)]
-
-
-## BLOCK GROUP API CALL 1 ##
-   
-# Initializes list of column names to be inserted into URL for BLOCK GROUP API call.
-df_init_columns = []
-census_column_names = ''
-
-for x in bg_desired_col1:
-    df_init_columns.append('{}'.format(x['desc_name']))
-    census_column_names = census_column_names + x['census_name'] + ','
-
-df_init_columns.extend(['State','County','Tract','BG'])
-census_column_names = census_column_names[:-1]
-
-# Establishes empty pandas dataframe to load data from BLOCK GROUP API call into.
-arcpy.AddMessage("Creating initial empty dataframe for block groups...")
-results_pd_all_bg1 = pd.DataFrame(columns = df_init_columns)
-
-# Iterates through each county in counties list to connect to the URL, download the results in JSON format, and insert them into the empty data frame.
-for county in counties:
-    arcpy.AddMessage("Processing county {}...".format(county))
-
-    url = 'https://api.census.gov/data/{}/acs/acs5?get={}&in=state:48%20county:{}&for=block%20group'.format(year,census_column_names,county)
-
-    arcpy.AddMessage("Requesting URL...")
-    
-    apicall = urllib2.urlopen(url)
-
-    arcpy.AddMessage("Loading results text...")
-    results = apicall.read()
-
-    arcpy.AddMessage("Parsing into json...")
-    results_json = json.loads(results)[1:]
-
-    arcpy.AddMessage("Loading JSON into Pandas dataframe...")
-    results_pd = pd.DataFrame(columns = df_init_columns, data = results_json)
-
-    results_pd_all_bg1 = results_pd_all_bg1.append(results_pd)
-
-#Establish a new column in the dataframe with a concatenated GEOID from State, County, Tract, and BG FIPS codes.
-arcpy.AddMessage("Calculating tract geoid for all counties...")
-results_pd_all_bg1['GEOID'] = results_pd_all_bg1['State'] + results_pd_all_bg1['County'] + results_pd_all_bg1['Tract'] + results_pd_all_bg1['BG']
+results_pd_all_tract = derive.derive(results_pd_all_tract, tract_derived_fields, tract_desired_columns)
 
-## BLOCK GROUP API CALL 2 ##
-   
-# Initializes list of column names to be inserted into URL for BLOCK GROUP API call.
-df_init_columns = []
-census_column_names = ''
-
-for x in bg_desired_col2:
-    df_init_columns.append('{}'.format(x['desc_name']))
-    census_column_names = census_column_names + x['census_name'] + ','
-
-df_init_columns.extend(['State','County','Tract','BG'])
-census_column_names = census_column_names[:-1]
-
-# Establishes empty pandas dataframe to load data from BLOCK GROUP API call into.
-arcpy.AddMessage("Creating initial empty dataframe for block groups...")
-results_pd_all_bg2 = pd.DataFrame(columns = df_init_columns)
-
-# Iterates through each county in counties list to connect to the URL, download the results in JSON format, and insert them into the empty data frame.
-for county in counties:
-    arcpy.AddMessage("Processing county {}...".format(county))
-
-    url = 'https://api.census.gov/data/{}/acs/acs5?get={}&in=state:48%20county:{}&for=block%20group'.format(year,census_column_names,county)
-
-    arcpy.AddMessage("Requesting URL...")
-    apicall = urllib2.urlopen(url)
-
-    arcpy.AddMessage("Loading results text...")
-    results = apicall.read()
-
-    arcpy.AddMessage("Parsing into json...")
-    results_json = json.loads(results)[1:]
-
-    arcpy.AddMessage("Loading JSON into Pandas dataframe...")
-    results_pd = pd.DataFrame(columns = df_init_columns, data = results_json)
-
-    results_pd_all_bg2 = results_pd_all_bg2.append(results_pd)
-
-#Establish a new column in the dataframe with a concatenated GEOID from State, County, Tract, and BG FIPS codes.
-arcpy.AddMessage("Calculating tract geoid for all counties...")
-results_pd_all_bg2['GEOID'] = results_pd_all_bg2['State'] + results_pd_all_bg2['County'] + results_pd_all_bg2['Tract'] + results_pd_all_bg2['BG']
-results_pd_all_bg2['Tract_GEOID'] = results_pd_all_bg2['State'] + results_pd_all_bg2['County'] + results_pd_all_bg2['Tract']
-
-
-#Join the two BG-level data frames together.
-results_pd_notract_bg = pd.merge(results_pd_all_bg1,results_pd_all_bg2,on='GEOID')
 
 #Join tract-level PWD data to block groups.
-results_pd_all_bg = pd.merge(results_pd_notract_bg,results_pd_all_tract,on='Tract_GEOID',how='left',suffixes=('_x','_y'))
+results_pd_all_bg = builder.attach_parent(results_pd_notract_bg, results_pd_all_tract, 'block group')
 
 ## BLOCK GROUP CALCULATIONS AND REFORMATTING ##
 
 arcpy.AddMessage('Usings Pandas to calculate and reorder fields (Block Groups)...')
 
-for col in list(results_pd_all_bg.columns):
-    if col not in ['GEOID','County_x']:
-        results_pd_all_bg[col] = results_pd_all_bg[col].astype('int64')
-
-results_pd_all_bg['TotalMin'] = results_pd_all_bg['Total_Pop'] - results_pd_all_bg ['NotHispLatino_WhiteAlone']
+results_pd_all_bg = derive.derive(results_pd_all_bg, bg_derived_fields, bg_desired_columns)
 
-results_pd_all_bg['BlwPov'] = results_pd_all_bg['BlwPov_Under50'] + results_pd_all_bg['BlwPov_50to99'] + results_pd_all_bg['BlwPov_100to124']
+results_pd_all_bg = apportion.apportion(results_pd_all_bg, results_pd_all_tract, bg_apportioned_fields, 'block group', message=arcpy.AddMessage)
 
-results_pd_all_bg['TotalLEP'] = 0
-for language in ['Spanish','IE','Asian','Other']:
-    results_pd_all_bg['{}LEP'.format(language)] = 0
-    for age in ['5_17','18_64','65Over']:
-        results_pd_all_bg['{}LEP'.format(language)] += (results_pd_all_bg['Speak{}_{}'.format(language,age)] - results_pd_all_bg['Speak{}_{}_EnglishVWell'.format(language,age)])
-    results_pd_all_bg['TotalLEP'] += results_pd_all_bg['{}LEP'.format(language)]
-
-results_pd_all_bg['Age65Over'] = 0
-for i in range(1,12+1):
-    results_pd_all_bg['Age65Over'] += results_pd_all_bg['Age65Over{}'.format(str(i))]
-
-results_pd_all_bg['Age14Under'] = 0
-for i in range(1,6+1):
-    results_pd_all_bg['Age14Under'] += results_pd_all_bg['Age14Under{}'.format(str(i))]
-
-results_pd_all_bg['TotalFHH'] = results_pd_all_bg['FHH_Family'] + results_pd_all_bg['FHH_NonFamily']
-
-results_pd_all_bg['NoCar'] = results_pd_all_bg['ZCHH_Owner'] + results_pd_all_bg['ZCHH_Renter']
-
-results_pd_all_bg['Sum_PWD'] = results_pd_all_bg['WholeTract_PWD'].astype('float64') * (results_pd_all_bg['Total_Pop'].astype('float64') / results_pd_all_bg['TotPopTract'].astype('float64'))
+if compact_tables:
+    results_pd_all_tract = layout.compact(results_pd_all_tract, 'tract', message=arcpy.AddMessage)
+    results_pd_all_bg = layout.compact(results_pd_all_bg, 'block group', message=arcpy.AddMessage)
 
 
+# Percentage and regional ratio fields calculated for each variable. Entries with an 'arp' name also get a True/False
+# flag for block groups at or above the regional percentage.
 calculation_fields = [{'variable': 'TotalMin', 'universe': 'Total_Pop', 'pct': 'Pct_TotMin', 'ratio': 'Rat_TotMin'},
                       {'variable': 'Hispanic', 'universe': 'Total_Pop', 'pct': 'Pct_Hisp', 'ratio': 'Rat_Hisp'},
                       {'variable': 'TotBlk', 'universe': 'Total_Pop', 'pct': 'Pct_TotBlk', 'ratio': 'Rat_TotBlk'},
@@ -371,50 +317,48 @@ calculation_fields = [{'variable': 'TotalMin', 'universe': 'Total_Pop', 'pct': '
                       {'variable': 'Tot_HPI', 'universe': 'Total_Pop', 'pct': 'Pct_TotHPI', 'ratio': 'Rat_TotHPI'},
                       {'variable': 'TotOther', 'universe': 'Total_Pop', 'pct': 'Pct_TotOth', 'ratio': 'Rat_TotOth'},
                       {'variable': 'Tot2Race', 'universe': 'Total_Pop', 'pct': 'Pct_Tot2Ra', 'ratio': 'Rat_Tot2Ra'},
-                      {'variable': 'BlwPov', 'universe': 'TotPSK', 'pct': 'Pct_BlwPov', 'ratio': 'Rat_BlwPov'},
+                      {'variable': 'BlwPov', 'universe': 'TotPSK', 'pct': 'Pct_BlwPov', 'ratio': 'Rat_BlwPov', 'arp': 'ARP_BlwPov'},
                       {'variable': 'TotalLEP', 'universe': 'PopOver5', 'pct': 'Pct_TotLEP', 'ratio': 'Rat_TotLEP'},
                       {'variable': 'SpanishLEP', 'universe': 'PopOver5', 'pct': 'Pct_SpLEP', 'ratio': 'Rat_SpLEP'},
                       {'variable': 'IELEP', 'universe': 'PopOver5', 'pct': 'Pct_IE_LEP', 'ratio': 'Rat_IE_LEP'},
                       {'variable': 'AsianLEP', 'universe': 'PopOver5', 'pct': 'Pct_AsnLEP', 'ratio': 'Rat_AsnLEP'},
                       {'variable': 'OtherLEP', 'universe': 'PopOver5', 'pct': 'Pct_OthLEP', 'ratio': 'Rat_OthLEP'},
-                      {'variable': 'Age65Over', 'universe': 'Total_Pop', 'pct': 'Pct65_Over', 'ratio': 'Rat_65Over'},
+                      {'variable': 'Age65Over', 'universe': 'Total_Pop', 'pct': 'Pct65_Over', 'ratio': 'Rat_65Over', 'arp': 'ARP_65Over'},
                       {'variable': 'TotalFHH', 'universe': 'TotalHH', 'pct': 'Pct_TotFHH', 'ratio': 'Rat_TotFHH'},
                       {'variable': 'NoCar', 'universe': 'TotalHH', 'pct': 'Pct_NoCar', 'ratio': 'Rat_NoCar'},
                       {'variable': 'Age14Under', 'universe': 'Total_Pop', 'pct': 'Pct14_Unde', 'ratio': 'Rat_14Unde'},
                       {'variable': 'TotalVet', 'universe': 'Pop18Over', 'pct': 'Pct_Vet', 'ratio': 'Rat_Vet'},
-                      {'variable': 'Sum_PWD', 'universe': 'Total_Pop', 'pct': 'Pct_PWD', 'ratio':'Rat_PWD'}
+                      {'variable': 'Sum_PWD', 'universe': 'Total_Pop', 'pct': 'Pct_PWD', 'ratio':'Rat_PWD', 'arp': 'ARP_PWD'}
                      ]                      
 
-for field in calculation_fields:
-    results_pd_all_bg[field['pct']] = (results_pd_all_bg[field['variable']] / results_pd_all_bg[field['universe']])
-#    regional_pct = ((np.asarray(results_pd_all_bg.iloc[:,results_pd_all_bg.columns.get_loc(field['variable'])], dtype=np.float64).sum()) / (np.asarray(results_pd_all_bg.iloc[:,results_pd_all_bg.columns.get_loc(field['universe'])], dtype=np.float64).sum()))
-    regional_pct = float(results_pd_all_bg[field['variable']].sum()) / float(results_pd_all_bg[field['universe']].sum())
-    results_pd_all_bg[field['ratio']] = results_pd_all_bg[field['pct']] / regional_pct
-
-results_pd_all_bg.loc[results_pd_all_bg['Rat_65Over'] >= 1.0, 'ARP_65Over'] = 'Y'
-results_pd_all_bg.loc[results_pd_all_bg['Rat_65Over'] < 1.0, 'ARP_65Over'] = 'N'
-
-results_pd_all_bg.loc[results_pd_all_bg['Rat_BlwPov'] >= 1.0, 'ARP_BlwPov'] = 'Y'
-results_pd_all_bg.loc[results_pd_all_bg['Rat_BlwPov'] < 1.0, 'ARP_BlwPov'] = 'N'
-
-results_pd_all_bg.loc[results_pd_all_bg['Rat_PWD'] >= 1.0, 'ARP_PWD'] = 'Y'
-results_pd_all_bg.loc[results_pd_all_bg['Rat_PWD'] < 1.0, 'ARP_PWD'] = 'N'
-
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '085', 'CountyText'] = 'Collin'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '113', 'CountyText'] = 'Dallas'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '121', 'CountyText'] = 'Denton'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '139', 'CountyText'] = 'Ellis'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '221', 'CountyText'] = 'Hood'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '231', 'CountyText'] = 'Hunt'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '251', 'CountyText'] = 'Johnson'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '257', 'CountyText'] = 'Kaufman'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '367', 'CountyText'] = 'Parker'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '397', 'CountyText'] = 'Rockwall'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '439', 'CountyText'] = 'Tarrant'
-results_pd_all_bg.loc[results_pd_all_bg['County_x'] == '497', 'CountyText'] = 'Wise'
+results_pd_all_bg = indicators.compute(results_pd_all_bg, calculation_fields, message=arcpy.AddMessage)
+
+# Regional percentile ranks (0 to 1) of any of the fields above, and composite indices that combine them, as in the
+# EJI:
+#     ranked_fields = [{'field': 'Pct_TotMin', 'rank': 'Min_RegPct'}, {'field': 'Pct_BlwPov', 'rank': 'Pov_RegPct'}]
+#     composite_indices = [{'name': 'Both_RegPct', 'ranks': ['Min_RegPct', 'Pov_RegPct'], 'weights': [1, 1]}]
+# A composite is the percentile of the weighted sum of its ranks. ranking_weight names a field to weight the ranks by
+# (e.g. 'Total_Pop'), or None to count every block group once. Add the rank names to bg_output_columns to write them.
+ranked_fields = []
+composite_indices = []
+ranking_weight = None
+
+if ranked_fields:
+    results_pd_all_bg = ranking.add_ranks(results_pd_all_bg, ranked_fields, composite_indices, ranking_weight)
+
+if compact_tables:
+    results_pd_all_bg = layout.compact(results_pd_all_bg, 'block group', layout.indicator_columns(calculation_fields), message=arcpy.AddMessage)
+
+results_pd_all_bg = fips.add_county_names(results_pd_all_bg, state, 'County')
 
 #results_bg_reordered = results_pd_all_bg[['GEOID','CountyText','Total_Pop','TotalMin','Pct_TotMin','Rat_TotMin','Hispanic','Pct_Hisp','Rat_Hisp','TotBlk','Pct_TotBlk','Rat_TotBlk','TotAI','Pct_TotAI','Rat_TotAI','TotAsian','Pct_TotAsn','Rat_TotAsn','Tot_HPI','Pct_TotHPI','Rat_TotHPI','TotOther','Pct_TotOth','Rat_TotOth','Tot2Race','Pct_Tot2Ra','Rat_Tot2Ra','TotPSK','BlwPov','Pct_BlwPov','Rat_BlwPov','PopOver5','TotalLEP','Pct_TotLEP','Rat_TotLEP','SpanishLEP','Pct_SpLEP','Rat_SpLEP','IELEP','Pct_IE_LEP','Rat_IE_LEP','AsianLEP','Pct_AsnLEP','Rat_AsnLEP','OtherLEP','Pct_OthLEP','Rat_OthLEP','Age65Over','Pct65_Over','Rat_65Over','TotalHH','TotalFHH','Pct_TotFHH','Rat_TotFHH','NoCar','Pct_NoCar','Rat_NoCar','Min_RegPct','Pov_RegPct','Both_RegPct']]
-results_bg_reordered = results_pd_all_bg[['GEOID','Tract_GEOID','CountyText','Total_Pop','TotalMin','Pct_TotMin','Hispanic','Pct_Hisp','TotBlk','Pct_TotBlk','TotAI','Pct_TotAI','TotAsian','Pct_TotAsn','Tot_HPI','Pct_TotHPI','TotOther','Pct_TotOth','Tot2Race','Pct_Tot2Ra','TotPSK','BlwPov','Pct_BlwPov','Rat_BlwPov','ARP_BlwPov','PopOver5','TotalLEP','Pct_TotLEP','SpanishLEP','Pct_SpLEP','IELEP','Pct_IE_LEP','AsianLEP','Pct_AsnLEP','OtherLEP','Pct_OthLEP','Age65Over','Pct65_Over','Rat_65Over','ARP_65Over','TotalHH','NoCar','Pct_NoCar','Rat_NoCar','Age14Under','Pct14_Unde','Rat_14Unde','Pop18Over','TotalVet','Pct_Vet','Rat_Vet','TotPopTract','Sum_PWD','Pct_PWD','Rat_PWD','ARP_PWD']]
+# Fields in the block group output, in order. CountyText and Tract_GEOID are renamed County and TractID below.
+bg_output_columns = ['GEOID','Tract_GEOID','CountyText','Total_Pop','TotalMin','Pct_TotMin','Hispanic','Pct_Hisp','TotBlk','Pct_TotBlk','TotAI','Pct_TotAI','TotAsian','Pct_TotAsn','Tot_HPI','Pct_TotHPI','TotOther','Pct_TotOth','Tot2Race','Pct_Tot2Ra','TotPSK','BlwPov','Pct_BlwPov','Rat_BlwPov','ARP_BlwPov','PopOver5','TotalLEP','Pct_TotLEP','SpanishLEP','Pct_SpLEP','IELEP','Pct_IE_LEP','AsianLEP','Pct_AsnLEP','OtherLEP','Pct_OthLEP','Age65Over','Pct65_Over','Rat_65Over','ARP_65Over','TotalHH','NoCar','Pct_NoCar','Rat_NoCar','Age14Under','Pct14_Unde','Rat_14Unde','Pop18Over','TotalVet','Pct_Vet','Rat_Vet','TotPopTract','Sum_PWD','Pct_PWD','Rat_PWD','ARP_PWD']
+
+# Packed GEOIDs (compact_tables) go back to text for the outputs and the geography join. Any margins of error go
+# next to their fields.
+results_bg_reordered = layout.expand(results_pd_all_bg[moe.output_columns(bg_output_columns, results_pd_all_bg.columns)])
+results_pd_all_tract = layout.expand(results_pd_all_tract)
 
 results_bg_reordered = results_bg_reordered.rename(columns={'CountyText':'County'})
 results_bg_reordered = results_bg_reordered.rename(columns={'Tract_GEOID':'TractID'})
@@ -426,36 +370,30 @@ if not arcpy.Exists(output_folder):
         arcpy.AddMessage('Specified output folder does not exist. Creating it now to store output...')
         os.mkdir(output_folder)
 
-arcpy.AddMessage('Writing output csv for BG...')
+arcpy.AddMessage('Writing output tables for BG and tracts...')
 
 if arcpy.Exists(r'{}\EJI_{}_BG.csv'.format(output_folder,year)):
     arcpy.Delete_management(r'{}\TAIT_{}ACS.csv'.format(output_folder,year))
 
-results_bg_reordered.to_csv(r'{}\TAIT_{}ACS.csv'.format(output_folder,year),index = None, header = True)
-
-arcpy.AddMessage('Importing to ArcGIS table and joining to BG geography...')
-arcpy.TableToTable_conversion(r'{}\TAIT_{}ACS.csv'.format(output_folder,year),arcpy.env.workspace,'eji_bg')
-
-arcpy.JoinField_management('bg',bg_geoidfield,'eji_bg','GEOID')
-
-arcpy.DeleteField_management('bg','GEOID')
-
-arcpy.AddMessage('Calculating land area...')
-arcpy.AddField_management('bg','LandSqM','DOUBLE')
-arcpy.CalculateField_management('bg','LandSqM','!Shape.Area@SQUAREMILES!','PYTHON')
+# The tables are written in the background while the results are joined to the geography.
+output_tables = output.write_tables([[results_bg_reordered, r'{}\TAIT_{}ACS'.format(output_folder,year)],
+                                     [results_pd_all_tract, r'{}\TAIT_{}ACS_Tract'.format(output_folder,year)]],
+                                    output_formats, message=arcpy.AddMessage)
 
-arcpy.AddMessage('Calculating pop density...')
-arcpy.AddField_management('bg','PopDen','DOUBLE')
-arcpy.CalculateField_management('bg','PopDen','!Total_Pop!/!Shape.Area@SQUAREMILES!','PYTHON')
+arcpy.AddMessage('Joining results to BG geography...')
+spatial.join('bg', results_bg_reordered, bg_geoidfield, 'GEOID')
 
-arcpy.AddMessage('Copying output feature class...')
+spatial.add_area('bg', 'Total_Pop')
 
-if arcpy.Exists(r'{}\TAIT_{}ACS.gdb'.format(output_folder,year)):
-    arcpy.Delete_management(r'{}\TAIT_{}ACS.gdb'.format(output_folder,year))    
+spatial.save('bg', output_folder, 'TAIT_{}ACS'.format(year))
 
-arcpy.CreateFileGDB_management(output_folder,'TAIT_{}ACS.gdb'.format(year))
+for written in output_tables:
+    written.result()
 
-arcpy.CopyFeatures_management('bg',r'{}\TAIT_{}ACS.gdb\TAIT_{}ACS'.format(output_folder,year,year))
+if trace_run:
+    run_trace = trace.stop()
+    run_trace.write(r'{}\TAIT_{}ACS_trace.json'.format(output_folder,year))
+    run_trace.report(arcpy.AddMessage)
 
 
 
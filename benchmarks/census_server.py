@@ -0,0 +1,254 @@
+# Local stand-in for the Census Bureau API.
+#
+# Answers the same /data/{year}/{dataset}?get=...&for=...&in=... queries the fetch layer sends, so the pipeline can
+# be benchmarked offline and repeatably. Responses come from recorded fixtures when there are any: a census_cache
+# folder left behind by a real run (see tait/cache.py) answers every request that run made, byte for byte. Any
+# other request is answered with synthetic data:
+#
+#     geography   every state has its real county codes (the county name table, tait/data). Each county has 5 to
+#                 54 tracts and each tract 1 to 4 block groups, picked from a hash of the county and tract so every
+#                 run sees the same geography: about 3,200 counties, 96,000 tracts and 240,000 block groups
+#                 nationally.
+#     values      deterministic counts from 0 to 1999 per variable and geography, with about one in a thousand
+#                 replaced by the API's -666666666 annotation
+#     group()     TABLE_001E .. TABLE_<GROUP_ESTIMATES>E with their margins of error, after GEO_ID and NAME
+#
+# latency adds a fixed delay (plus up to as much again at random) to every response and error_rate answers that
+# share of requests with a 503, which the fetch layer retries.
+#
+# Usage: python benchmarks/census_server.py [--port 8000] [--latency 0.05] [--error-rate 0.01] [--fixtures census_cache]
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tait import cache, fetch, fips
+
+# Estimates returned for each table by a get=group(TABLE) request.
+GROUP_ESTIMATES = 100
+
+ANNOTATION = -666666666
+
+_counties = {}
+
+
+def stable_hash(*parts):
+    return zlib.crc32('/'.join(parts).encode('utf-8'))
+
+
+def counties(state):
+    # County codes of a state in the synthetic geography.
+    if state not in _counties:
+        table = fips.load_counties()
+        _counties[state] = sorted(table.loc[table['state'] == state, 'county'])
+    return _counties[state]
+
+
+def geographies(state, county, geography):
+    # Returns the (state, county, tract[, block group]) code lists for every geography of one county.
+    if geography == 'county':
+        return [[state], [county]]
+
+    tracts = ['{:04d}00'.format(i + 1) for i in range(5 + stable_hash(state, county) % 50)]
+    if geography == 'tract':
+        return [[state] * len(tracts), [county] * len(tracts), tracts]
+
+    columns = [[], [], [], []]
+    for tract in tracts:
+        for block_group in range(1, 2 + stable_hash(state, county, tract) % 4):
+            columns[0].append(state)
+            columns[1].append(county)
+            columns[2].append(tract)
+            columns[3].append(str(block_group))
+    return columns
+
+
+def expand(variables):
+    # Replaces group(TABLE) with the table's variables, as the API does.
+    names = []
+    for name in variables:
+        if name.startswith('group(') and name.endswith(')'):
+            table = name[6:-1]
+            names += ['GEO_ID', 'NAME']
+            for i in range(1, GROUP_ESTIMATES + 1):
+                names += ['{}_{:03d}E'.format(table, i), '{}_{:03d}M'.format(table, i)]
+        else:
+            names.append(name)
+    return names
+
+
+def synthetic(names, state, county, geography):
+    # Returns the JSON rows (header first) for one county.
+    geography_columns = geographies(state, county, geography)
+    num_rows = len(geography_columns[0])
+    row_ids = np.arange(num_rows, dtype=np.int64) + stable_hash(state, county, geography)
+
+    columns = []
+    for name in names:
+        if name in ('GEO_ID', 'NAME'):
+            columns.append([''.join(codes) for codes in zip(*geography_columns)])
+            continue
+        seed = stable_hash(name)
+        values = (row_ids * (seed % 997 + 1) + seed) % 2000
+        values[(row_ids + seed) % 1000 == 0] = ANNOTATION
+        columns.append(values.astype(str).tolist())
+
+    header = names + fetch.GEOGRAPHY_HEADERS[geography]
+    return [header] + [list(row) for row in zip(*(columns + geography_columns))]
+
+
+def parse_query(query):
+    # Returns (state, county or None for '*', geography) from a query's for= and in= clauses.
+    geography, _, for_value = query['for'][0].partition(':')
+    clauses = dict(clause.split(':', 1) for value in query.get('in', []) for clause in value.split())
+    if geography == 'county':
+        county = for_value
+    else:
+        county = clauses.get('county', '*')
+    return clauses.get('state'), None if county == '*' else county, geography
+
+
+class CensusHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency * (1 + random.random()))
+        if server.error_rate and random.random() < server.error_rate:
+            self.respond(503, b'Service Unavailable')
+            return
+
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        query = parse_qs(url.query)
+        if len(parts) < 3 or parts[0] != 'data' or 'get' not in query or 'for' not in query:
+            self.respond(400, b'error: unsupported query')
+            return
+
+        year, dataset = parts[1], '/'.join(parts[2:])
+        variables = query['get'][0].split(',')
+        state, county, geography = parse_query(query)
+        if geography not in fetch.GEOGRAPHY_HEADERS or state is None:
+            self.respond(400, b'error: unknown/unsupported geography hierarchy')
+            return
+
+        if server.fixtures is not None:
+            request = fetch.make_request(year, variables, state, county, geography, dataset)
+            recorded = server.fixtures.get(request)
+            if recorded is not None:
+                self.respond(200 if recorded else 204, recorded)
+                return
+
+        names = expand(variables)
+        rows = []
+        for code in ([county] if county else counties(state)):
+            if code not in counties(state):
+                continue
+            county_rows = synthetic(names, state, code, geography)
+            rows += county_rows if not rows else county_rows[1:]
+
+        if not rows:
+            self.respond(204, b'')
+            return
+        self.respond(200, json.dumps(rows).encode('utf-8'))
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CensusServer(object):
+    # Runs the stand-in API on a background thread:
+    #
+    #     with CensusServer(latency=0.05) as server:
+    #         fetch.API_ROOT = server.api_root
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, fixtures=None):
+        # port=0 picks a free port. fixtures is a census_cache folder of recorded responses.
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), CensusHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.fixtures = cache.ResponseCache(fixtures) if fixtures else None
+        self.thread = None
+
+    @property
+    def api_root(self):
+        return 'http://127.0.0.1:{}/data'.format(self.httpd.server_address[1])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+
+def serve(port, latency, error_rate, fixtures, ready):
+    # Process target for ServerProcess: reports the bound port on the ready queue, then serves until terminated.
+    server = CensusServer(port, latency, error_rate, fixtures)
+    ready.put(server.httpd.server_address[1])
+    server.httpd.serve_forever()
+
+
+class ServerProcess(object):
+    # Runs the stand-in API in its own process, so building responses neither competes with the pipeline for the
+    # GIL nor shows up in its memory.
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, fixtures=None):
+        ready = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=serve, args=(port, latency, error_rate, fixtures, ready),
+                                               daemon=True)
+        self.process.start()
+        self.port = ready.get(timeout=60)
+
+    @property
+    def api_root(self):
+        return 'http://127.0.0.1:{}/data'.format(self.port)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Census Bureau API.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 503')
+    parser.add_argument('--fixtures', help='census_cache folder of recorded responses')
+    args = parser.parse_args()
+
+    server = CensusServer(args.port, args.latency, args.error_rate, args.fixtures)
+    print('Serving {}'.format(server.api_root))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
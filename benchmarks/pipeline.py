@@ -0,0 +1,166 @@
+# Benchmarks the TAIT pipeline offline at several region sizes.
+#
+# Starts the stand-in Census API (census_server.py) and runs the fetch -> parse -> calculate -> export stages of
+# the TAIT script for each region, timing them with tait.trace. The variable lists, derived fields and indicator
+# fields are read out of CreateTAIT_copy_tol.py (tait.config), so the benchmark always runs the script's current
+# configuration.
+# The geography steps are left out (they need boundary files, and arcpy for the default backend).
+#
+#     NCTCOG   Texas, 16 counties
+#     CMAP     Illinois, 7 counties
+#     Texas    all 254 Texas counties
+#     Nation   every county in the country, one state at a time
+#
+# For each region it prints the request count, block group rows, megabytes received, wall time, rows per second
+# and peak traced memory; --stages adds the per-stage table from tait.trace. tracemalloc slows allocation-heavy
+# code down several times over, so times come from a run without it and peak memory from a second run with it
+# (--no-memory skips the second run). The stand-in API runs in its own process, and the response cache is not
+# used, so every run goes through the (local) network and JSON parsing. --streaming runs each region through
+# tait.stream a county at a time instead of a state at a time, --compact turns on compact_tables (tait.layout) and
+# --margins-of-error turns on margins_of_error (tait.moe).
+#
+# Usage: python benchmarks/pipeline.py [--regions NCTCOG,CMAP] [--latency 0.05] [--error-rate 0.01] [--stages]
+#                                      [--fixtures census_cache] [--api-root URL] [--json results.json]
+#                                      [--streaming] [--compact] [--margins-of-error]
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import census_server
+from tait import config, fetch, layout, output, pipeline, planner, stream, trace
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'CreateTAIT_copy_tol.py')
+
+# Region name -> list of [state, counties] parts; counties None means every county in the state.
+REGIONS = OrderedDict([
+    ['NCTCOG', [['48', ['085','113','121','139','143','221','231','251','257','349','363','367','397','425','439',
+                        '497']]]],
+    ['CMAP', [['17', ['031','043','089','093','097','111','197']]]],
+    ['Texas', [['48', None]]],
+    ['Nation', [[state, None] for state in sorted(planner.STATE_COUNTY_COUNTS)]],
+])
+
+
+def quiet(message):
+    pass
+
+
+def run_part(settings, year, state, counties, folder, formats, max_workers):
+    # Runs the pipeline for one state's counties and returns the number of block group rows.
+    request_plan = pipeline.plan(settings, state, counties)
+    results = fetch.fetch_plan(year, state, counties, request_plan, message=quiet, max_workers=max_workers)
+    bg, tract = pipeline.calculate(settings, request_plan, results, state, message=quiet)
+
+    output.write_table(layout.expand(bg), os.path.join(folder, 'TAIT_{}_{}'.format(year, state)), formats,
+                       message=quiet)
+    output.write_table(layout.expand(tract), os.path.join(folder, 'TAIT_{}_{}_Tract'.format(year, state)), formats,
+                       message=quiet)
+    return len(bg)
+
+
+def run_region(settings, year, parts, formats, max_workers, memory, streaming=False):
+    # Returns (summary dictionary, tracer) for one region.
+    folder = tempfile.mkdtemp(prefix='tait_benchmark_')
+    parts = [[state, counties or census_server.counties(state)] for state, counties in parts]
+    tracer = trace.start(memory)
+    start = time.perf_counter()
+    rows = 0
+    num_counties = sum(len(counties) for state, counties in parts)
+    try:
+        if streaming:
+            stream.run(settings, year, parts, os.path.join(folder, 'TAIT_{}'.format(year)), formats,
+                       spill_folder=folder, message=quiet, max_workers=max_workers)
+            rows = sum(span.args.get('rows', 0) for span in tracer.spans if span.name == 'indicators')
+        else:
+            for state, counties in parts:
+                rows += run_part(settings, year, state, counties, folder, formats, max_workers)
+    finally:
+        elapsed = time.perf_counter() - start
+        trace.stop()
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder, name))
+        os.rmdir(folder)
+
+    stages = dict((row['name'], row) for row in tracer.summary())
+    peaks = [row['peak_bytes'] for row in stages.values() if row['peak_bytes'] is not None]
+    summary = {'counties': num_counties,
+               'requests': stages['request']['calls'] if 'request' in stages else 0,
+               'rows': rows,
+               'bytes': stages['request']['bytes'] if 'request' in stages else 0,
+               'seconds': elapsed,
+               'rows_per_second': rows / elapsed if elapsed else 0.0,
+               'peak_bytes': max(peaks) if peaks else None,
+               'stages': list(stages.values())}
+    return summary, tracer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmark of the TAIT pipeline.')
+    parser.add_argument('--regions', default=','.join(REGIONS), help='comma separated, from ' + ', '.join(REGIONS))
+    parser.add_argument('--year', default='2019')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the stand-in API adds per response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 503')
+    parser.add_argument('--fixtures', help='census_cache folder of recorded responses to serve')
+    parser.add_argument('--api-root', help='benchmark against this API instead of starting the stand-in')
+    parser.add_argument('--formats', default='parquet', help='output formats, comma separated')
+    parser.add_argument('--max-requests', type=int, default=fetch.MAX_WORKERS)
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc (faster, no peak memory)')
+    parser.add_argument('--stages', action='store_true', help='print the per-stage table for each region')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--streaming', action='store_true', help='run the regions through tait.stream')
+    parser.add_argument('--compact', action='store_true', help='keep the tables in the compact layout')
+    parser.add_argument('--margins-of-error', action='store_true', help='fetch and propagate margins of error')
+    args = parser.parse_args()
+
+    regions = args.regions.split(',')
+    unknown = [name for name in regions if name not in REGIONS]
+    if unknown:
+        parser.error('unknown regions: {}'.format(', '.join(unknown)))
+
+    settings = config.load(SCRIPT)
+    if args.compact:
+        settings['compact_tables'] = True
+    if args.margins_of_error:
+        settings['margins_of_error'] = True
+    server = None
+    if args.api_root:
+        fetch.API_ROOT = args.api_root
+    else:
+        server = census_server.ServerProcess(latency=args.latency, error_rate=args.error_rate,
+                                             fixtures=args.fixtures)
+        fetch.API_ROOT = server.api_root
+
+    results = OrderedDict()
+    print('{:<8} {:>8} {:>8} {:>9} {:>9} {:>9} {:>10} {:>9}'.format(
+        'Region', 'Counties', 'Requests', 'Rows', 'MB', 'Seconds', 'Rows/s', 'Peak MB'))
+    try:
+        for name in regions:
+            summary, tracer = run_region(settings, args.year, REGIONS[name], args.formats.split(','),
+                                         args.max_requests, False, args.streaming)
+            if not args.no_memory:
+                summary['peak_bytes'] = run_region(settings, args.year, REGIONS[name], args.formats.split(','),
+                                                   args.max_requests, True, args.streaming)[0]['peak_bytes']
+            results[name] = summary
+            peak = '' if summary['peak_bytes'] is None else '{:.1f}'.format(summary['peak_bytes'] / 1048576.0)
+            print('{:<8} {:>8} {:>8} {:>9} {:>9.1f} {:>9.2f} {:>10.0f} {:>9}'.format(
+                name, summary['counties'], summary['requests'], summary['rows'], summary['bytes'] / 1048576.0,
+                summary['seconds'], summary['rows_per_second'], peak))
+            if args.stages:
+                tracer.report()
+                print('')
+    finally:
+        if server is not None:
+            server.stop()
+
+    if args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump({'year': args.year, 'latency': args.latency, 'error_rate': args.error_rate,
+                       'regions': results}, results_file, indent=1)
@@ -0,0 +1,59 @@
+# Benchmarks per-county against state-wide requests for tract level tables.
+#
+# Pulls the TAIT disability table for each region twice, once with one request per county and once with a single
+# state-wide request filtered down to the region's counties, and prints the request count, rows kept and wall
+# time of each. The response cache is not used, so both strategies hit the API every time.
+#
+# Usage: python benchmarks/state_wide.py [year] [api_root]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tait import fetch, planner
+
+tract_desired_columns = [{'desc_name': 'TotPopTract', 'census_name': 'B18101_001E'},
+                         {'desc_name': 'MaleDisabUnder5', 'census_name': 'B18101_004E'},
+                         {'desc_name': 'MaleDisab5to17', 'census_name': 'B18101_007E'},
+                         {'desc_name': 'MaleDisab18to34', 'census_name': 'B18101_010E'},
+                         {'desc_name': 'MaleDisab35to64', 'census_name': 'B18101_013E'},
+                         {'desc_name': 'MaleDisab65to74', 'census_name': 'B18101_016E'},
+                         {'desc_name': 'MaleDisab75over', 'census_name': 'B18101_019E'},
+                         {'desc_name': 'FemDisabUnder5', 'census_name': 'B18101_023E'},
+                         {'desc_name': 'FemDisab5to17', 'census_name': 'B18101_026E'},
+                         {'desc_name': 'FemDisab18to34', 'census_name': 'B18101_029E'},
+                         {'desc_name': 'FemDisab35to64', 'census_name': 'B18101_032E'},
+                         {'desc_name': 'FemDisab65to74', 'census_name': 'B18101_035E'},
+                         {'desc_name': 'FemDisab75over', 'census_name': 'B18101_038E'}
+                        ]
+
+regions = [['NCTCOG', '48', ['085','113','121','139','143','221','231','251','257','349','363','367','397','425','439','497']],
+           ['CMAP', '17', ['031','043','089','093','097','111','197']]]
+
+
+def run(year, state, counties, state_wide):
+    plan = planner.plan_requests([[tract_desired_columns, 'tract']], state_wide=state_wide)
+
+    start = time.perf_counter()
+    results = fetch.fetch_plan(year, state, counties, plan, message=lambda message: None)
+    elapsed = time.perf_counter() - start
+
+    requests = sum(len(chunk_results) for chunk_results in results)
+    rows = sum(len(rows) for chunk_results in results for rows in chunk_results)
+    return requests, rows, elapsed
+
+
+if __name__ == '__main__':
+    year = sys.argv[1] if len(sys.argv) > 1 else '2019'
+    if len(sys.argv) > 2:
+        fetch.API_ROOT = sys.argv[2]
+
+    print('{:<8} {:<11} {:>8} {:>8} {:>9}'.format('Region', 'Strategy', 'Requests', 'Rows', 'Seconds'))
+    for name, state, counties in regions:
+        for strategy, state_wide in [['per-county', False], ['state-wide', True]]:
+            requests, rows, elapsed = run(year, state, counties, state_wide)
+            print('{:<8} {:<11} {:>8} {:>8} {:>9.2f}'.format(name, strategy, requests, rows, elapsed))
+        auto = 'state-wide' if planner.use_state_wide(state, len(counties)) else 'per-county'
+        print('{:<8} planner picks {}'.format(name, auto))
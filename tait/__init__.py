@@ -0,0 +1,3 @@
+# Shared building blocks for the TAIT / demographic retrieval scripts.
+# The scripts in the repository root (CreateTAIT_*.py) and NewTAIT.ipynb import from here so that
+# the Census API, calculation and output logic only has to be maintained in one place.
@@ -0,0 +1,86 @@
+# Apportionment of coarser-geography variables to block groups.
+#
+# Some variables are only published for tracts (the notebook's mingeo levels), so they have to be shared out among
+# each tract's block groups. Each apportioned field names the tract variable to share out and a block group column
+# to share it by:
+#
+#     {'name': 'Sum_PWD', 'source': 'WholeTract_PWD', 'weight': 'Total_Pop'}
+#
+# A block group gets source * weight / (sum of weight over the block groups in its tract), so the block groups of
+# a tract always add back up to the tract's value, whatever universe the weight and the source were counted in.
+# The sums are taken for every tract at once with np.bincount over the integer parent index (geoid.py); there is
+# no merge per variable. Tracts whose block groups all have a weight of 0 would otherwise divide by zero; by
+# default their value is split equally between their block groups instead (fallback='equal'), or can be left
+# at 0 (fallback='zero'). A source with a margin of error (moe.py) passes it on scaled by the same share.
+
+import numpy as np
+import pandas as pd
+
+from tait import geoid, moe, trace
+
+FALLBACKS = ['equal', 'zero']
+
+
+def shares(weights, groups, num_groups, fallback='equal'):
+    # Returns each row's share of its group's total weight and the number of groups that fell back. groups holds
+    # each row's group number (0 .. num_groups - 1).
+    totals = np.bincount(groups, weights=weights, minlength=num_groups)
+    counts = np.bincount(groups, minlength=num_groups)
+    empty = totals[groups] == 0
+
+    result = np.zeros(len(weights), dtype=np.float64)
+    np.divide(weights, totals[groups], out=result, where=~empty)
+    if fallback == 'equal':
+        result[empty] = 1.0 / counts[groups][empty]
+    elif fallback != 'zero':
+        raise ValueError('Unknown apportionment fallback: {}'.format(fallback))
+
+    num_empty = int(((totals == 0) & (counts > 0)).sum())
+    return result, num_empty
+
+
+@trace.traced('apportion')
+def apportion(frame, parent_frame, fields, geography='block group', fallback='equal', message=print):
+    # Adds every field in fields to frame (block groups) from parent_frame (their tracts) and returns the new frame.
+    # Both frames are indexed by packed GEOID key, as builder.load_plan() returns them. Rows whose parent is missing
+    # from parent_frame get NaN.
+    if not fields:
+        return frame
+    trace.add(rows=len(frame))
+
+    positions = geoid.lookup(parent_frame.index, geoid.parent(frame.index, geography))
+    found = positions >= 0
+    groups = positions[found]
+
+    sources = parent_frame[[field['source'] for field in fields]].to_numpy(dtype=np.float64)
+    values = np.full((len(frame), len(fields)), np.nan)
+
+    weight_shares = {}
+    for field in fields:
+        if field['weight'] not in weight_shares:
+            weights = frame[field['weight']].to_numpy(dtype=np.float64)[found]
+            weight_shares[field['weight']], num_empty = shares(weights, groups, len(parent_frame), fallback)
+            if num_empty:
+                message('{} {}s have no {}; their values are {}'.format(
+                    num_empty, geoid.PARENTS[geography], field['weight'],
+                    'split equally' if fallback == 'equal' else 'set to 0'))
+
+    share_matrix = np.column_stack([weight_shares[field['weight']] for field in fields])
+    values[found] = sources[groups] * share_matrix
+
+    if (~found).any():
+        message('{} rows have no {} to apportion from'.format(int((~found).sum()), geoid.PARENTS[geography]))
+
+    apportioned = pd.DataFrame(values, columns=[field['name'] for field in fields], index=frame.index)
+
+    with_moe = [j for j, field in enumerate(fields) if moe.name(field['source']) in parent_frame.columns]
+    if with_moe:
+        margins = parent_frame[[moe.name(fields[j]['source']) for j in with_moe]].to_numpy(dtype=np.float64)
+        values = np.full((len(frame), len(with_moe)), np.nan)
+        values[found] = margins[groups] * share_matrix[:, with_moe]
+        apportioned = pd.concat([apportioned, pd.DataFrame(values, columns=[moe.name(fields[j]['name'])
+                                                                            for j in with_moe], index=frame.index)],
+                                axis=1)
+    return pd.concat([frame.drop(columns=[name for name in apportioned.columns if name in frame.columns]),
+                      apportioned], axis=1)
+
@@ -0,0 +1,212 @@
+# Multi-year batch runs.
+#
+# Building a trend series used to mean running the script once per year, each run reloading and clipping the
+# geography and fetching its own requests. run() takes a list of ACS vintages instead:
+#
+#     1. every year's requests are planned up front and sent in one concurrent batch (fetch.fetch_plans())
+#     2. each boundary vintage the years need (2010 geography up to the 2019 ACS, 2020 geography after) is loaded
+#        and clipped once, and copied for each year joined to it
+#     3. each year's tables are calculated in its own worker process (pipeline.calculate()), while the main process
+#        writes the years that are already done and joins them to the geography
+#     4. the per-year block group tables are stacked into one long table, one row per year, block group and field
+#
+# run_jobs() does steps 1 to 3 for any list of [region, year] jobs; regions.py runs many regions through it.
+#
+# The variable lists and fields come from a CreateTAIT script (config.py), so a batch computes exactly what the
+# script does. GEOIDs change between boundary vintages, so trends across the 2019/2020 break have to be
+# compared at a coarser level (county or region) or through a crosswalk.
+#
+# Usage: python -m tait.batch --years 2015-2022 --output folder [--script CreateTAIT_copy_tol.py]
+#            [--state 48 --counties 085,113] [--geography 2010=bg_2010.shp --geography 2020=bg_2020.shp]
+
+import argparse
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from tait import cache, config as tait_config, fetch, geometry, geostore, layout, output, pipeline
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'CreateTAIT_copy_tol.py')
+
+# GEOID and county code fields of TIGER/Line block groups, per boundary vintage.
+GEOGRAPHY_FIELDS = {'2010': ['GEOID10', 'COUNTYFP10'], '2020': ['GEOID', 'COUNTYFP']}
+
+# Block group output columns that identify a row of the long table; every other numeric field becomes rows.
+LONG_ID_COLUMNS = ['GEOID', 'TractID', 'County']
+
+
+def geography_vintage(year):
+    # Decennial boundaries an ACS 5-year vintage is published on.
+    return '2020' if int(year) >= 2020 else '2010'
+
+
+def parse_years(text):
+    # '2015-2017,2019' -> ['2015', '2016', '2017', '2019']
+    years = []
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        years += [str(year) for year in range(int(first), int(last or first) + 1)]
+    return years
+
+
+def calculate_year(settings, year, request_plan, plan_results, state):
+    # Worker process entry point. Returns (block group output, tract frame, messages) for one year of one region.
+    messages = []
+    bg, tract = pipeline.calculate(settings, request_plan, plan_results, state, message=messages.append)
+    return pipeline.bg_output(settings, bg), layout.expand(tract), messages
+
+
+def make_region(settings, state, counties, name='', crs=geometry.CRS, output_name='TAIT_{year}ACS', geography=None,
+                geography_fields=None):
+    # The region dictionary run_jobs() works from; regions.load_profile() returns the same keys. name is also the
+    # region's output subfolder ('' for none). geography maps boundary vintages to block group sources and
+    # geography_fields overrides GEOGRAPHY_FIELDS per vintage.
+    return {'name': name, 'settings': settings, 'state': str(state), 'counties': counties, 'crs': crs,
+            'output_name': output_name, 'geography': geography or {},
+            'geography_fields': dict(GEOGRAPHY_FIELDS, **(geography_fields or {}))}
+
+
+def long_table(tables, id_columns=LONG_ID_COLUMNS):
+    # Stacks {year: block group output} into Year, id columns, Field, Value rows. Flags become 0/1.
+    parts = []
+    for year, table in tables.items():
+        fields = [name for name in table.columns if name not in id_columns and table[name].dtype.kind in 'biuf']
+        part = table[id_columns + fields].astype(dict((name, 'float64') for name in fields))
+        part = part.melt(id_vars=id_columns, value_vars=fields, var_name='Field', value_name='Value')
+        part.insert(0, 'Year', int(year))
+        parts.append(part)
+
+    stacked = pd.concat(parts, ignore_index=True)
+    stacked['Field'] = stacked['Field'].astype('category')
+    return stacked
+
+
+def run_jobs(jobs, output_folder, formats=('parquet',), backend='geopandas', response_cache=None,
+             geography_store=None, processes=None, max_workers=fetch.MAX_WORKERS, timeout=fetch.TIMEOUT,
+             message=print):
+    # jobs is a list of [region, year] pairs (see make_region()). Fetches every job's requests in one batch, loads
+    # each region's geography vintages once, calculates the jobs in worker processes and writes each one's tables
+    # (and geography, when the region has some) as it finishes. Returns (an ordered dictionary of (region name,
+    # year) -> block group output, the write futures).
+    jobs = [[region, str(year)] for region, year in jobs]
+    formats = list(formats)
+
+    plans = [pipeline.plan(region['settings'], region['state'], list(region['counties']),
+                           region['settings'].get('state_wide_tracts')) for region, year in jobs]
+    job_results = fetch.fetch_plans([[year, region['state'], list(region['counties']), request_plan]
+                                     for (region, year), request_plan in zip(jobs, plans)],
+                                    message, max_workers=max_workers, timeout=timeout, cache=response_cache)
+
+    backends = {}
+    loaded = set()
+    for region, year in jobs:
+        vintage = geography_vintage(year)
+        if not region['geography']:
+            continue
+        if vintage not in region['geography']:
+            raise ValueError('No {} block group geography given for {}'.format(vintage, region['name'] or 'the run'))
+        if region['name'] not in backends:
+            backends[region['name']] = geometry.get_backend(backend, region['crs'], message, store=geography_store)
+        layer = 'bg_{}_{}'.format(region['name'], vintage)
+        if layer not in loaded:
+            fields = region['geography_fields'][vintage]
+            backends[region['name']].load(region['geography'][vintage], layer, fields[0], fields[1],
+                                          list(region['counties']), vintage=vintage)
+            loaded.add(layer)
+
+    tables = OrderedDict()
+    written = []
+    workers = processes or min(len(jobs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = [pool.submit(calculate_year, region['settings'], year, request_plan, plan_results, region['state'])
+                   for (region, year), request_plan, plan_results in zip(jobs, plans, job_results)]
+
+        for (region, year), future in zip(jobs, futures):
+            bg, tract, messages = future.result()
+            label = ' '.join(part for part in [region['name'], year] if part)
+            for line in messages:
+                message('{}: {}'.format(label, line))
+            tables[(region['name'], year)] = bg
+
+            folder = os.path.join(output_folder, region['name'])
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            name = region['output_name'].format(year=year)
+            written += output.write_tables([[bg, os.path.join(folder, name)],
+                                            [tract, os.path.join(folder, name + '_Tract')]],
+                                           formats, message=message)
+
+            if region['name'] in backends:
+                vintage = geography_vintage(year)
+                spatial = backends[region['name']]
+                spatial.copy('bg_{}_{}'.format(region['name'], vintage), 'bg')
+                spatial.join('bg', bg, region['geography_fields'][vintage][0], 'GEOID')
+                spatial.add_area('bg', 'Total_Pop')
+                spatial.save('bg', folder, name)
+
+    return tables, written
+
+
+def run(settings, years, state, counties, output_folder, formats=('parquet',), geography=None,
+        geography_fields=None, backend='geopandas', crs=geometry.CRS, response_cache=None, geography_store=None,
+        processes=None, max_workers=fetch.MAX_WORKERS, timeout=fetch.TIMEOUT, message=print):
+    # settings is config.load()'s dictionary. geography maps boundary vintages ('2010', '2020') to block group
+    # sources; without it only the tables are written. geography_fields overrides GEOGRAPHY_FIELDS per vintage.
+    # Returns the paths written.
+    years = [str(year) for year in years]
+    region = make_region(settings, state, counties, crs=crs, geography=geography, geography_fields=geography_fields)
+    tables, written = run_jobs([[region, year] for year in years], output_folder, formats, backend, response_cache,
+                               geography_store, processes, max_workers, timeout, message)
+
+    message('Stacking {} years into the long table...'.format(len(years)))
+    long_name = 'TAIT_{}_{}ACS_Long'.format(years[0], years[-1])
+    written += output.write_tables([[long_table(dict((year, tables[(region['name'], year)]) for year in years)),
+                                     os.path.join(output_folder, long_name)]], list(formats), message=message)
+    return [path for future in written for path in future.result()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tait.batch', description='Runs TAIT for several ACS years.')
+    parser.add_argument('--years', required=True, help="e.g. '2015-2022' or '2018,2019,2021'")
+    parser.add_argument('--output', required=True, help='output folder')
+    parser.add_argument('--script', default=SCRIPT, help='CreateTAIT script to read variables and fields from')
+    parser.add_argument('--state', help="state FIPS code (default: the script's)")
+    parser.add_argument('--counties', help="comma separated county FIPS codes (default: the script's)")
+    parser.add_argument('--geography', action='append', default=[], metavar='VINTAGE=SOURCE',
+                        help='block group geography per boundary vintage, e.g. 2020=bg_2020.shp')
+    parser.add_argument('--geography-fields', action='append', default=[], metavar='VINTAGE=GEOID,COUNTY',
+                        help='GEOID and county fields of a vintage, e.g. 2010=GEOID10,COUNTYFP10')
+    parser.add_argument('--backend', default='geopandas', choices=geometry.BACKENDS)
+    parser.add_argument('--formats', help="comma separated output formats (default: the script's)")
+    parser.add_argument('--processes', type=int, help='worker processes (default: one per year, up to the CPUs)')
+    parser.add_argument('--cache', default='census_cache', help="response cache folder, or '' for none")
+    parser.add_argument('--geography-cache', default='geography_cache', help="clipped geography folder, or ''")
+    args = parser.parse_args(argv)
+
+    settings = tait_config.load(args.script)
+    state = args.state or settings.get('state')
+    counties = args.counties.split(',') if args.counties else settings.get('counties')
+    if not state or not counties:
+        parser.error('--state and --counties are needed when the script does not set them')
+    formats = args.formats.split(',') if args.formats else settings.get('output_formats', ['parquet'])
+
+    geography = dict(item.split('=', 1) for item in args.geography)
+    geography_fields = dict((vintage, value.split(',')) for vintage, value in
+                            (item.split('=', 1) for item in args.geography_fields))
+    response_cache = None
+    if args.cache:
+        response_cache = cache.ResponseCache(args.cache, max_bytes=settings.get('cache_size_mb', 500) * 1024 * 1024)
+
+    paths = run(settings, parse_years(args.years), state, counties, args.output, formats, geography,
+                geography_fields, args.backend, settings.get('output_crs', geometry.CRS), response_cache,
+                geostore.GeographyStore(args.geography_cache) if args.geography_cache and geography else None,
+                args.processes, settings.get('max_requests', fetch.MAX_WORKERS),
+                settings.get('request_timeout', fetch.TIMEOUT))
+    for path in paths:
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# Builds dataframes from Census API results.
+#
+# The scripts used to start from an empty dataframe and append every county's results to it, which copies the
+# whole accumulated frame on each pass (and DataFrame.append no longer exists in current pandas). FrameBuilder
+# instead collects the rows and parses them into a single typed frame once everything has arrived (see parse.py).
+# load_plan() is the one ingest path for every planned chunk: it builds each chunk's frame, indexes it by packed
+# GEOID key and lines up chunks of the same geography into one frame per geography. attach_parent() brings tract
+# variables onto block groups through the same keys.
+#
+# Chunks of one geography normally hold the same rows. When they do not (a response that left out a geography the
+# others have), the chunks are joined on every key either of them has: the codes of a row one chunk is missing are
+# taken from the other, and its variables from the chunk that is missing it are set to 0, as annotated values are.
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from tait import geoid, parse, trace
+
+# Name of the GEOID column each geography's frame is keyed on.
+GEOID_COLUMNS = {'block group': 'GEOID', 'tract': 'Tract_GEOID', 'county': 'County_GEOID'}
+
+
+class FrameBuilder(object):
+
+    def __init__(self, specs, geography):
+        self.specs = list(specs)
+        self.geography = geography
+        self.rows = 0
+        self.replaced = {}
+        self._parts = []
+
+    def add(self, rows):
+        # rows is one response's data rows (header already removed): the specs' variables, then the geography columns.
+        self._parts.append(rows)
+        self.rows += len(rows)
+
+    def build(self):
+        data = [row for part in self._parts for row in part]
+        self._parts = []
+        frame, self.replaced = parse.parse_rows(data, self.specs, self.geography)
+        return frame
+
+
+def add_geoids(frame, geography):
+    # Indexes frame by its packed integer GEOID key (see geoid.py), sorted, and adds the GEOID string columns.
+    # Block groups also get their parent Tract_GEOID.
+    keys = geoid.pack(frame, geography)
+    frame.index = pd.Index(keys, name='key')
+    frame = frame.sort_index()
+
+    if geography == 'county':
+        frame['County_GEOID'] = geoid.to_string(frame.index, 'county')
+        return frame
+
+    if geography == 'block group':
+        frame['Tract_GEOID'] = geoid.to_string(geoid.parent(frame.index, 'block group'), 'tract')
+        frame['GEOID'] = geoid.to_string(frame.index, 'block group')
+    else:
+        frame['Tract_GEOID'] = geoid.to_string(frame.index, 'tract')
+    return frame
+
+
+@trace.traced('attach')
+def attach_parent(frame, parent_frame, geography):
+    # Adds parent_frame's columns to every row of frame from the row's parent (tract variables onto block groups),
+    # like a left join but without hashing any strings: parent keys are found by binary search in parent_frame's
+    # sorted index. Columns frame already has (State, County, Tract_GEOID, ...) are kept from frame. Rows whose
+    # parent is missing get NaN.
+    positions = geoid.lookup(parent_frame.index, geoid.parent(frame.index, geography))
+    columns = [name for name in parent_frame.columns if name not in frame.columns]
+
+    rows = parent_frame[columns].take(np.maximum(positions, 0))
+    missing = positions < 0
+    if missing.any():
+        rows = rows.mask(np.broadcast_to(missing[:, None], rows.shape))
+    rows.index = frame.index
+    return pd.concat([frame, rows], axis=1)
+
+
+def outer_join(frame, other, geography, message=print):
+    # Returns frame with other's variables added, on the keys of both. Rows missing from one of them get the FIPS
+    # code and GEOID columns of the other and 0 for its variables, in the variable's own type.
+    keys = frame.index.union(other.index)
+    missing = int((~keys.isin(frame.index)).sum() + (~keys.isin(other.index)).sum())
+    message('{} {}s are missing from some responses; their values there are set to 0'.format(missing, geography))
+
+    code_columns = [name for name in frame.columns if name in other.columns]
+    left = frame.reindex(keys)
+    right = other.reindex(keys)
+    columns = dict((name, left[name].combine_first(right[name])) for name in code_columns)
+    for part, original in [[left, frame], [right, other]]:
+        for name in original.columns:
+            if name not in code_columns:
+                columns[name] = part[name].fillna(0).astype(original[name].dtype)
+    return pd.DataFrame(columns, index=keys)[list(frame.columns) +
+                                             [name for name in other.columns if name not in code_columns]]
+
+
+def load_plan(plan, plan_results, message=print):
+    # plan and plan_results are the outputs of planner.plan_requests() and fetch.fetch_plan(). Returns an ordered
+    # dictionary of geography -> dataframe holding every variable requested at that geography.
+    frames = OrderedDict()
+
+    for chunk, chunk_results in zip(plan, plan_results):
+        message('Loading {} {} variables into Pandas dataframe...'.format(len(chunk.specs), chunk.geography))
+
+        with trace.span('parse', geography=chunk.geography, variables=len(chunk.specs)) as parse_span:
+            builder = FrameBuilder(chunk.specs, chunk.geography)
+            for rows in chunk_results:
+                builder.add(rows)
+            frame = add_geoids(builder.build(), chunk.geography)
+            parse_span.add(rows=builder.rows)
+
+        for name, count in builder.replaced.items():
+            message('Replaced {} null or annotated values with 0 in {} ({} rows)'.format(count, name, builder.rows))
+
+        if chunk.geography not in frames:
+            frames[chunk.geography] = frame
+            continue
+
+        # Later chunks of the same geography only contribute their variables. Both frames are sorted by key, so when
+        # they hold the same rows (the usual case) the columns are placed side by side without a join.
+        if frames[chunk.geography].index.equals(frame.index):
+            variables = frame[[x['desc_name'] for x in chunk.specs]]
+            frames[chunk.geography] = pd.concat([frames[chunk.geography], variables], axis=1)
+        else:
+            frames[chunk.geography] = outer_join(frames[chunk.geography], frame, chunk.geography, message)
+
+    return frames
@@ -0,0 +1,121 @@
+# On-disk cache of Census API responses.
+#
+# Responses are stored as the raw JSON text the API returned, one file per request, named by a hash of
+# everything that determines the answer: year, dataset, variable list, state, county and 'for=' geography.
+# Published ACS vintages do not change, so by default entries never expire; max_age can be set for datasets
+# that do get revised. The folder is capped at max_bytes with least-recently-used files evicted first. The folder is
+# scanned once when the cache is opened and a running total of its size kept from there, so storing a response
+# costs no more than writing it; the folder is only listed again when the total goes over the cap.
+# Reruns against a vintage that has already been pulled are served entirely from disk.
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Default size cap for the cache folder.
+MAX_BYTES = 500 * 1024 * 1024
+
+
+def request_key(request):
+    # Variable order matters to the response (columns come back in the order asked for), so it is kept.
+    key = json.dumps([request.year, request.dataset, list(request.variables), request.state,
+                      request.county, request.geography])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class ResponseCache(object):
+
+    def __init__(self, folder, max_bytes=MAX_BYTES, max_age=None, refresh=False):
+        # max_age is in seconds; None treats every cached vintage as immutable.
+        # refresh=True ignores anything already cached but still stores the new responses.
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        # File name -> size of every cached response, and their total.
+        self._sizes = dict((name, size) for atime, size, name in self._entries())
+        self._total = sum(self._sizes.values())
+
+    def _path(self, request):
+        return os.path.join(self.folder, request_key(request) + '.json')
+
+    def _entries(self):
+        # [access time, size, file name] of every cached response in the folder.
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, name))
+        return entries
+
+    def get(self, request):
+        # Returns the cached response bytes, or None on a miss.
+        if self.refresh:
+            return None
+
+        path = self._path(request)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        if self.max_age is not None and time.time() - stat.st_mtime > self.max_age:
+            return None
+
+        with open(path, 'rb') as f:
+            results = f.read()
+
+        # Touch the access time so eviction drops the least recently used entries first.
+        os.utime(path, (time.time(), stat.st_mtime))
+        return results
+
+    def put(self, request, results):
+        path = self._path(request)
+        temp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(temp_path, 'wb') as f:
+            f.write(results)
+        os.replace(temp_path, path)
+
+        name = os.path.basename(path)
+        with self._lock:
+            self._total += len(results) - self._sizes.get(name, 0)
+            self._sizes[name] = len(results)
+            over = self._total > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        # Lists the folder (which another run may have added to) and removes the least recently used responses until
+        # it is under the cap.
+        with self._lock:
+            entries = self._entries()
+            self._sizes = dict((name, size) for atime, size, name in entries)
+            self._total = sum(self._sizes.values())
+            if self._total <= self.max_bytes:
+                return
+
+            for atime, size, name in sorted(entries):
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except OSError:
+                    continue
+                del self._sizes[name]
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.folder):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.folder, name))
+            self._sizes = {}
+            self._total = 0
@@ -0,0 +1,175 @@
+# Local catalog of ACS variable metadata.
+#
+# The API publishes every vintage's variable list as variables.json and its tables as groups.json. ingest()
+# downloads both once per vintage and dataset into a SQLite file, indexed by variable name, group and concept, with
+# an FTS5 full-text index over labels and concepts. After that, looking up a concept's variables or searching the
+# labels is a local query that takes milliseconds and works offline, instead of downloading and HTML-parsing the
+# ~28,000 row variables.html page. compare() lists what changed between two vintages: variables dropped, added,
+# relabelled, or renamed (the same label and concept published under a new name).
+
+import json
+import os
+import sqlite3
+import urllib.request
+from collections import namedtuple
+
+from tait import fetch
+
+DEFAULT_DATASET = 'acs/acs5'
+
+# One variable's metadata. group is the table id (e.g. B01001); None for variables outside any table, such as NAME.
+Variable = namedtuple('Variable', ['name', 'label', 'concept', 'group', 'predicate_type'])
+
+# The geography clauses variables.json lists among the variables ('Census API Geography Specification'). They are
+# not data and are left out of the catalog, so they never show up in compare() or concepts().
+PSEUDO_VARIABLES = ['for', 'in', 'ucgid']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS vintages (year TEXT, dataset TEXT, PRIMARY KEY (year, dataset));
+CREATE TABLE IF NOT EXISTS variables (year TEXT, dataset TEXT, name TEXT, label TEXT, concept TEXT,
+                                      group_name TEXT, predicate_type TEXT, PRIMARY KEY (year, dataset, name));
+CREATE INDEX IF NOT EXISTS variables_group ON variables (year, dataset, group_name);
+CREATE INDEX IF NOT EXISTS variables_concept ON variables (year, dataset, concept);
+CREATE TABLE IF NOT EXISTS groups (year TEXT, dataset TEXT, name TEXT, description TEXT,
+                                   PRIMARY KEY (year, dataset, name));
+CREATE VIRTUAL TABLE IF NOT EXISTS variables_text USING fts5 (year UNINDEXED, dataset UNINDEXED, name UNINDEXED,
+                                                              label, concept);
+'''
+
+COLUMNS = 'name, label, concept, group_name, predicate_type'
+
+
+def metadata_url(year, dataset, document):
+    # document is 'variables.json' or 'groups.json'.
+    return '{}/{}/{}/{}'.format(fetch.API_ROOT, year, dataset, document)
+
+
+def download(url, timeout=fetch.TIMEOUT):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def specs(variables):
+    # Turns catalog results into the {'desc_name', 'census_name'} dictionaries the planner takes, named by label.
+    return [{'desc_name': variable.label, 'census_name': variable.name} for variable in variables]
+
+
+class VariableCatalog(object):
+
+    def __init__(self, path):
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def has(self, year, dataset=DEFAULT_DATASET):
+        row = self.connection.execute('SELECT 1 FROM vintages WHERE year = ? AND dataset = ?',
+                                      (str(year), dataset)).fetchone()
+        return row is not None
+
+    def ingest(self, year, dataset=DEFAULT_DATASET, refresh=False, timeout=fetch.TIMEOUT, message=print):
+        # Downloads variables.json and groups.json for a vintage unless the catalog already has it.
+        if self.has(year, dataset) and not refresh:
+            return
+        message('Downloading {} {} variable metadata...'.format(year, dataset))
+        variables = download(metadata_url(year, dataset, 'variables.json'), timeout)
+        groups = download(metadata_url(year, dataset, 'groups.json'), timeout)
+        self.load(year, variables, groups, dataset)
+
+    def load(self, year, variables, groups=None, dataset=DEFAULT_DATASET):
+        # Stores already parsed variables.json (and groups.json) documents for a vintage, replacing any earlier copy.
+        year = str(year)
+        rows = []
+        for name, variable in variables['variables'].items():
+            if name in PSEUDO_VARIABLES:
+                continue
+            rows.append((year, dataset, name, variable.get('label'), variable.get('concept'),
+                         variable.get('group') if variable.get('group') not in (None, 'N/A') else None,
+                         variable.get('predicateType')))
+
+        with self.connection:
+            for table in ['variables', 'groups', 'variables_text', 'vintages']:
+                self.connection.execute('DELETE FROM {} WHERE year = ? AND dataset = ?'.format(table), (year, dataset))
+            self.connection.executemany('INSERT INTO variables VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self.connection.executemany('INSERT INTO variables_text VALUES (?, ?, ?, ?, ?)',
+                                        [row[:5] for row in rows])
+            if groups is not None:
+                self.connection.executemany('INSERT INTO groups VALUES (?, ?, ?, ?)',
+                                            [(year, dataset, group['name'], group.get('description'))
+                                             for group in groups['groups']])
+            self.connection.execute('INSERT INTO vintages VALUES (?, ?)', (year, dataset))
+
+    def _query(self, where, parameters, year, dataset):
+        sql = 'SELECT {} FROM variables WHERE year = ? AND dataset = ? AND {} ORDER BY name'.format(COLUMNS, where)
+        rows = self.connection.execute(sql, (str(year), dataset) + tuple(parameters)).fetchall()
+        return [Variable(*row) for row in rows]
+
+    def variable(self, year, name, dataset=DEFAULT_DATASET):
+        # Returns one Variable, or None if the vintage does not have it.
+        variables = self._query('name = ?', [name], year, dataset)
+        return variables[0] if variables else None
+
+    def group(self, year, group, dataset=DEFAULT_DATASET):
+        # Every variable in a table, e.g. group('2022', 'B16004').
+        return self._query('group_name = ?', [group], year, dataset)
+
+    def concept(self, year, concept, dataset=DEFAULT_DATASET):
+        return self._query('concept = ?', [concept], year, dataset)
+
+    def concepts(self, year, dataset=DEFAULT_DATASET):
+        # Every concept in a vintage, in the order of their first variable (the order variables.html lists them in).
+        rows = self.connection.execute('SELECT concept FROM variables WHERE year = ? AND dataset = ? AND concept '
+                                       'IS NOT NULL GROUP BY concept ORDER BY MIN(name)', (str(year), dataset))
+        return [row[0] for row in rows]
+
+    def table_sizes(self, year, dataset=DEFAULT_DATASET):
+        # Returns {table id: number of estimates} for a vintage, the planner's table_sizes.
+        rows = self.connection.execute("SELECT group_name, COUNT(*) FROM variables WHERE year = ? AND dataset = ? "
+                                       "AND group_name IS NOT NULL AND name LIKE '%E' GROUP BY group_name",
+                                       (str(year), dataset))
+        return dict(rows.fetchall())
+
+    def groups(self, year, dataset=DEFAULT_DATASET):
+        # Returns a list of (table id, description) pairs.
+        rows = self.connection.execute('SELECT name, description FROM groups WHERE year = ? AND dataset = ? '
+                                       'ORDER BY name', (str(year), dataset))
+        return rows.fetchall()
+
+    def search(self, year, text, dataset=DEFAULT_DATASET, limit=50):
+        # Full-text search over labels and concepts, best matches first. text is an FTS5 query, e.g.
+        # 'english AND "very well"' or 'disab*'.
+        sql = ('SELECT v.name, v.label, v.concept, v.group_name, v.predicate_type FROM variables_text t '
+               'JOIN variables v ON v.year = t.year AND v.dataset = t.dataset AND v.name = t.name '
+               'WHERE variables_text MATCH ? AND t.year = ? AND t.dataset = ? ORDER BY rank LIMIT ?')
+        rows = self.connection.execute(sql, (text, str(year), dataset, limit)).fetchall()
+        return [Variable(*row) for row in rows]
+
+    def compare(self, old_year, new_year, dataset=DEFAULT_DATASET):
+        # Returns a dictionary of what changed between two vintages:
+        #     dropped     names only in old_year
+        #     added       names only in new_year
+        #     renamed     (old name, new name) pairs where a dropped variable's label and concept reappear under an
+        #                 added name
+        #     relabelled  (name, old label, new label) for names in both whose label changed
+        old = dict((variable.name, variable) for variable in self._query('1', [], old_year, dataset))
+        new = dict((variable.name, variable) for variable in self._query('1', [], new_year, dataset))
+
+        dropped = sorted(set(old) - set(new))
+        added = sorted(set(new) - set(old))
+
+        added_by_text = {}
+        for name in added:
+            added_by_text.setdefault((new[name].label, new[name].concept), []).append(name)
+        renamed = []
+        for name in dropped:
+            matches = added_by_text.get((old[name].label, old[name].concept))
+            if matches:
+                renamed.append((name, matches.pop(0)))
+
+        relabelled = [(name, old[name].label, new[name].label) for name in sorted(set(old) & set(new))
+                      if old[name].label != new[name].label]
+
+        return {'dropped': dropped, 'added': added, 'renamed': renamed, 'relabelled': relabelled}
@@ -0,0 +1,43 @@
+# Pipeline configuration read from a CreateTAIT script.
+#
+# The scripts keep their variable lists, derived fields and settings as plain literals at the top level, edited by
+# hand. Tools that run the pipeline outside ArcGIS (the batch runner, the benchmarks) read them straight out of a
+# script with ast rather than keeping copies that drift: load() returns every name in SETTINGS the script assigns
+# a literal to, without running the script or importing arcpy.
+
+import ast
+
+# Settings the pipeline needs, and must be in every script.
+REQUIRED = ['bg_desired_columns', 'tract_desired_columns', 'bg_derived_fields', 'tract_derived_fields',
+            'bg_apportioned_fields', 'calculation_fields', 'bg_output_columns']
+
+# Settings that are read when the script has them.
+OPTIONAL = ['state', 'counties', 'output_crs', 'output_formats', 'state_wide_tracts', 'max_requests',
+            'request_timeout', 'cache_size_mb', 'compact_tables', 'margins_of_error', 'ranked_fields',
+            'composite_indices', 'ranking_weight']
+
+SETTINGS = REQUIRED + OPTIONAL
+
+# Renames applied to the block group output after bg_output_columns are picked.
+BG_OUTPUT_RENAMES = {'CountyText': 'County', 'Tract_GEOID': 'TractID'}
+
+
+def load(script):
+    # Returns a dictionary of setting name -> value. Raises ValueError if a required setting is missing.
+    with open(script) as script_file:
+        module = ast.parse(script_file.read(), script)
+
+    config = {}
+    for node in module.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name in SETTINGS:
+                try:
+                    config[name] = ast.literal_eval(node.value)
+                except ValueError:
+                    raise ValueError('{} in {} is not a literal'.format(name, script))
+
+    missing = [name for name in REQUIRED if name not in config]
+    if missing:
+        raise ValueError('{} does not define {}'.format(script, ', '.join(missing)))
+    return config
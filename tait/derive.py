@@ -0,0 +1,172 @@
+# Declarative derived fields.
+#
+# Derived fields are declared as named sums and differences of source variables, e.g.
+#
+#     {'name': 'Age65Over', 'formula': 'sum(B01001_020..025, 044..049)'}
+#     {'name': 'TotalLEP', 'formula': 'SpanishLEP + IELEP + AsianLEP + OtherLEP'}
+#
+# A formula is a list of terms joined by + and -. A term is a census variable ('B01001_020E', or 'B01001_020' for
+# the estimate), a column or derived field name, or sum(...) over a comma separated list of those, where
+# 'B01001_020..025' is a range of variables in one table and a bare '044..049' continues the previous table.
+# Every formula is compiled into one column of a coefficient matrix over the raw variables, so all derived fields
+# are evaluated together as a single matrix product, however many of them there are. Fields whose raw variables
+# all have margins of error (moe.py) get theirs from a second product, of the squared margins with the squared
+# coefficients.
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from tait import moe, trace
+
+CENSUS_NAME = re.compile(r'^([A-Z]\d{5}[A-Z]{0,3})_(\d{3})([EM]?)$')
+RANGE = re.compile(r'^(?:([A-Z]\d{5}[A-Z]{0,3})_)?(\d{3})\.\.(\d{3})([EM]?)$')
+CONTINUATION = re.compile(r'^(\d{3})([EM]?)$')
+
+
+def split_terms(formula):
+    # 'A - sum(B, C) + D' -> [(1, 'A'), (-1, 'sum(B, C)'), (1, 'D')]
+    terms = []
+    sign = 1
+    depth = 0
+    current = ''
+    for char in formula:
+        if char in '+-' and depth == 0:
+            if not current.strip():
+                # A unary sign: '-' flips the sign of the term to come, '+' keeps it ('A - +B' is A - B).
+                if char == '-':
+                    sign = -sign
+                continue
+            terms.append((sign, current.strip()))
+            sign = 1 if char == '+' else -1
+            current = ''
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        current += char
+    if depth != 0 or not current.strip():
+        raise ValueError('Malformed formula: {}'.format(formula))
+    terms.append((sign, current.strip()))
+    return terms
+
+
+def expand_items(items):
+    # Expands the comma separated contents of sum(...) into individual references.
+    references = []
+    table = None
+    for item in [item.strip() for item in items.split(',')]:
+        match = RANGE.match(item)
+        if match:
+            table = match.group(1) or table
+            if table is None:
+                raise ValueError('Variable range {} has no table'.format(item))
+            suffix = match.group(4) or 'E'
+            for number in range(int(match.group(2)), int(match.group(3)) + 1):
+                references.append('{}_{:03d}{}'.format(table, number, suffix))
+            continue
+
+        match = CONTINUATION.match(item)
+        if match:
+            if table is None:
+                raise ValueError('Variable {} has no table'.format(item))
+            references.append('{}_{}{}'.format(table, match.group(1), match.group(2) or 'E'))
+            continue
+
+        match = CENSUS_NAME.match(item)
+        if match:
+            table = match.group(1)
+        references.append(item)
+    return references
+
+
+def normalise(reference):
+    # 'B01001_020' -> 'B01001_020E'; anything that is not a census variable is returned as is.
+    match = CENSUS_NAME.match(reference)
+    if match and not match.group(3):
+        return reference + 'E'
+    return reference
+
+
+def compile_fields(fields, specs, columns):
+    # Returns (source_columns, names, coefficients) where coefficients is a len(source_columns) x len(names) matrix
+    # such that frame[source_columns] @ coefficients gives every derived field. specs maps census variables to the
+    # frame's column names; columns lists the frame's columns, which may also be referenced directly.
+    census_columns = dict((spec['census_name'], spec['desc_name']) for spec in specs)
+    formulas = dict((field['name'], field['formula']) for field in fields)
+    available = set(columns)
+    resolved = {}
+
+    def resolve(name, stack):
+        # Returns {source column: coefficient} for a derived field.
+        if name in resolved:
+            return resolved[name]
+        if name in stack:
+            raise ValueError('Derived field {} is defined in terms of itself'.format(name))
+
+        weights = {}
+        for sign, term in split_terms(formulas[name]):
+            if term.startswith('sum(') and term.endswith(')'):
+                references = expand_items(term[4:-1])
+            else:
+                references = expand_items(term)
+            for reference in references:
+                for column, weight in reference_weights(normalise(reference), stack + [name]).items():
+                    weights[column] = weights.get(column, 0) + sign * weight
+        resolved[name] = weights
+        return weights
+
+    def reference_weights(reference, stack):
+        if reference in census_columns:
+            return {census_columns[reference]: 1}
+        if reference in formulas:
+            return resolve(reference, stack)
+        if reference in available:
+            return {reference: 1}
+        raise ValueError('{} is not a requested variable, a column or a derived field'.format(reference))
+
+    names = [field['name'] for field in fields]
+    for name in names:
+        resolve(name, [])
+
+    source_columns = []
+    for name in names:
+        for column in resolved[name]:
+            if column not in source_columns:
+                source_columns.append(column)
+
+    coefficients = np.zeros((len(source_columns), len(names)))
+    for j, name in enumerate(names):
+        for column, weight in resolved[name].items():
+            coefficients[source_columns.index(column), j] = weight
+
+    return source_columns, names, coefficients
+
+
+@trace.traced('derive')
+def derive(frame, fields, specs=()):
+    # Adds every field in fields to frame in one pass and returns the new frame. Derived fields are integers when
+    # all their sources are.
+    trace.add(rows=len(frame))
+    source_columns, names, coefficients = compile_fields(fields, specs, frame.columns)
+
+    block = frame[source_columns].to_numpy(dtype=np.float64)
+    values = block.dot(coefficients)
+
+    derived = pd.DataFrame(values, columns=names, index=frame.index)
+    if all(frame[column].dtype.kind in 'iu' for column in source_columns):
+        derived = derived.round().astype('int64')
+
+    # Root sum of squares over the raw variables, for the fields that use only variables with margins.
+    has_moe = np.array([moe.name(column) in frame.columns for column in source_columns], dtype=bool)
+    with_moe = [j for j in range(len(names)) if not coefficients[~has_moe, j].any()] if has_moe.any() else []
+    if with_moe:
+        margins = frame[[moe.name(column) for column in np.array(source_columns)[has_moe]]].to_numpy(dtype=np.float64)
+        squares = np.square(margins).dot(np.square(coefficients[np.ix_(has_moe, with_moe)]))
+        margins = pd.DataFrame(np.sqrt(squares), columns=[moe.name(names[j]) for j in with_moe], index=frame.index)
+        derived = pd.concat([derived, margins], axis=1)
+
+    return pd.concat([frame.drop(columns=[name for name in derived.columns if name in frame.columns]), derived],
+                     axis=1)
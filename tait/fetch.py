@@ -0,0 +1,177 @@
+# Concurrent fetch layer for the Census Bureau API.
+#
+# Every (variable chunk x county x geography) combination a script needs is described as an ApiRequest.
+# fetch_all() sends them over a bounded thread pool and hands the JSON payloads back in the same order the
+# requests were given, so dataframes built from the results are identical to the ones the old serial
+# urlopen loops produced. A full region pull now takes about as long as its slowest request.
+# Passing a cache.ResponseCache serves repeat requests from disk without touching the network.
+
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+import numpy as np
+
+from tait import trace
+
+API_ROOT = 'https://api.census.gov/data'
+
+# Number of requests allowed in flight at once. The API copes well with a handful of simultaneous
+# connections from one client; going much higher tends to get requests throttled.
+MAX_WORKERS = 8
+
+# Seconds to wait on any single request before it is retried or given up on.
+TIMEOUT = 60
+
+# Number of extra attempts for requests that time out or come back with a server-side error.
+RETRIES = 2
+
+# One API call. variables is a tuple of census names (e.g. 'B01001_001E'), county is a three digit FIPS
+# string or None for a state-wide request, and geography is the API's 'for=' level ('tract', 'block group').
+ApiRequest = namedtuple('ApiRequest', ['year', 'dataset', 'variables', 'state', 'county', 'geography'])
+
+
+# Header names the API gives the geography columns it appends to every row, per 'for=' geography.
+GEOGRAPHY_HEADERS = {'block group': ['state', 'county', 'tract', 'block group'],
+                     'tract': ['state', 'county', 'tract'],
+                     'county': ['state', 'county']}
+
+
+def make_request(year, variables, state, county, geography, dataset='acs/acs5'):
+    # variables may be the scripts' usual list of {'desc_name', 'census_name'} dictionaries or plain census names.
+    names = tuple(v['census_name'] if isinstance(v, dict) else v for v in variables)
+    return ApiRequest(str(year), dataset, names, str(state), county, geography)
+
+
+def build_url(request):
+    url = '{}/{}/{}?get={}'.format(API_ROOT, request.year, request.dataset, ','.join(request.variables))
+
+    if request.geography == 'county':
+        return url + '&for=county:{}&in=state:{}'.format(request.county or '*', request.state)
+
+    if request.county is None:
+        url += '&in=state:{}'.format(request.state)
+    else:
+        url += '&in=state:{}%20county:{}'.format(request.state, request.county)
+
+    return url + '&for={}'.format(request.geography.replace(' ', '%20'))
+
+
+def fetch_one(request, timeout=TIMEOUT, retries=RETRIES, cache=None):
+    # Returns the decoded JSON payload (a list of rows, the first being the header).
+    with trace.span('request', county=request.county or '*', geography=request.geography) as request_span:
+        results = cache.get(request) if cache is not None else None
+        if results is not None:
+            request_span.add(bytes=len(results), cached=1)
+        else:
+            results = fetch_body(request, timeout, retries)
+            request_span.add(bytes=len(results))
+            if cache is not None:
+                cache.put(request, results)
+
+        # The API answers a query that matches no geographies with an empty 204 response.
+        if not results:
+            return []
+
+        payload = json.loads(results)
+        request_span.add(rows=max(len(payload) - 1, 0))
+        return payload
+
+
+def fetch_body(request, timeout=TIMEOUT, retries=RETRIES):
+    # Returns the raw response body, retrying timeouts and server-side errors.
+    url = build_url(request)
+
+    for attempt in range(retries + 1):
+        try:
+            with urlopen(url, timeout=timeout) as apicall:
+                return apicall.read()
+        except HTTPError as e:
+            # 4xx responses (bad variable name, bad geography) will not get better by asking again.
+            if (e.code < 500 and e.code != 429) or attempt == retries:
+                raise RuntimeError('Census API request failed ({}): {}'.format(e.code, url))
+        except (URLError, OSError):
+            if attempt == retries:
+                raise RuntimeError('Census API request timed out or could not connect: {}'.format(url))
+        time.sleep(2 ** attempt)
+
+
+def fetch_all(requests, max_workers=MAX_WORKERS, timeout=TIMEOUT, retries=RETRIES, cache=None):
+    # Payloads come back in the order of the requests regardless of which one finishes first.
+    requests = list(requests)
+    if not requests:
+        return []
+
+    workers = max(1, min(max_workers, len(requests)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda request: fetch_one(request, timeout, retries, cache), requests))
+
+
+def fetch_plan(year, state, counties, plan, message=print, **kwargs):
+    # plan is a list of planner.PlannedChunk. Every chunk is requested for every county (or once for the whole
+    # state when the chunk is state_wide) in a single concurrent batch. Returns one list per chunk holding the
+    # data rows (header removed) of each of its requests, in county order. State-wide responses are cut down to
+    # the requested counties, and whole-table (group) responses to the chunk's variables.
+    return fetch_plans([[year, state, counties, plan]], message, **kwargs)[0]
+
+
+@trace.traced('fetch')
+def fetch_plans(jobs, message=print, **kwargs):
+    # Like fetch_plan() for several [year, state, counties, plan] jobs at once (years of a batch, regions of a
+    # runner): every request of every job goes into the same concurrent batch, so they share one limit on requests
+    # in flight and one cache. Returns fetch_plan()'s result for each job, in order.
+    requests = []
+    owners = []
+    for j, (year, state, counties, plan) in enumerate(jobs):
+        for i, chunk in enumerate(plan):
+            variables = ['group({})'.format(chunk.group)] if chunk.group else chunk.specs
+            for county in ([None] if chunk.state_wide else list(counties)):
+                requests.append(make_request(year, variables, state, county, chunk.geography))
+                owners.append((j, i))
+
+    message('Requesting {} URLs from the Census API...'.format(len(requests)))
+    payloads = fetch_all(requests, **kwargs)
+
+    results = [[[] for chunk in job[3]] for job in jobs]
+    for (j, i), payload in zip(owners, payloads):
+        chunk = jobs[j][3][i]
+        if chunk.group:
+            payload = project(payload, chunk.specs, chunk.geography)
+        if chunk.state_wide:
+            results[j][i].append(filter_counties(payload, list(jobs[j][2])))
+        else:
+            results[j][i].append(payload[1:])
+    return results
+
+
+def filter_counties(payload, counties):
+    # Cuts a state-wide payload down to the data rows for the given counties with a single vectorised mask.
+    # Rows keep the order the API returned them in.
+    if len(payload) < 2:
+        return []
+
+    table = np.array(payload[1:], dtype=object)
+    county_col = payload[0].index('county')
+    mask = np.isin(table[:, county_col].astype(str), np.array(counties, dtype=str))
+    return table[mask].tolist()
+
+
+def project(payload, specs, geography):
+    # Cuts a group() payload down to the specs' variables followed by the geography columns, in that order, so it
+    # looks like the payload of a request that named them.
+    if not payload:
+        return payload
+    header = payload[0]
+    names = [spec['census_name'] for spec in specs] + GEOGRAPHY_HEADERS[geography]
+    missing = [name for name in names if name not in header]
+    if missing:
+        raise RuntimeError('Census API table response is missing {}'.format(', '.join(missing)))
+
+    columns = [header.index(name) for name in names]
+    if len(payload) < 2:
+        return [names]
+    table = np.array(payload[1:], dtype=object)
+    return [names] + table[:, columns].tolist()
@@ -0,0 +1,65 @@
+# State and county FIPS reference table.
+#
+# County names come from a table bundled in tait/data, one file per vintage of the Census Bureau's county list
+# (county_names_<vintage>.csv with state, county and name columns). It is read once per run and used to label
+# every row of a frame with a single categorical join, so the cost is one pass however many counties a region
+# has. A county code that is not in the table is an error rather than a silently empty name.
+#
+# The bundled 2020 table has every county and county equivalent of the 50 states, the District of Columbia and
+# Puerto Rico (the ACS's geography), from the Census Bureau's 2020 FIPS code list, with ' County' dropped from the
+# names (parishes, boroughs, census areas and independent cities keep theirs: 'St. Louis city'). Connecticut has
+# its 8 counties, which the ACS replaced with 9 planning regions from 2022; a later vintage needs its own table.
+
+import os
+
+import pandas as pd
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Vintage of the county list used unless another is asked for.
+VINTAGE = '2020'
+
+_tables = {}
+
+
+def load_counties(vintage=VINTAGE):
+    # Returns the state, county, name table for a vintage as a dataframe of strings.
+    if vintage not in _tables:
+        path = os.path.join(DATA_FOLDER, 'county_names_{}.csv'.format(vintage))
+        if not os.path.exists(path):
+            raise ValueError('No bundled county name table for vintage {}'.format(vintage))
+        _tables[vintage] = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return _tables[vintage]
+
+
+def county_names(state, counties=None, vintage=VINTAGE):
+    # Returns a dictionary of county FIPS code -> name for a state, limited to counties if given. Raises ValueError
+    # listing any county code the table does not have.
+    table = load_counties(vintage)
+    table = table[table['state'] == str(state)]
+    names = dict(zip(table['county'], table['name']))
+
+    if counties is None:
+        if not names:
+            raise ValueError('No counties for state {} in the {} county name table'.format(state, vintage))
+        return names
+
+    missing = [county for county in counties if county not in names]
+    if missing:
+        raise ValueError('Counties {} of state {} are not in the {} county name table'.format(
+            ', '.join(missing), state, vintage))
+    return dict((county, names[county]) for county in counties)
+
+
+def add_county_names(frame, state, county_column='County', name_column='CountyText', vintage=VINTAGE):
+    # Returns frame with name_column added, holding the name of each row's county as a categorical column. Every
+    # county code is looked up once, not once per row.
+    codes = pd.Categorical(frame[county_column])
+    names = county_names(state, list(codes.categories), vintage)
+    if codes.isna().any():
+        raise ValueError('{} rows have no {} code'.format(int(codes.isna().sum()), county_column))
+
+    # Joined on rather than inserted, which a frame of many separately typed columns (layout.compact()) warns about.
+    column = pd.Series(codes.rename_categories([names[county] for county in codes.categories]), index=frame.index,
+                       name=name_column)
+    return pd.concat([frame.drop(columns=[name_column], errors='ignore'), column], axis=1)
@@ -0,0 +1,51 @@
+# Integer GEOID keys.
+#
+# A GEOID is the concatenation of fixed-width FIPS codes (state 2, county 3, tract 6, block group 1 digits), so it
+# can be packed into one int64 by treating each code as a group of decimal digits:
+#
+#     block group   480851234561  = state * 10**10 + county * 10**7 + tract * 10 + bg
+#     tract          48085123456  = state * 10**9  + county * 10**6 + tract
+#     county               48085  = state * 10**3  + county
+#
+# Packed keys hash and compare as plain integers instead of strings, and a block group's parent tract is just its
+# key divided by 10 (a tract's county, its key divided by 10**6). Frames are indexed and sorted by their key, so
+# chunks of the same geography line up row for row and parent lookups are a binary search over a sorted array.
+
+import numpy as np
+
+from tait import parse, planner
+
+# Number of decimal digits each geography's key takes, and the divisor that turns it into its parent's key.
+WIDTHS = {'county': 5, 'tract': 11, 'block group': 12}
+PARENT_DIVISORS = {'block group': 10, 'tract': 10 ** 6}
+PARENTS = {'block group': 'tract', 'tract': 'county'}
+
+
+def pack(frame, geography):
+    # Returns the int64 keys of frame's rows from its State, County, Tract and BG columns.
+    keys = np.zeros(len(frame), dtype=np.int64)
+    for name in planner.GEOGRAPHY_COLUMNS[geography]:
+        keys = keys * 10 ** parse.GEOGRAPHY_WIDTHS[name] + frame[name].to_numpy().astype(np.int64)
+    return keys
+
+
+def parent(keys, geography):
+    # Keys of the tracts containing block groups, or of the counties containing tracts.
+    return np.asarray(keys, dtype=np.int64) // PARENT_DIVISORS[geography]
+
+
+def to_string(keys, geography):
+    # Zero-padded GEOID strings for packed keys.
+    keys = np.asarray(keys, dtype=np.int64)
+    if not len(keys):
+        return keys.astype(object)
+    return np.char.zfill(keys.astype(str), WIDTHS[geography]).astype(object)
+
+
+def lookup(sorted_keys, keys):
+    # Positions of keys in sorted_keys, or -1 where a key is missing.
+    sorted_keys = np.asarray(sorted_keys, dtype=np.int64)
+    if not len(sorted_keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[positions] == keys, positions, -1)
@@ -0,0 +1,243 @@
+# Geometry backends for the spatial half of the scripts.
+#
+# The scripts' geometry work comes down to four steps, each of which is a method on a backend:
+#
+#     load()       copy a block group or tract source, cut down to the region's counties, keeping only its GEOID
+#                  (from a geostore.GeographyStore when the backend has one and the same clip has been made before)
+#     join()       attach the results table to the copied geography on GEOID
+#     add_area()   add land area in square miles (LandSqM) and population density (PopDen)
+#     save()       write the finished layer out
+#
+# copy() duplicates a loaded layer, so runs over several years can load and clip each geography vintage once.
+#
+# ArcpyBackend runs them with ArcGIS tools (FeatureClassToFeatureClass, arcpy.da.ExtendTable, CalculateField,
+# CreateFileGDB, CopyFeatures) and needs an ArcGIS licence. The results are handed to ArcGIS as a NumPy structured
+# array rather than through a csv written to disk and read back in with TableToTable. GeoPandasBackend runs the same
+# steps with GeoPandas, shapely and pyogrio, so the whole pipeline can run headless on any machine: sources are
+# read with an attribute filter on the county field, reprojected to the configured CRS (EPSG:2276, Texas North
+# Central, unless told otherwise), areas are computed for every polygon at once, and output goes to a GeoPackage
+# or GeoParquet file. Layers are referred to by name in both backends.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from tait import numeric, trace
+
+# CRS areas are measured in unless a backend is given another. NAD 83 Texas State Plane North Central, US feet.
+CRS = 2276
+
+SQUARE_METRES_PER_SQUARE_MILE = 2589988.110336
+
+BACKENDS = ['arcpy', 'geopandas']
+
+
+def county_where(county_field, counties):
+    # "COUNTYFP10 IN ('085','113')"
+    return "{} IN ({})".format(county_field, ','.join("'{}'".format(county) for county in counties))
+
+
+def structured_array(frame):
+    # Converts frame to a NumPy structured array arcpy.da can read: whole numbers become LONG (or DOUBLE when they
+    # do not fit), text and categories become fixed-width TEXT and boolean flags become 'Y'/'N' TEXT, as they were
+    # when the table went through a csv.
+    fields = []
+    columns = []
+    for name in frame.columns:
+        values = frame[name]
+        if values.dtype.kind == 'b':
+            column = np.where(values.to_numpy(), 'Y', 'N')
+        elif values.dtype.kind in 'iu':
+            column = values.to_numpy()
+            in_range = len(column) == 0 or (column.min() >= -2 ** 31 and column.max() < 2 ** 31)
+            column = column.astype('<i4' if in_range else '<f8')
+        elif values.dtype.kind == 'f':
+            column = values.to_numpy(dtype='<f8')
+        else:
+            column = values.astype(object).where(values.notna(), '').astype(str).to_numpy().astype('U')
+        fields.append((str(name), column.dtype))
+        columns.append(column)
+
+    array = np.empty(len(frame), dtype=fields)
+    for (name, dtype), column in zip(fields, columns):
+        array[name] = column
+    return array
+
+
+class ArcpyBackend(object):
+
+    def __init__(self, crs=CRS, message=None, store=None):
+        import arcpy
+        self.arcpy = arcpy
+        self.crs = crs
+        self.message = message or arcpy.AddMessage
+        self.workspace = arcpy.env.workspace
+        self.store = store
+
+    @trace.traced('geography.load')
+    def load(self, source, name, geoid_field, county_field, counties, vintage=None):
+        arcpy = self.arcpy
+        self.message('Loading {} geography...'.format(name))
+
+        stored = None
+        if self.store is not None:
+            key = self.store.key(arcpy.Describe(source).catalogPath, vintage, counties, geoid_field, county_field,
+                                 self.crs)
+            stored = os.path.join(self.store.path('geography', '.gdb'), 'g_{}'.format(key[:24]))
+            if not self.store.refresh and arcpy.Exists(stored):
+                arcpy.CopyFeatures_management(stored, os.path.join(self.workspace, name))
+                return
+
+        # Copies are projected to the backend's CRS, whatever the script set the environment to.
+        arcpy.env.outputCoordinateSystem = arcpy.SpatialReference(self.crs)
+        fieldmappings = arcpy.FieldMappings()
+        fieldmap = arcpy.FieldMap()
+        fieldmap.addInputField(source, geoid_field)
+        fieldmappings.addFieldMap(fieldmap)
+        arcpy.FeatureClassToFeatureClass_conversion(source, self.workspace, name, county_where(county_field, counties),
+                                                    fieldmappings)
+
+        if stored is not None:
+            # File geodatabase feature classes carry a spatial index; the GEOID field gets an attribute index.
+            if not arcpy.Exists(os.path.dirname(stored)):
+                arcpy.CreateFileGDB_management(self.store.folder, 'geography.gdb')
+            arcpy.CopyFeatures_management(name, stored)
+            arcpy.AddIndex_management(stored, geoid_field, '{}_idx'.format(geoid_field))
+
+    @trace.traced('geography.copy')
+    def copy(self, name, new_name):
+        # Copies a loaded layer, so one clip of the geography can be joined to several tables.
+        arcpy = self.arcpy
+        if arcpy.Exists(new_name):
+            arcpy.Delete_management(new_name)
+        arcpy.CopyFeatures_management(name, os.path.join(self.workspace, new_name))
+
+    @trace.traced('geography.join')
+    def join(self, name, frame, geoid_field, key='GEOID'):
+        # Hands frame to ArcGIS as a NumPy structured array, with no table written to disk and read back.
+        arcpy = self.arcpy
+        arcpy.da.ExtendTable(name, geoid_field, structured_array(frame), key, append_only=False)
+        if key != geoid_field and arcpy.ListFields(name, key):
+            arcpy.DeleteField_management(name, key)
+
+    @trace.traced('geography.add_area')
+    def add_area(self, name, population_field='Total_Pop'):
+        arcpy = self.arcpy
+        self.message('Calculating land area...')
+        arcpy.AddField_management(name, 'LandSqM', 'DOUBLE')
+        arcpy.CalculateField_management(name, 'LandSqM', '!Shape.Area@SQUAREMILES!', 'PYTHON')
+
+        self.message('Calculating pop density...')
+        arcpy.AddField_management(name, 'PopDen', 'DOUBLE')
+        arcpy.CalculateField_management(name, 'PopDen', '!{}!/!Shape.Area@SQUAREMILES!'.format(population_field),
+                                        'PYTHON')
+
+    @trace.traced('geography.save')
+    def save(self, name, folder, output_name):
+        # Writes the layer to <folder>\<output_name>.gdb\<output_name>, replacing any existing geodatabase.
+        arcpy = self.arcpy
+        self.message('Copying output feature class...')
+        gdb = os.path.join(folder, '{}.gdb'.format(output_name))
+        if arcpy.Exists(gdb):
+            arcpy.Delete_management(gdb)
+        arcpy.CreateFileGDB_management(folder, '{}.gdb'.format(output_name))
+        arcpy.CopyFeatures_management(name, os.path.join(gdb, output_name))
+        return os.path.join(gdb, output_name)
+
+
+class GeoPandasBackend(object):
+
+    # Output formats save() can write, and their file extensions.
+    FORMATS = {'gpkg': '.gpkg', 'geoparquet': '.parquet'}
+
+    def __init__(self, crs=CRS, message=print, output_format='gpkg', store=None):
+        import geopandas
+        if output_format not in self.FORMATS:
+            raise ValueError('Unknown geometry output format: {}'.format(output_format))
+        self.geopandas = geopandas
+        self.crs = crs
+        self.message = message
+        self.output_format = output_format
+        self.store = store
+        self.layers = {}
+
+    @trace.traced('geography.load')
+    def load(self, source, name, geoid_field, county_field, counties, vintage=None):
+        # source is any file pyogrio can read: a shapefile, GeoPackage, File Geodatabase feature class, etc.
+        self.message('Loading {} geography...'.format(name))
+
+        stored = None
+        if self.store is not None:
+            stored = self.store.path(self.store.key(source, vintage, counties, geoid_field, county_field, self.crs),
+                                     '.parquet')
+            if self.store.has(stored):
+                layer = self.geopandas.read_parquet(stored)
+                # Builds the spatial index now rather than on first use.
+                layer.sindex
+                self.layers[name] = layer
+                return
+
+        # The county field has to be read for the where clause to see it.
+        layer = self.geopandas.read_file(source, columns=[geoid_field, county_field],
+                                         where=county_where(county_field, counties), engine='pyogrio')
+        layer = layer[[geoid_field, 'geometry']].to_crs(self.crs)
+        layer = layer.sort_values(geoid_field, kind='stable').reset_index(drop=True)
+
+        if stored is not None:
+            # Sorted by GEOID, so the Parquet statistics double as a GEOID index, with a bounding box column for
+            # spatial filtering.
+            temp_path = stored + '.tmp'
+            layer.to_parquet(temp_path, write_covering_bbox=True)
+            os.replace(temp_path, stored)
+
+        # Builds the spatial index now rather than on first use.
+        layer.sindex
+        self.layers[name] = layer
+
+    @trace.traced('geography.copy')
+    def copy(self, name, new_name):
+        # Copies a loaded layer, so one clip of the geography can be joined to several tables.
+        self.layers[new_name] = self.layers[name].copy()
+
+    @trace.traced('geography.join')
+    def join(self, name, frame, geoid_field, key='GEOID'):
+        # Left join, like JoinField: every shape is kept whether or not it has results. The shapes' rows in frame are
+        # looked up through frame's GEOID index in one pass.
+        layer = self.layers[name]
+        table = frame.set_index(key)
+        if not table.index.is_unique:
+            raise ValueError('{} is not unique in the table joined to {}'.format(key, name))
+        rows = table.reindex(layer[geoid_field].to_numpy())
+        rows = rows.drop(columns=[column for column in rows.columns if column in layer.columns])
+        rows.index = layer.index
+        self.layers[name] = pd.concat([layer, rows], axis=1)
+
+    @trace.traced('geography.add_area')
+    def add_area(self, name, population_field='Total_Pop'):
+        self.message('Calculating land area and pop density...')
+        layer = self.layers[name]
+        metres_per_unit = layer.crs.axis_info[0].unit_conversion_factor
+        layer['LandSqM'] = layer.geometry.area.to_numpy() * metres_per_unit ** 2 / SQUARE_METRES_PER_SQUARE_MILE
+        layer['PopDen'] = numeric.safe_divide(layer[population_field].to_numpy(dtype='float64'), layer['LandSqM'])
+
+    @trace.traced('geography.save')
+    def save(self, name, folder, output_name):
+        # Writes the layer to <folder>/<output_name>.gpkg (layer output_name) or <folder>/<output_name>.parquet.
+        self.message('Writing output {}...'.format(self.output_format))
+        layer = self.layers[name]
+        path = os.path.join(folder, output_name + self.FORMATS[self.output_format])
+        if self.output_format == 'gpkg':
+            layer.to_file(path, layer=output_name, driver='GPKG', engine='pyogrio')
+        else:
+            layer.to_parquet(path)
+        return path
+
+
+def get_backend(name, crs=CRS, message=None, **kwargs):
+    # Returns the backend called name ('arcpy' or 'geopandas'). kwargs are passed on, e.g. store.
+    if name == 'arcpy':
+        return ArcpyBackend(crs, message, **kwargs)
+    if name == 'geopandas':
+        return GeoPandasBackend(crs, message or print, **kwargs)
+    raise ValueError('Unknown geometry backend: {}'.format(name))
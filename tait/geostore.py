@@ -0,0 +1,64 @@
+# On-disk store of geography already cut down to a region.
+#
+# Loading the block group and tract geography means reading the whole source layer and applying a county where
+# clause, every run, even though the boundaries only change with a new decennial vintage. The store keeps the
+# result of that step: the clipped, GEOID-only shapes, already in the output CRS and sorted by GEOID. Entries are
+# named by a hash of everything that decides their contents: a fingerprint of the source data (its path, size and
+# modification time, so an edited or replaced source is read again), the vintage, the sorted county list, the
+# GEOID and county fields and the CRS.
+#
+# GeographyStore only works out keys and paths; each geometry backend reads and writes entries in a format it can
+# open (GeoParquet for GeoPandas, a file geodatabase feature class for arcpy). See geometry.py.
+
+import hashlib
+import json
+import os
+
+
+def is_lock(name):
+    # ArcGIS lock files: '_gdb.<host>.<pid>.<n>.sr.lock' in a file geodatabase, '<name>.<host>.<pid>.<n>.sr.lock'
+    # beside a shapefile.
+    return name.endswith('.lock')
+
+
+def fingerprint(source):
+    # Returns [path, size, modified time] for source. A path inside a file geodatabase ('x.gdb/bg') is fingerprinted
+    # by its geodatabase folder, and a shapefile together with its sidecar files. Lock files are left out: ArcGIS
+    # creates and removes them in a geodatabase (and beside a shapefile) whenever it opens one, source included.
+    path = os.path.abspath(source)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            raise ValueError('Geography source {} does not exist'.format(source))
+        path = parent
+
+    if os.path.isdir(path):
+        files = [os.path.join(folder, name) for folder, _, names in os.walk(path) for name in names
+                 if not is_lock(name)]
+    else:
+        stem = os.path.splitext(path)[0]
+        folder = os.path.dirname(path)
+        files = [os.path.join(folder, name) for name in os.listdir(folder)
+                 if os.path.splitext(os.path.join(folder, name))[0] == stem and not is_lock(name)]
+
+    stats = [os.stat(name) for name in files] or [os.stat(path)]
+    return [path, sum(stat.st_size for stat in stats), max(stat.st_mtime for stat in stats)]
+
+
+class GeographyStore(object):
+
+    def __init__(self, folder, refresh=False):
+        # refresh=True reads every source again and replaces what is stored.
+        self.folder = folder
+        self.refresh = refresh
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, source, vintage, counties, geoid_field, county_field, crs):
+        key = json.dumps([fingerprint(source), str(vintage), sorted(counties), geoid_field, county_field, str(crs)])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def path(self, key, extension=''):
+        return os.path.join(self.folder, key + extension)
+
+    def has(self, path):
+        return not self.refresh and os.path.exists(path)
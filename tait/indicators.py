@@ -0,0 +1,122 @@
+# Percentage, regional ratio and above-regional-percentage (ARP) indicators.
+#
+# Each calculation_fields entry names a variable, its universe and the pct and ratio columns to create, and may
+# name an 'arp' flag column. Rather than walking the entries one at a time, compute() gathers every variable and
+# every universe into two matrices (one column per entry) and works out all of the percentages, regional shares,
+# ratios and flags with whole-array operations:
+#
+#     pct      = variable / universe                        per block group
+#     regional = sum(variable) / sum(universe)              per entry, over the whole region
+#     ratio    = pct / regional
+#     arp      = ratio >= 1
+#
+# Dividing by a zero universe (a block group with no population, or a region with no households) is done
+# explicitly instead of leaving inf and NaN behind: those cells get empty_value and never raise an ARP flag.
+# Missing values in a variable are left out of the regional sums, as pandas' sum() did.
+# Flags are boolean columns.
+#
+# Entries whose variable and universe both have margins of error (moe.py) also get <pct>_MOE and <ratio>_MOE: the
+# percentage's by the proportion formula and the ratio's by the ratio formula, with the regional percentage's
+# margin taken from the root sum of squares of the block groups' margins.
+
+import numpy as np
+import pandas as pd
+
+from tait import moe, numeric, trace
+
+
+def totals(frame, fields):
+    # Returns the sums of every field's variable and of its universe over frame's rows, as two arrays.
+    variables = frame[[field['variable'] for field in fields]].to_numpy(dtype=np.float64)
+    universes = frame[[field['universe'] for field in fields]].to_numpy(dtype=np.float64)
+    return np.nansum(variables, axis=0), np.nansum(universes, axis=0)
+
+
+def regional_rates(variable_totals, universe_totals):
+    # Regional percentage of each field from totals(); NaN where the universe's total is 0.
+    return numeric.safe_divide(np.asarray(variable_totals, dtype=np.float64),
+                               np.asarray(universe_totals, dtype=np.float64), np.nan)
+
+
+def moe_columns(frame, fields):
+    # Positions of the fields whose variable and universe both have margins of error in frame.
+    return [j for j, field in enumerate(fields)
+            if moe.name(field['variable']) in frame.columns and moe.name(field['universe']) in frame.columns]
+
+
+def moe_totals(frame, fields):
+    # Returns the sums of the squared margins of every field's variable and universe, as two arrays; NaN for fields
+    # without margins.
+    variable_squares = np.full(len(fields), np.nan)
+    universe_squares = np.full(len(fields), np.nan)
+    with_moe = moe_columns(frame, fields)
+    if with_moe:
+        variable_squares[with_moe] = moe.sum_of_squares(
+            frame[[moe.name(fields[j]['variable']) for j in with_moe]].to_numpy(dtype=np.float64))
+        universe_squares[with_moe] = moe.sum_of_squares(
+            frame[[moe.name(fields[j]['universe']) for j in with_moe]].to_numpy(dtype=np.float64))
+    return variable_squares, universe_squares
+
+
+def regional_margins(variable_totals, universe_totals, variable_squares, universe_squares):
+    # Margin of error of each regional percentage from totals() and moe_totals(); NaN where there is none.
+    rates = regional_rates(variable_totals, universe_totals)
+    return moe.proportion(rates, np.sqrt(variable_squares), np.sqrt(universe_squares), universe_totals, np.nan)
+
+
+@trace.traced('indicators')
+def compute(frame, fields, empty_value=0.0, message=print, regional=None, regional_moe=None):
+    # Adds the pct, ratio and any arp columns of every entry in fields to frame and returns the new frame. The
+    # ratios are taken against frame's own regional percentages unless regional gives them (regional_rates()), as
+    # it does when frame is one part of a larger region; regional_moe then gives their margins
+    # (regional_margins()).
+    trace.add(rows=len(frame))
+    variables = frame[[field['variable'] for field in fields]].to_numpy(dtype=np.float64)
+    universes = frame[[field['universe'] for field in fields]].to_numpy(dtype=np.float64)
+
+    pct = numeric.safe_divide(variables, universes, empty_value)
+    if regional is None:
+        regional = regional_rates(np.nansum(variables, axis=0), np.nansum(universes, axis=0))
+    ratio = numeric.safe_divide(pct, regional, empty_value)
+    ratio[:, np.isnan(regional)] = empty_value
+
+    empty = universes == 0
+    for j, field in enumerate(fields):
+        count = int(empty[:, j].sum())
+        if count:
+            message('{} of {} rows have no {}; {} and {} set to {}'.format(count, len(frame), field['universe'],
+                                                                           field['pct'], field['ratio'], empty_value))
+        if np.isnan(regional[j]):
+            message('Regional {} is 0; {} set to {}'.format(field['universe'], field['ratio'], empty_value))
+
+    columns = {}
+    for j, field in enumerate(fields):
+        columns[field['pct']] = pct[:, j]
+        columns[field['ratio']] = ratio[:, j]
+
+    with_moe = moe_columns(frame, fields)
+    if with_moe:
+        variable_moe = frame[[moe.name(fields[j]['variable']) for j in with_moe]].to_numpy(dtype=np.float64)
+        universe_moe = frame[[moe.name(fields[j]['universe']) for j in with_moe]].to_numpy(dtype=np.float64)
+        if regional_moe is None:
+            regional_moe = np.full(len(fields), np.nan)
+            regional_moe[with_moe] = regional_margins(
+                np.nansum(variables[:, with_moe], axis=0), np.nansum(universes[:, with_moe], axis=0),
+                moe.sum_of_squares(variable_moe), moe.sum_of_squares(universe_moe))
+        pct_moe = moe.proportion(pct[:, with_moe], variable_moe, universe_moe, universes[:, with_moe], empty_value)
+        ratio_moe = moe.ratio(ratio[:, with_moe], pct_moe, np.asarray(regional_moe)[with_moe],
+                              regional[with_moe], empty_value)
+        ratio_moe[:, np.isnan(regional[with_moe])] = empty_value
+        for k, j in enumerate(with_moe):
+            columns[moe.name(fields[j]['pct'])] = pct_moe[:, k]
+            columns[moe.name(fields[j]['ratio'])] = ratio_moe[:, k]
+
+    flagged = [j for j, field in enumerate(fields) if field.get('arp')]
+    if flagged:
+        flags = (ratio[:, flagged] >= 1.0) & ~empty[:, flagged]
+        for k, j in enumerate(flagged):
+            columns[fields[j]['arp']] = flags[:, k]
+
+    indicators = pd.DataFrame(columns, index=frame.index)
+    return pd.concat([frame.drop(columns=[name for name in indicators.columns if name in frame.columns]),
+                      indicators], axis=1)
@@ -0,0 +1,107 @@
+# Memory layout of the pipeline's tables.
+#
+# Parsed counts arrive as int64 and GEOIDs and FIPS codes as strings, so a block group table with well over 100
+# columns takes several times the memory its values need. compact() applies one layout policy to a table, at
+# ingest and again after the derived, apportioned and indicator fields are added:
+#
+#     counts       integer columns -> the smallest unsigned type that holds every value (uint8 up to uint32 for
+#                  ACS counts); signed when a column has a negative value
+#     FIPS codes   State and County -> categorical
+#     GEOIDs       GEOID, Tract_GEOID and County_GEOID -> packed int64 keys (geoid.py)
+#     flags        'Y'/'N' text columns -> bool (compute()'s ARP flags already are)
+#     pct, ratio   the float columns named by the caller (indicator_columns()) -> float32, which keeps about 7
+#                  significant digits
+#
+# Every call reports the table's size before and after. Packed GEOIDs are not what the outputs or the geography
+# join expect, so expand() turns them back into zero-padded strings on the way out; the rest of the layout is
+# written as it is (Parquet and Feather keep the narrow types, the geometry backends widen them as they need),
+# except for tables written in parts, whose counts go back to int64 (widen_counts()).
+
+import numpy as np
+import pandas as pd
+
+from tait import builder, geoid, moe, trace
+
+# FIPS code columns kept as categories.
+CODE_COLUMNS = ['State', 'County']
+
+# GEOID column -> geography it is the key of.
+GEOID_GEOGRAPHIES = dict((column, geography) for geography, column in builder.GEOID_COLUMNS.items())
+
+FLAG_VALUES = {'Y': True, 'N': False}
+
+
+def indicator_columns(fields):
+    # pct and ratio columns of calculation_fields entries, and their margins of error.
+    columns = [field[key] for field in fields for key in ['pct', 'ratio']]
+    return columns + [moe.name(column) for column in columns]
+
+
+def column_bytes(values):
+    # Bytes held by a column's values. A categorical column's are its codes and categories, without the lookup table
+    # pandas builds (and memory_usage() counts) once the categories are searched.
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = pd.Series(values.cat.categories)
+        return int(values.cat.codes.nbytes + categories.memory_usage(index=False, deep=True))
+    return int(values.memory_usage(index=False, deep=True))
+
+
+def table_bytes(frame):
+    return int(frame.index.nbytes) + sum(column_bytes(frame[column]) for column in frame.columns)
+
+
+def count_dtype(values):
+    # Smallest integer type that holds every value of an integer array.
+    if not len(values):
+        return values.dtype
+    low, high = values.min(), values.max()
+    if low >= 0:
+        return np.min_scalar_type(high)
+    # min_scalar_type() of a positive high is unsigned, which would widen the result past high's signed type.
+    return np.result_type(np.min_scalar_type(low), np.min_scalar_type(-max(int(high), 0) - 1))
+
+
+@trace.traced('compact')
+def compact(frame, name='table', float32_columns=(), message=print):
+    # Returns frame with the layout policy above applied. float32_columns lists the float columns that may be
+    # stored as float32.
+    trace.add(rows=len(frame))
+    before = table_bytes(frame)
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if column in GEOID_GEOGRAPHIES:
+            if values.dtype.kind not in 'iu':
+                columns[column] = values.astype(np.int64)
+        elif column in CODE_COLUMNS and not isinstance(values.dtype, pd.CategoricalDtype):
+            columns[column] = values.astype('category')
+        elif values.dtype.kind in 'iu':
+            dtype = count_dtype(values.to_numpy())
+            if dtype != values.dtype:
+                columns[column] = values.astype(dtype)
+        elif column in float32_columns and values.dtype.kind == 'f':
+            columns[column] = values.astype(np.float32)
+        elif values.dtype.kind in 'OT' and len(values) and values.isin(list(FLAG_VALUES)).all():
+            columns[column] = values.map(FLAG_VALUES).astype(bool)
+
+    if columns:
+        frame = frame.assign(**columns)
+    after = table_bytes(frame)
+    message('Compacted the {} table from {:,} to {:,} bytes ({:,} bytes, {:.0%}, saved)'.format(
+        name, before, after, before - after, (before - after) / float(before) if before else 0.0))
+    return frame
+
+
+def widen_counts(frame):
+    # Returns frame with its integer columns back at int64. Tables written in parts (stream.py) need the same type
+    # in every part, and the smallest type that holds one part's counts may not hold the next part's.
+    columns = dict((column, frame[column].astype(np.int64)) for column in frame.columns
+                   if frame[column].dtype.kind in 'iu' and frame[column].dtype != np.int64)
+    return frame.assign(**columns) if columns else frame
+
+
+def expand(frame):
+    # Returns frame with any packed GEOID columns turned back into zero-padded strings.
+    columns = dict((column, geoid.to_string(frame[column].to_numpy(), GEOID_GEOGRAPHIES[column]))
+                   for column in frame.columns if column in GEOID_GEOGRAPHIES and frame[column].dtype.kind in 'iu')
+    return frame.assign(**columns) if columns else frame
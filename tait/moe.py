@@ -0,0 +1,75 @@
+# Margins of error.
+#
+# Every ACS estimate B01001_001E has a published margin of error B01001_001M (90% confidence). With
+# margins_of_error set, with_moe() adds the M variable of every E variable next to it in the variable lists, so the
+# planner packs both into the same requests (a table fetched whole with get=group() carries its margins already).
+# Each margin is loaded as <desc_name>_MOE, and from there it follows its estimate through the pipeline: any
+# derived, apportioned or indicator field whose inputs all have an _MOE column gets one too, worked out with the
+# Census Bureau's approximations for derived estimates (ACS General Handbook, chapter 8) as whole-array operations:
+#
+#     sum or difference    sqrt(sum of MOE(x)^2)                                   derive.derive()
+#     apportioned share    MOE(source) * share                                      apportion.apportion()
+#     proportion p = x/y   sqrt(MOE(x)^2 - p^2 * MOE(y)^2) / y, or with + when the  indicators.compute()
+#                          difference is negative
+#     ratio r = x/y        sqrt(MOE(x)^2 + r^2 * MOE(y)^2) / y                      indicators.compute()
+#
+# Regional percentages are proportions of the regional sums, whose margins are the root sum of squares of every
+# block group's. The approximations treat the inputs as independent and do not apply the Handbook's rule of
+# counting only the largest margin among zero estimates, so margins of sums over many zero estimates come out
+# wider than the Bureau's. Annotated margins (-555555555 for controlled estimates, -222222222 where there are too
+# few sample cases) are read as 0, as annotated estimates are.
+
+import numpy as np
+
+from tait import numeric
+
+SUFFIX = '_MOE'
+
+
+def name(column):
+    # 'TotalLEP' -> 'TotalLEP_MOE'
+    return column + SUFFIX
+
+
+def with_moe(specs):
+    # Returns specs with the margin of error variable of every estimate ('...E') right after it.
+    result = []
+    for spec in specs:
+        result.append(spec)
+        if spec['census_name'].endswith('E'):
+            result.append(dict(spec, desc_name=name(spec['desc_name']), census_name=spec['census_name'][:-1] + 'M'))
+    return result
+
+
+def is_moe(spec):
+    return spec['desc_name'].endswith(SUFFIX) and spec['census_name'].endswith('M')
+
+
+def output_columns(columns, available):
+    # columns with each one's _MOE column after it, where available has one.
+    available = set(available)
+    result = []
+    for column in columns:
+        result.append(column)
+        if name(column) in available:
+            result.append(name(column))
+    return result
+
+
+def sum_of_squares(values, axis=0):
+    return np.nansum(np.square(values), axis=axis)
+
+
+def proportion(p, x_moe, y_moe, y, empty_value=0.0):
+    # MOE of p = x / y. Where the proportion formula's radicand is negative the ratio formula is used instead, as the
+    # Handbook advises; empty_value where y is 0.
+    x_squared = np.square(x_moe)
+    p_y_squared = np.square(p) * np.square(y_moe)
+    radicand = x_squared - p_y_squared
+    radicand = np.where(radicand < 0, x_squared + p_y_squared, radicand)
+    return numeric.safe_divide(np.sqrt(radicand), y, empty_value)
+
+
+def ratio(r, x_moe, y_moe, y, empty_value=0.0):
+    # MOE of r = x / y; empty_value where y is 0.
+    return numeric.safe_divide(np.sqrt(np.square(x_moe) + np.square(r) * np.square(y_moe)), y, empty_value)
@@ -0,0 +1,15 @@
+# Array arithmetic shared by the calculation modules.
+#
+# indicators.py, moe.py and geometry.py all divide by populations and areas that can be 0. The division lives here
+# rather than in indicators.py so moe.py can use it without importing indicators.py, which imports moe.py.
+
+import numpy as np
+
+
+def safe_divide(numerator, denominator, empty_value=0.0):
+    # Element-wise numerator / denominator with empty_value wherever denominator is 0. Broadcasts like np.divide.
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=np.float64),
+                                                 np.asarray(denominator, dtype=np.float64))
+    result = np.full(numerator.shape, empty_value, dtype=np.float64)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
@@ -0,0 +1,190 @@
+# Output writers for the finished tables.
+#
+# write_table() writes one dataframe in any number of formats, picked by name from WRITERS:
+#
+#     parquet   Parquet with zstd compression, one row group per county
+#     feather   Arrow IPC (Feather v2) file, one record batch per county, uncompressed so it can be memory-mapped
+#     csv       the plain text table the scripts have always written
+#
+# The Parquet and Feather files carry the frame's own schema, so GEOIDs keep their leading zeros, counts stay
+# integers, flags stay boolean and county names stay categorical (dictionary encoded), and reading them back
+# does not re-parse any text. Rows are sorted by county and written county by county, so a reader can pull a
+# single county's row group without touching the rest of the file. Both need pyarrow; CSV does not.
+#
+# write_tables() writes several tables on background threads, so the files are written while the scripts get on
+# with the geography join.
+#
+# TableWriter writes a table that arrives in parts (stream.py) to the same formats, one row group or record batch
+# per part, without holding more than the part in hand.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from tait import trace
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Compression used when the caller does not ask for one, per format.
+COMPRESSION = {'parquet': 'zstd', 'feather': None, 'csv': None}
+
+EXTENSIONS = {'parquet': '.parquet', 'feather': '.feather', 'csv': '.csv'}
+
+
+def require_pyarrow(output_format):
+    if pa is None:
+        raise ImportError('Writing {} output needs pyarrow (pip install pyarrow)'.format(output_format))
+
+
+def partitions(frame, partition_column):
+    # Sorts frame by partition_column and returns it with the (start, length) of each partition's rows.
+    if partition_column is None or partition_column not in frame.columns:
+        return frame, [(0, len(frame))]
+
+    codes, uniques = pd.factorize(frame[partition_column], sort=True)
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    if (codes < 0).any():
+        counts = np.append(counts, (codes < 0).sum())
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return frame.iloc[order], [(int(start), int(count)) for start, count in zip(starts, counts) if count]
+
+
+def arrow_table(frame):
+    require_pyarrow('Arrow')
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def write_parquet(frame, path, partition_column=None, compression=COMPRESSION['parquet']):
+    require_pyarrow('parquet')
+    frame, parts = partitions(frame, partition_column)
+    table = arrow_table(frame)
+    with pq.ParquetWriter(path, table.schema, compression=compression) as writer:
+        for start, length in parts:
+            writer.write_table(table.slice(start, length), row_group_size=max(length, 1))
+
+
+def write_feather(frame, path, partition_column=None, compression=COMPRESSION['feather']):
+    require_pyarrow('feather')
+    frame, parts = partitions(frame, partition_column)
+    table = arrow_table(frame)
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            for start, length in parts:
+                writer.write_table(table.slice(start, length), max_chunksize=max(length, 1))
+
+
+def write_csv(frame, path, partition_column=None, compression=COMPRESSION['csv']):
+    frame.to_csv(path, index=None, header=True, compression=compression)
+
+
+WRITERS = {'parquet': write_parquet, 'feather': write_feather, 'csv': write_csv}
+
+
+def write_table(frame, path, formats, partition_column='County', compression=None, message=print):
+    # Writes frame to path plus each format's extension and returns the paths written, in the order of formats.
+    # compression overrides the per-format default in COMPRESSION for every format written.
+    paths = []
+    for output_format in formats:
+        if output_format not in WRITERS:
+            raise ValueError('Unknown output format: {}'.format(output_format))
+        output_path = path + EXTENSIONS[output_format]
+        message('Writing {} rows to {}...'.format(len(frame), os.path.basename(output_path)))
+        with trace.span('write', format=output_format) as write_span:
+            WRITERS[output_format](frame, output_path, partition_column,
+                                   COMPRESSION[output_format] if compression is None else compression)
+            write_span.add(rows=len(frame), bytes=os.path.getsize(output_path))
+        paths.append(output_path)
+    return paths
+
+
+def write_tables(tables, formats, message=print, **kwargs):
+    # Starts writing each (frame, path) pair in tables with write_table() on its own thread and returns the futures.
+    # Call result() on each to wait for the files and raise any error from writing them.
+    executor = ThreadPoolExecutor(max_workers=max(len(tables), 1))
+    futures = [executor.submit(write_table, frame, path, formats, message=message, **kwargs) for frame, path in tables]
+    executor.shutdown(wait=False)
+    return futures
+
+
+class TableWriter(object):
+    # Writes a table part by part to path plus each format's extension. Every part must have the columns of the
+    # first; the Arrow formats cast later parts to the first part's schema. An Arrow IPC file has one dictionary per
+    # column, so categorical columns are written with the categories given for them in categories (every value any
+    # part can hold) and as their plain values otherwise. close() returns the paths written.
+
+    def __init__(self, path, formats, compression=None, categories=None, message=print):
+        for output_format in formats:
+            if output_format not in WRITERS:
+                raise ValueError('Unknown output format: {}'.format(output_format))
+            if output_format != 'csv':
+                require_pyarrow(output_format)
+        self.formats = list(formats)
+        self.paths = [path + EXTENSIONS[output_format] for output_format in self.formats]
+        self.compression = compression
+        self.categories = categories or {}
+        self.message = message
+        self.rows = 0
+        self.schema = None
+        self._writers = {}
+        self._sinks = []
+
+    def _compression(self, output_format):
+        return COMPRESSION[output_format] if self.compression is None else self.compression
+
+    def _arrow_writer(self, output_format, path):
+        if output_format == 'parquet':
+            return pq.ParquetWriter(path, self.schema, compression=self._compression(output_format))
+        sink = pa.OSFile(path, 'wb')
+        self._sinks.append(sink)
+        options = pa.ipc.IpcWriteOptions(compression=self._compression(output_format))
+        return pa.ipc.new_file(sink, self.schema, options=options)
+
+    def write(self, frame):
+        columns = {}
+        for column in frame.columns:
+            if isinstance(frame[column].dtype, pd.CategoricalDtype):
+                if column in self.categories:
+                    columns[column] = frame[column].cat.set_categories(self.categories[column])
+                else:
+                    columns[column] = frame[column].astype(frame[column].cat.categories.dtype)
+        if columns:
+            frame = frame.assign(**columns)
+
+        with trace.span('write', rows=len(frame)):
+            table = None
+            for output_format, path in zip(self.formats, self.paths):
+                if output_format == 'csv':
+                    frame.to_csv(path, index=None, header=self.rows == 0, mode='w' if self.rows == 0 else 'a',
+                                 compression=self._compression(output_format))
+                    continue
+                if table is None:
+                    table = arrow_table(frame)
+                    if self.schema is None:
+                        self.schema = table.schema
+                    elif not table.schema.equals(self.schema):
+                        table = table.select(self.schema.names).cast(self.schema)
+                if output_format not in self._writers:
+                    self._writers[output_format] = self._arrow_writer(output_format, path)
+                self._writers[output_format].write_table(table, max(len(frame), 1))
+        self.rows += len(frame)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        for sink in self._sinks:
+            sink.close()
+        self._writers = {}
+        self._sinks = []
+        for path in self.paths:
+            self.message('Wrote {} rows to {}'.format(self.rows, os.path.basename(path)))
+        return self.paths
@@ -0,0 +1,65 @@
+# Typed parsing of Census API rows.
+#
+# The API returns every value as a JSON string (or null). parse_rows() turns a list of rows straight into typed
+# columns in one pass: each variable column is converted to numbers with a single vectorised call, nulls and the
+# ACS annotation sentinels (-666666666 and friends) are masked and replaced with 0, and the FIPS geography columns
+# are kept as zero-padded fixed-width strings. The number of values replaced in each column is reported back
+# rather than being silently written as 0.
+
+import numpy as np
+import pandas as pd
+
+from tait import planner
+
+# Values the ACS publishes in place of an estimate or margin of error when it cannot be computed.
+# https://www.census.gov/data/developers/data-sets/acs-1year/notes-on-acs-estimate-and-annotation-values.html
+ANNOTATION_VALUES = [-111111111, -222222222, -333333333, -555555555, -666666666, -888888888, -999999999]
+
+# Width of each FIPS geography column.
+GEOGRAPHY_WIDTHS = {'State': 2, 'County': 3, 'Tract': 6, 'BG': 1}
+
+# dtype used for a variable whose spec does not name one. Estimates and margins of error are whole counts;
+# a spec can set 'dtype': 'float64' for medians, means and other non-integer variables.
+DEFAULT_DTYPE = 'int64'
+
+
+def parse_rows(rows, specs, geography):
+    # rows is a list of data rows (header removed) whose columns are the specs' variables followed by the
+    # geography columns. Returns the typed dataframe and a dictionary of desc_name -> number of values replaced.
+    geography_columns = planner.GEOGRAPHY_COLUMNS[geography]
+    num_columns = len(specs) + len(geography_columns)
+
+    table = np.array(rows, dtype=object).reshape(len(rows), num_columns)
+
+    columns = {}
+    replaced = {}
+    for i, spec in enumerate(specs):
+        values, count = parse_values(table[:, i], spec.get('dtype', DEFAULT_DTYPE))
+        columns[spec['desc_name']] = values
+        if count:
+            replaced[spec['desc_name']] = count
+
+    for i, name in enumerate(geography_columns):
+        codes = table[:, len(specs) + i].astype(str)
+        if len(codes):
+            codes = np.char.zfill(codes, GEOGRAPHY_WIDTHS[name])
+        columns[name] = codes.astype(object)
+
+    return pd.DataFrame(columns), replaced
+
+
+def parse_values(column, dtype=DEFAULT_DTYPE):
+    # Converts one object column of JSON values to numbers. Returns the typed array and the number of values that
+    # were null, non-numeric or an annotation sentinel, all of which are replaced with 0.
+    values = pd.to_numeric(column, errors='coerce').astype(np.float64)
+    invalid = np.isnan(values) | np.isin(values, ANNOTATION_VALUES)
+
+    count = int(invalid.sum())
+    if count:
+        values[invalid] = 0
+
+    if np.dtype(dtype).kind in 'iu' and not np.array_equal(values, np.floor(values)):
+        # Fractional values in a column declared as a count; keep them rather than truncating.
+        return values, count
+
+    return values.astype(dtype), count
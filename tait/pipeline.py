@@ -0,0 +1,66 @@
+# The TAIT calculation steps as functions.
+#
+# The CreateTAIT scripts run these steps inline at the top level, between the ArcGIS parameters and the geography
+# work. Runners that do the same work for other years or regions call them here instead, with the configuration
+# read from a script (see config.py):
+#
+#     plan()        the planned API requests for a state's counties
+#     prepare()     API results -> block group and tract tables with every field up to the indicators
+#     calculate()   API results -> finished block group and tract tables
+#     bg_output()   the block group table cut down to bg_output_columns and renamed, as the scripts write it
+#
+# With compact_tables set, the tables are compacted (layout.py) as they are loaded and again once their fields are
+# added; bg_output() and layout.expand() put the GEOID strings back for writing. With margins_of_error set, every
+# estimate's margin of error is requested alongside it and carried through the calculations (moe.py). Any
+# ranked_fields and composite_indices are ranked across the region after the indicators (ranking.py).
+
+from tait import apportion, builder, config as tait_config, derive, fips, indicators, layout, moe, planner, ranking
+
+
+def plan(config, state, counties, state_wide=None, table_sizes=None):
+    concepts = [[config['bg_desired_columns'], 'block group'], [config['tract_desired_columns'], 'tract']]
+    if config.get('margins_of_error'):
+        concepts = [[moe.with_moe(specs), level] for specs, level in concepts]
+    return planner.plan_requests(concepts, state=state, counties=counties, state_wide=state_wide,
+                                 table_sizes=table_sizes)
+
+
+def prepare(config, request_plan, plan_results, message=print):
+    # Returns (block group frame, tract frame) with every derived and apportioned field. The tract frame is final.
+    compact = config.get('compact_tables')
+    frames = builder.load_plan(request_plan, plan_results, message=message)
+    if compact:
+        for geography in frames:
+            frames[geography] = layout.compact(frames[geography], geography, message=message)
+
+    tract = derive.derive(frames['tract'], config['tract_derived_fields'], config['tract_desired_columns'])
+
+    bg = builder.attach_parent(frames['block group'], tract, 'block group')
+    bg = derive.derive(bg, config['bg_derived_fields'], config['bg_desired_columns'])
+    bg = apportion.apportion(bg, tract, config['bg_apportioned_fields'], 'block group', message=message)
+    if compact:
+        tract = layout.compact(tract, 'tract', message=message)
+        bg = layout.compact(bg, 'block group', message=message)
+    return bg, tract
+
+
+def calculate(config, request_plan, plan_results, state, county_names=True, message=print, regional=None):
+    # Returns (block group frame, tract frame) with every derived, apportioned and indicator field.
+    # county_names=False leaves out CountyText. regional is passed on to indicators.compute().
+    bg, tract = prepare(config, request_plan, plan_results, message)
+    bg = indicators.compute(bg, config['calculation_fields'], message=message, regional=regional)
+    if config.get('ranked_fields'):
+        bg = ranking.add_ranks(bg, config['ranked_fields'], config.get('composite_indices', []),
+                               config.get('ranking_weight'))
+    if config.get('compact_tables'):
+        bg = layout.compact(bg, 'block group', layout.indicator_columns(config['calculation_fields']), message)
+
+    if county_names:
+        bg = fips.add_county_names(bg, state, 'County')
+    return bg, tract
+
+
+def bg_output(config, bg):
+    # Any margins of error go next to their fields.
+    columns = moe.output_columns(config['bg_output_columns'], bg.columns)
+    return layout.expand(bg[columns]).rename(columns=tait_config.BG_OUTPUT_RENAMES)
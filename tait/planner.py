@@ -0,0 +1,151 @@
+# Request planner for Census API pulls.
+#
+# The API accepts at most 50 names in a single 'get=' and returns the geography columns (state, county, tract,
+# block group) on top of them, so every request has to be kept under that limit. Rather than splitting the
+# variable lists by hand, plan_requests() takes any number of {'desc_name', 'census_name'} lists together with
+# the minimum geography each is available at (the notebook's mingeo levels), groups them by geography and packs
+# each group into as few requests as possible. Geographies the API can return for a whole state at once (tracts,
+# counties) can be flagged as state_wide so they are fetched with one wildcard-county request instead of one per
+# county; use_state_wide() decides when that is worth it from how much of the state the region covers. Tables
+# that are wanted in large part can be fetched whole with get=group(TABLE), so a concept-based pull takes one
+# request per table rather than one per 50 variables.
+
+import math
+from collections import OrderedDict, namedtuple
+
+from tait import moe
+
+# Upper limit on names in one request, geography columns included.
+MAX_VARIABLES = 50
+
+# The notebook's mingeo levels, in order from finest to coarsest.
+GEOGRAPHY_LEVELS = ['block', 'block group', 'tract', 'county', 'public use microdata area', 'place',
+                    'metropolitan statistical area/micropolitan statistical area']
+
+# Column names given to the geography fields the API appends to every row, per 'for=' geography.
+GEOGRAPHY_COLUMNS = {'block group': ['State', 'County', 'Tract', 'BG'],
+                     'tract': ['State', 'County', 'Tract'],
+                     'county': ['State', 'County']}
+
+# Geographies that can be requested for every county in a state with 'in=state:XX' alone.
+STATE_WIDE_GEOGRAPHIES = ['tract', 'county']
+
+# Number of counties (or county equivalents) in each state, by state FIPS code.
+STATE_COUNTY_COUNTS = {'01': 67, '02': 30, '04': 15, '05': 75, '06': 58, '08': 64, '09': 9, '10': 3, '11': 1,
+                       '12': 67, '13': 159, '15': 5, '16': 44, '17': 102, '18': 92, '19': 99, '20': 105, '21': 120,
+                       '22': 64, '23': 16, '24': 24, '25': 14, '26': 83, '27': 87, '28': 82, '29': 115, '30': 56,
+                       '31': 93, '32': 17, '33': 10, '34': 21, '35': 33, '36': 62, '37': 100, '38': 53, '39': 88,
+                       '40': 77, '41': 36, '42': 67, '44': 5, '45': 46, '46': 66, '47': 95, '48': 254, '49': 29,
+                       '50': 14, '51': 133, '53': 39, '54': 55, '55': 72, '56': 23, '72': 78}
+
+# Cost of one extra request relative to downloading one extra county's rows in a state-wide response. A request
+# costs a full round trip while a county's worth of tract rows is only a few kilobytes, so one state-wide request
+# pays off once the region has more counties than about 1 + 2% of the state's county count
+# (7 of Texas' 254, 4 of Illinois' 102).
+REQUEST_COST = 1.0
+COUNTY_ROWS_COST = 0.02
+
+# Share of a table's estimates a concept has to ask for before the whole table is fetched with get=group(...).
+# A group() response carries every estimate and margin of error in the table (plus annotation columns), so below
+# about half the table it is cheaper to name the variables.
+GROUP_THRESHOLD = 0.5
+
+# Tables with fewer wanted variables than this are always named, since they pack into shared requests for free.
+GROUP_MIN_VARIABLES = 10
+
+# One planned request. specs is the list of {'desc_name', 'census_name'} dictionaries it covers. group is the table
+# id when the chunk is fetched as a whole table with get=group(...), and None when its variables are named.
+PlannedChunk = namedtuple('PlannedChunk', ['geography', 'specs', 'state_wide', 'group'], defaults=[None])
+
+
+def geography_name(level):
+    # Accepts either a mingeo level number or a geography name.
+    if isinstance(level, int):
+        return GEOGRAPHY_LEVELS[level]
+    if level not in GEOGRAPHY_LEVELS:
+        raise ValueError('Unknown Census geography: {}'.format(level))
+    return level
+
+
+def use_state_wide(state, num_counties):
+    # True when one state-wide request is expected to be cheaper than num_counties per-county requests.
+    state_counties = STATE_COUNTY_COUNTS.get(str(state))
+    if state_counties is None:
+        return False
+    if num_counties >= state_counties:
+        return True
+    return num_counties * REQUEST_COST > REQUEST_COST + state_counties * COUNTY_ROWS_COST
+
+
+def table_id(census_name):
+    # 'B16004_004E' -> 'B16004'
+    return census_name.split('_')[0]
+
+
+def chunk_variables(specs, geography='block group', max_variables=MAX_VARIABLES):
+    # Splits one list of specs into the fewest requests that fit under the limit. Variables from the same table are
+    # kept next to each other so a table is split across requests only when it has to be.
+    capacity = max_variables - len(GEOGRAPHY_COLUMNS.get(geography, []))
+    if capacity < 1:
+        raise ValueError('max_variables leaves no room for variables at the {} geography'.format(geography))
+
+    tables = OrderedDict()
+    for spec in specs:
+        tables.setdefault(table_id(spec['census_name']), []).append(spec)
+    ordered = [spec for table in tables.values() for spec in table]
+
+    num_chunks = int(math.ceil(len(ordered) / float(capacity)))
+    return [ordered[i * capacity:(i + 1) * capacity] for i in range(num_chunks)]
+
+
+def group_tables(specs, table_sizes, group_threshold=GROUP_THRESHOLD):
+    # Splits specs into {table id: specs} for the tables worth fetching whole, and the rest. table_sizes maps table
+    # ids to their number of estimates (catalog.VariableCatalog.table_sizes()); tables missing from it are never
+    # fetched whole. Margins of error (moe.with_moe()) come with the estimates and do not count towards the share.
+    tables = OrderedDict()
+    for spec in specs:
+        tables.setdefault(table_id(spec['census_name']), []).append(spec)
+
+    whole = OrderedDict()
+    rest = []
+    for table, table_specs in tables.items():
+        size = (table_sizes or {}).get(table)
+        estimates = len([spec for spec in table_specs if not moe.is_moe(spec)])
+        if size and estimates >= max(group_threshold * size, GROUP_MIN_VARIABLES):
+            whole[table] = table_specs
+        else:
+            rest.extend(table_specs)
+    return whole, rest
+
+
+def plan_requests(concepts, state=None, counties=None, state_wide=None, max_variables=MAX_VARIABLES,
+                  table_sizes=None, group_threshold=GROUP_THRESHOLD):
+    # concepts is a list of [specs, level] pairs, where level is a mingeo number or a geography name. A variable
+    # that appears in several concepts (e.g. Total_Pop) is requested once, under the first desc_name given for it.
+    # state_wide forces state-wide requests on (True) or off (False) for the geographies that allow them; left as
+    # None it is decided by use_state_wide() when state and counties are given, and on otherwise. Given
+    # table_sizes, tables that are asked for in large part are fetched whole, one request per table however many
+    # of its variables are wanted (see group_tables()).
+    if state_wide is None:
+        state_wide = state is None or counties is None or use_state_wide(state, len(counties))
+
+    by_geography = OrderedDict()
+    seen = {}
+    for specs, level in concepts:
+        geography = geography_name(level)
+        for spec in specs:
+            key = (geography, spec['census_name'])
+            if key in seen:
+                continue
+            seen[key] = spec
+            by_geography.setdefault(geography, []).append(spec)
+
+    plan = []
+    for geography in sorted(by_geography, key=GEOGRAPHY_LEVELS.index):
+        chunk_state_wide = state_wide and geography in STATE_WIDE_GEOGRAPHIES
+        whole, rest = group_tables(by_geography[geography], table_sizes, group_threshold)
+        for table, specs in whole.items():
+            plan.append(PlannedChunk(geography, specs, chunk_state_wide, table))
+        for chunk in chunk_variables(rest, geography, max_variables):
+            plan.append(PlannedChunk(geography, chunk, chunk_state_wide))
+    return plan
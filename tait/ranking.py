@@ -0,0 +1,130 @@
+# Regional percentile ranks and composite indices.
+#
+# The Environmental Justice Index this tool grew out of ranks block groups against the region rather than
+# comparing each one with the regional percentage: Min_RegPct is a block group's percentile among the region's
+# minority shares, Pov_RegPct among its poverty shares, and Both_RegPct the percentile of the two added together.
+# Ranks are declared like the other fields, and composites combine any earlier ranks or composites:
+#
+#     ranked_fields = [{'field': 'Pct_TotMin', 'rank': 'Min_RegPct'}, {'field': 'Pct_BlwPov', 'rank': 'Pov_RegPct'}]
+#     composite_indices = [{'name': 'Both_RegPct', 'ranks': ['Min_RegPct', 'Pov_RegPct'], 'weights': [1, 1]}]
+#
+# A composite is the weighted sum of its ranks (weights default to 1), percentile-ranked again. Percentiles run
+# from 0 to 1 and are worked out for every ranked field at once from a single argsort of the indicator matrix:
+#
+#     percentile = (weight below + f * (tied weight - own weight)) / (total weight - own weight)
+#
+# where f is 0 for ties='min' (Excel's PERCENTRANK.INC, which the EJI and the CDC's SVI use), 1/2 for 'average'
+# and 1 for 'max'. Without weights every block group weighs 1, so the lowest value ranks 0 and the highest 1; with
+# weights (e.g. Total_Pop) a percentile is the share of the region's population in block groups with lower values.
+# Missing values get no rank and are left out of everyone else's.
+#
+# Ranker holds the indicator matrix, so ranks for another subset of counties (a subregion, or the region without
+# one county) are a mask and a sort away, with nothing fetched or recalculated:
+#
+#     ranker = ranking.Ranker(bg, ranked_fields, composite_indices, weight='Total_Pop')
+#     ranks = ranker.rank(counties=['085', '121'])
+
+import numpy as np
+import pandas as pd
+
+from tait import trace
+
+TIES = {'min': 0.0, 'average': 0.5, 'max': 1.0}
+
+
+def percentile_ranks(matrix, weights=None, ties='min'):
+    # Percentile ranks of every column of matrix (rows are block groups) among the column's values; NaN where a
+    # value is missing. weights holds one weight per row.
+    if ties not in TIES:
+        raise ValueError('Unknown ties rule: {} (use one of {})'.format(ties, ', '.join(TIES)))
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if matrix.ndim == 1:
+        return percentile_ranks(matrix[:, None], weights, ties)[:, 0]
+    num_rows = matrix.shape[0]
+    if not num_rows:
+        return np.full(matrix.shape, np.nan)
+
+    # Each field is sorted as one contiguous row of the transposed matrix. Equal values get the same rank whatever
+    # order the sort leaves them in, so it need not be stable.
+    weights = np.ones(num_rows) if weights is None else np.nan_to_num(np.asarray(weights, dtype=np.float64))
+    columns = np.ascontiguousarray(matrix.T)
+    order = np.argsort(columns, axis=1)
+    values = np.take_along_axis(columns, order, axis=1)
+    valid = ~np.isnan(values)
+    sorted_weights = np.where(valid, weights[order], 0.0)
+    cumulative = np.cumsum(sorted_weights, axis=1)
+
+    # Runs of equal values in each sorted field: the weight before a run's first row, and up to its last row.
+    positions = np.arange(num_rows)
+    starts = np.ones(values.shape, dtype=bool)
+    starts[:, 1:] = values[:, 1:] != values[:, :-1]
+    ends = np.ones(values.shape, dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    first = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, positions, num_rows - 1)[:, ::-1], axis=1)[:, ::-1]
+    below = np.take_along_axis(cumulative - sorted_weights, first, axis=1)
+    tied = np.take_along_axis(cumulative, last, axis=1) - below
+
+    others = cumulative[:, -1:] - sorted_weights
+    sorted_ranks = np.zeros(values.shape)
+    np.divide(below + TIES[ties] * (tied - sorted_weights), others, out=sorted_ranks, where=others > 0)
+    sorted_ranks[~valid] = np.nan
+    ranks = np.empty(columns.shape)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=1)
+    return ranks.T
+
+
+class Ranker(object):
+
+    def __init__(self, frame, ranked_fields, composite_indices=(), weight=None, ties='min', county_column='County'):
+        # frame is the block group table with every ranked field. weight names a column to weight the ranks by.
+        self.ranked_fields = list(ranked_fields)
+        self.composite_indices = list(composite_indices)
+        self.ties = ties
+        self.index = frame.index
+        self.matrix = frame[[field['field'] for field in self.ranked_fields]].to_numpy(dtype=np.float64)
+        self.weights = None if weight is None else frame[weight].to_numpy(dtype=np.float64)
+        self.county_codes, self.counties = None, None
+        if county_column in frame.columns:
+            self.county_codes, self.counties = pd.factorize(frame[county_column])
+
+        names = [field['rank'] for field in self.ranked_fields]
+        for index in self.composite_indices:
+            missing = [name for name in index['ranks'] if name not in names]
+            if missing:
+                raise ValueError('Composite index {} uses {}, which {} not ranked before it'.format(
+                    index['name'], ', '.join(missing), 'is' if len(missing) == 1 else 'are'))
+            if len(index.get('weights', index['ranks'])) != len(index['ranks']):
+                raise ValueError('Composite index {} needs one weight per rank'.format(index['name']))
+            names.append(index['name'])
+        self.names = names
+
+    @trace.traced('ranking')
+    def rank(self, counties=None):
+        # Returns a frame of every rank and composite index, ranked among the block groups of counties (default:
+        # all of them). Block groups outside counties get NaN.
+        rows = np.ones(len(self.index), dtype=bool)
+        if counties is not None:
+            if self.counties is None:
+                raise ValueError('The ranked table has no county column to pick counties from')
+            rows = np.isin(self.county_codes, np.flatnonzero(self.counties.isin(list(counties))))
+        trace.add(rows=int(rows.sum()))
+        weights = None if self.weights is None else self.weights[rows]
+
+        ranks = dict(zip([field['rank'] for field in self.ranked_fields],
+                         percentile_ranks(self.matrix[rows], weights, self.ties).T))
+        for index in self.composite_indices:
+            index_weights = index.get('weights', [1] * len(index['ranks']))
+            total = sum(weight * ranks[name] for name, weight in zip(index['ranks'], index_weights))
+            ranks[index['name']] = percentile_ranks(total, weights, self.ties)
+
+        values = np.full((len(self.index), len(self.names)), np.nan)
+        for j, name in enumerate(self.names):
+            values[rows, j] = ranks[name]
+        return pd.DataFrame(values, columns=self.names, index=self.index)
+
+
+def add_ranks(frame, ranked_fields, composite_indices=(), weight=None, ties='min', counties=None):
+    # Adds every rank and composite index column to frame and returns the new frame.
+    ranks = Ranker(frame, ranked_fields, composite_indices, weight, ties).rank(counties)
+    return pd.concat([frame.drop(columns=[name for name in ranks.columns if name in frame.columns]), ranks], axis=1)
@@ -0,0 +1,113 @@
+# Region profiles and a runner for many regions.
+#
+# The scripts and the notebook are copies of one pipeline that differ in their region: NCTCOG's 16 Texas counties
+# in CreateTAIT_copy_tol.py, CMAP's 7 Illinois counties in NewTAIT.ipynb and the CMAP draft script. A region
+# profile holds everything that differs, as a JSON file in tait/data/regions:
+#
+#     name              region name; also the output subfolder
+#     state             state FIPS code
+#     counties          county FIPS code -> name, checked against the county name table (fips.py)
+#     script            CreateTAIT script the variable sets and fields are read from (config.py), relative to the
+#                       repository root
+#     crs               EPSG code of the output CRS, e.g. 2276 (Texas North Central) or 3435 (Illinois East)
+#     output_name       output file name, with {year} for the ACS year
+#     geography         optional: boundary vintage -> block group source, e.g. {"2020": "C:/data/bg_2020.shp"}
+#     geography_fields  optional: boundary vintage -> [GEOID field, county field] (see batch.GEOGRAPHY_FIELDS)
+#
+# run() runs any number of regions and years at once with batch.run_jobs(): every region's requests go out in one
+# batch, so they share one limit on requests in flight and one response cache, and each region-year is calculated
+# in its own worker process.
+#
+# Usage: python -m tait.regions --regions nctcog,cmap --years 2019 --output folder
+
+import argparse
+import json
+import os
+
+from tait import batch, cache, config as tait_config, fetch, fips, geometry, geostore
+
+PROFILE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'regions')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile_names():
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(PROFILE_FOLDER) if name.endswith('.json'))
+
+
+def load_profile(name):
+    # name is a bundled profile ('nctcog') or the path of a profile file. Returns the profile as a region
+    # dictionary for batch.run_jobs(), with the script's settings loaded.
+    path = name if name.endswith('.json') else os.path.join(PROFILE_FOLDER, name.lower() + '.json')
+    if not os.path.exists(path):
+        raise ValueError('No region profile {} (bundled profiles: {})'.format(name, ', '.join(profile_names())))
+    with open(path) as profile_file:
+        profile = json.load(profile_file)
+
+    names = fips.county_names(profile['state'], list(profile['counties']))
+    renamed = [county for county, county_name in profile['counties'].items() if names[county] != county_name]
+    if renamed:
+        raise ValueError('Counties {} in profile {} do not match the county name table'.format(
+            ', '.join(renamed), profile['name']))
+
+    script = os.path.join(ROOT, profile['script'])
+    region = batch.make_region(tait_config.load(script), profile['state'], profile['counties'], profile['name'],
+                               profile.get('crs', geometry.CRS), profile.get('output_name', 'TAIT_{year}ACS'),
+                               profile.get('geography'), profile.get('geography_fields'))
+    region['description'] = profile.get('description', '')
+    return region
+
+
+def run(regions, years, output_folder, formats=('parquet',), backend='geopandas', response_cache=None,
+        geography_store=None, processes=None, max_workers=fetch.MAX_WORKERS, timeout=fetch.TIMEOUT, message=print):
+    # regions is a list of load_profile() dictionaries. Each region's files go in its own subfolder of
+    # output_folder. Returns the paths written.
+    jobs = [[region, str(year)] for region in regions for year in years]
+    tables, written = batch.run_jobs(jobs, output_folder, formats, backend, response_cache, geography_store,
+                                     processes, max_workers, timeout, message)
+    return [path for future in written for path in future.result()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tait.regions', description='Runs TAIT for several regions.')
+    parser.add_argument('--regions', help='comma separated profile names or files (default: every bundled one)')
+    parser.add_argument('--years', help="e.g. '2019' or '2018-2022'")
+    parser.add_argument('--output', help='output folder')
+    parser.add_argument('--backend', default='geopandas', choices=geometry.BACKENDS)
+    parser.add_argument('--formats', default='parquet', help='comma separated output formats')
+    parser.add_argument('--processes', type=int, help='worker processes (default: one per region-year, up to CPUs)')
+    parser.add_argument('--max-requests', type=int,
+                        help="requests in flight at once (default: the first region's script's max_requests)")
+    parser.add_argument('--cache', default='census_cache', help="response cache folder, or '' for none")
+    parser.add_argument('--geography-cache', default='geography_cache', help="clipped geography folder, or ''")
+    parser.add_argument('--list', action='store_true', help='list the bundled profiles and stop')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in profile_names():
+            region = load_profile(name)
+            print('{:<10} {}'.format(name, region['description']))
+        return
+    if not args.years or not args.output:
+        parser.error('--years and --output are required')
+
+    regions = [load_profile(name) for name in (args.regions.split(',') if args.regions else profile_names())]
+    # The regions' requests share one batch and one cache, so they are sized by the first region's script.
+    settings = regions[0]['settings']
+    response_cache = None
+    if args.cache:
+        response_cache = cache.ResponseCache(args.cache, max_bytes=settings.get('cache_size_mb', 500) * 1024 * 1024)
+    geography_store = None
+    if args.geography_cache and any(region['geography'] for region in regions):
+        geography_store = geostore.GeographyStore(args.geography_cache)
+
+    paths = run(regions, batch.parse_years(args.years), args.output, args.formats.split(','), args.backend,
+                response_cache, geography_store, args.processes,
+                args.max_requests or settings.get('max_requests', fetch.MAX_WORKERS),
+                settings.get('request_timeout', fetch.TIMEOUT))
+    for path in paths:
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+# Streaming, county-partitioned runs.
+#
+# pipeline.calculate() works on the whole region at once: every response, every intermediate frame and the
+# finished tables are in memory together, which is fine for a metro region but not for a state or the nation
+# (~240,000 block groups). run() streams the region through the same steps a partition of counties at a time
+# instead, in two passes:
+#
+#     1. each partition is fetched (the next few while the current one is calculated), parsed, derived and
+#        apportioned (pipeline.prepare()). Its tract table is final and written straight away; its block groups
+#        are spilled to a temporary folder and their indicator totals (indicators.totals(), and moe_totals() for
+#        margins of error) added to the region's.
+#     2. the regional percentages the Rat_* fields divide by are taken from the totals, and each spilled partition
+#        is read back, given its indicator fields against them, cut down to bg_output_columns and written.
+#
+# Only one partition's frames are in memory at a time, plus the responses of the partitions fetched ahead (PREFETCH)
+# and a few numbers per indicator field. Partitions never ask for state-wide tracts, which would fetch the whole
+# state once per partition. Each partition has a fixed cost (its own requests, parsing and row groups), so larger
+# partitions run faster and use more memory. benchmarks/pipeline.py --streaming measures a county-at-a-time run
+# against the stand-in API, to compare with the same region run whole.
+#
+# The output is the same as a whole-region run's, ordered by partition. There is no geography step: the geometry
+# backends join a whole table, so streamed output is for the tables only. Percentile ranks (ranking.py) need every
+# block group's value at once, so settings with ranked_fields are turned away.
+#
+# Usage: python -m tait.stream --year 2019 --output TAIT_2019ACS [--script CreateTAIT_copy_tol.py]
+#            [--state 48 --counties 085,113] [--partition-size 1]
+
+import argparse
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from tait import cache, config as tait_config, fetch, fips, indicators, layout, output, pipeline, trace
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'CreateTAIT_copy_tol.py')
+
+# Partitions fetched ahead of the one being calculated. Each holds its responses in memory until its turn, so this
+# trades memory for keeping the API busy.
+PREFETCH = 4
+
+
+def county_partitions(parts, partition_size=1):
+    # parts is a list of [state, counties]. Returns [state, counties] partitions of at most partition_size counties,
+    # never mixing states.
+    partitions = []
+    for state, counties in parts:
+        counties = list(counties)
+        partitions += [[state, counties[start:start + partition_size]]
+                       for start in range(0, len(counties), partition_size)]
+    return partitions
+
+
+def fetch_partitions(settings, year, partitions, ahead=PREFETCH, message=print, **kwargs):
+    # Generator of (state, counties, request plan, plan results) per partition. Up to ahead partitions after the
+    # current one are being fetched while the caller works on it.
+    def fetch_partition(state, counties):
+        request_plan = pipeline.plan(settings, state, counties, state_wide=False)
+        return request_plan, fetch.fetch_plan(year, state, counties, request_plan, message=message, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=max(ahead, 1)) as prefetch:
+        futures = deque(prefetch.submit(fetch_partition, state, counties)
+                        for state, counties in partitions[:ahead + 1])
+        for number, (state, counties) in enumerate(partitions):
+            request_plan, plan_results = futures.popleft().result()
+            if number + ahead + 1 < len(partitions):
+                futures.append(prefetch.submit(fetch_partition, *partitions[number + ahead + 1]))
+            yield state, counties, request_plan, plan_results
+
+
+def run(settings, year, parts, path, formats=('parquet',), partition_size=1, county_names=True, spill_folder=None,
+        prefetch=PREFETCH, message=print, **kwargs):
+    # parts is a list of [state, counties]. Writes the block group output to path and the tract table to
+    # path + '_Tract', in each of formats, and returns the paths written. county_names=False writes every block
+    # group column without the county names instead of bg_output_columns, which needs them. spill_folder is where
+    # the temporary folder for pass 1 goes (default: the system's). kwargs go to fetch.fetch_plan().
+    if settings.get('ranked_fields'):
+        raise ValueError('Percentile ranks need the whole region; rank the streamed output with tait.ranking instead')
+    fields = settings['calculation_fields']
+    partitions = county_partitions(parts, partition_size)
+    variable_totals = np.zeros(len(fields))
+    universe_totals = np.zeros(len(fields))
+    variable_squares = np.zeros(len(fields))
+    universe_squares = np.zeros(len(fields))
+    spills = []
+
+    folder = tempfile.mkdtemp(prefix='tait_stream_', dir=spill_folder)
+    try:
+        # Categories of the categorical columns across every partition, so all parts share one Arrow dictionary.
+        codes = {'State': sorted(set(state for state, counties in parts)),
+                 'County': sorted(set(county for state, counties in parts for county in counties))}
+        tract_writer = output.TableWriter(path + '_Tract', formats, categories=codes, message=message)
+        for state, counties, request_plan, plan_results in fetch_partitions(settings, year, partitions, prefetch,
+                                                                             message, **kwargs):
+            message('Calculating partition {} of {} (state {}, counties {})...'.format(
+                len(spills) + 1, len(partitions), state, ', '.join(counties)))
+            with trace.span('partition', state=state, counties=len(counties)):
+                bg, tract = pipeline.prepare(settings, request_plan, plan_results, message)
+                del plan_results
+                tract_writer.write(layout.widen_counts(layout.expand(tract)))
+
+                bg_variables, bg_universes = indicators.totals(bg, fields)
+                variable_totals += bg_variables
+                universe_totals += bg_universes
+                bg_variables, bg_universes = indicators.moe_totals(bg, fields)
+                variable_squares += bg_variables
+                universe_squares += bg_universes
+                spill = os.path.join(folder, '{}.pickle'.format(len(spills)))
+                bg.to_pickle(spill)
+                spills.append([state, spill])
+                del bg, tract
+        paths = tract_writer.close()
+
+        names = []
+        if county_names:
+            for state, counties in parts:
+                names += [name for name in fips.county_names(state, list(counties)).values() if name not in names]
+
+        regional = indicators.regional_rates(variable_totals, universe_totals)
+        regional_moe = indicators.regional_margins(variable_totals, universe_totals, variable_squares,
+                                                   universe_squares)
+        bg_writer = output.TableWriter(path, formats, categories=dict(codes, County=names) if county_names else codes,
+                                       message=message)
+        for state, spill in spills:
+            with trace.span('finish', state=state):
+                bg = pd.read_pickle(spill)
+                os.remove(spill)
+                bg = indicators.compute(bg, fields, message=message, regional=regional, regional_moe=regional_moe)
+                if settings.get('compact_tables'):
+                    bg = layout.compact(bg, 'block group', layout.indicator_columns(fields), message)
+                if county_names:
+                    bg = fips.add_county_names(bg, state, 'County')
+                    bg_writer.write(layout.widen_counts(pipeline.bg_output(settings, bg)))
+                else:
+                    bg_writer.write(layout.widen_counts(layout.expand(bg)))
+                del bg
+        return bg_writer.close() + paths
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tait.stream',
+                                     description='Runs TAIT a partition of counties at a time.')
+    parser.add_argument('--year', required=True)
+    parser.add_argument('--output', required=True, help='output path without an extension, e.g. TAIT_2019ACS')
+    parser.add_argument('--script', default=SCRIPT, help='CreateTAIT script to read variables and fields from')
+    parser.add_argument('--state', help="state FIPS code (default: the script's)")
+    parser.add_argument('--counties', help="comma separated county FIPS codes, or 'all' (default: the script's)")
+    parser.add_argument('--partition-size', type=int, default=1, help='counties per partition')
+    parser.add_argument('--formats', help="comma separated output formats (default: the script's)")
+    parser.add_argument('--cache', default='census_cache', help="response cache folder, or '' for none")
+    args = parser.parse_args(argv)
+
+    settings = tait_config.load(args.script)
+    state = args.state or settings.get('state')
+    counties = args.counties.split(',') if args.counties else settings.get('counties')
+    if not state or not counties:
+        parser.error('--state and --counties are needed when the script does not set them')
+    if counties == ['all']:
+        counties = sorted(fips.county_names(state))
+    formats = args.formats.split(',') if args.formats else settings.get('output_formats', ['parquet'])
+
+    response_cache = None
+    if args.cache:
+        response_cache = cache.ResponseCache(args.cache, max_bytes=settings.get('cache_size_mb', 500) * 1024 * 1024)
+
+    paths = run(settings, args.year, [[state, counties]], args.output, formats, args.partition_size,
+                cache=response_cache, max_workers=settings.get('max_requests', fetch.MAX_WORKERS),
+                timeout=settings.get('request_timeout', fetch.TIMEOUT))
+    for path in paths:
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+# Stage timing and throughput spans.
+#
+# The scripts' progress messages say what is happening but not how long it took, so a slow run could not be pinned
+# on the network, JSON parsing, the derivations or the geography steps. Each stage of the pipeline now runs inside a
+# named span, as does every API request:
+#
+#     fetch        fetch.fetch_plans() (and fetch_plan()), with a request span per API call (county, geography,
+#                  bytes, rows, cached)
+#     parse        builder.load_plan(), per planned chunk (rows)
+#     attach       builder.attach_parent()
+#     derive       derive.derive()
+#     apportion    apportion.apportion()
+#     indicators   indicators.compute()
+#     compact      layout.compact()
+#     ranking      ranking.Ranker.rank() (rows ranked)
+#     write        output.write_table() (rows, bytes written), or a part of an output.TableWriter table (rows)
+#     partition    stream.run()'s first pass over a partition of counties; finish is its second pass
+#     geography.*  the geometry backend's load, join, add_area and save steps
+#
+# A span records its wall time, any counts added to it (bytes, rows) and, for spans on the thread that started
+# tracing, the peak of Python-allocated memory (tracemalloc; NumPy and pandas buffers included) while it was open.
+# Tracing is off unless start() is called; while it is off span() hands back one shared do-nothing object and
+# traced() functions go straight through, so the cost is a global lookup per call.
+#
+#     trace.start()
+#     ... run the pipeline ...
+#     run_trace = trace.stop()
+#     run_trace.write('TAIT_2019ACS_trace.json')    # Chrome trace format: open in chrome://tracing or Perfetto
+#     run_trace.report(arcpy.AddMessage)            # summary table per span name
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+# The tracer spans are recorded in, or None while tracing is off.
+_active = None
+
+
+class NullSpan(object):
+    # Stands in for a span while tracing is off.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, **counts):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span(object):
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = None
+        self.end = None
+        self.thread = None
+        self.peak = None
+
+    def add(self, **counts):
+        # Adds to the span's counts, e.g. span.add(bytes=len(body), rows=len(rows)).
+        for key, value in counts.items():
+            self.args[key] = self.args.get(key, 0) + value
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        stack = self.tracer.stack()
+        if self.tracer.tracks_memory():
+            # The enclosing span keeps the peak reached so far before the counter is reset for this one.
+            peak = tracemalloc.get_traced_memory()[1]
+            if stack:
+                stack[-1].peak = max(stack[-1].peak or 0, peak)
+            tracemalloc.reset_peak()
+            self.peak = tracemalloc.get_traced_memory()[0]
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end = time.perf_counter()
+        stack = self.tracer.stack()
+        stack.pop()
+        if self.peak is not None:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak or 0, self.peak)
+            tracemalloc.reset_peak()
+        if exc_info[0] is not None:
+            self.args['error'] = exc_info[0].__name__
+        self.tracer.record(self)
+        return False
+
+    @property
+    def seconds(self):
+        return self.end - self.start
+
+
+class Tracer(object):
+
+    def __init__(self, memory=True):
+        # memory=False skips tracemalloc, which slows allocation-heavy code down noticeably, and records times and
+        # counts only.
+        self.memory = memory
+        self.spans = []
+        self.origin = time.perf_counter()
+        self.thread = threading.get_ident()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = memory and not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+
+    def close(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def stack(self):
+        # Open spans on the calling thread, innermost last.
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def tracks_memory(self):
+        # tracemalloc's peak is process-wide, so only the thread that started tracing (which runs the stages) measures
+        # it; request and write spans on worker threads record times and counts.
+        return self.memory and threading.get_ident() == self.thread and tracemalloc.is_tracing()
+
+    def span(self, name, args):
+        return Span(self, name, args)
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def events(self):
+        # Chrome trace 'complete' events, in microseconds from the start of tracing.
+        pid = os.getpid()
+        events = []
+        for span in sorted(self.spans, key=lambda span: span.start):
+            args = dict(span.args)
+            if span.peak is not None:
+                args['peak_bytes'] = span.peak
+            events.append({'name': span.name, 'ph': 'X', 'pid': pid, 'tid': span.thread,
+                           'ts': round((span.start - self.origin) * 1e6, 1),
+                           'dur': round(span.seconds * 1e6, 1), 'args': args})
+        return events
+
+    def write(self, path):
+        # Writes the run as a Chrome trace JSON file and returns its path.
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, trace_file)
+        return path
+
+    def summary(self):
+        # One row per span name, in the order the names first appeared: calls, total and longest seconds, rows,
+        # bytes and peak memory.
+        rows = OrderedDict()
+        for span in sorted(self.spans, key=lambda span: span.start):
+            row = rows.setdefault(span.name, {'name': span.name, 'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                              'rows': 0, 'bytes': 0, 'peak_bytes': None})
+            row['calls'] += 1
+            row['seconds'] += span.seconds
+            row['max_seconds'] = max(row['max_seconds'], span.seconds)
+            row['rows'] += span.args.get('rows', 0)
+            row['bytes'] += span.args.get('bytes', 0)
+            if span.peak is not None:
+                row['peak_bytes'] = max(row['peak_bytes'] or 0, span.peak)
+        return list(rows.values())
+
+    def report(self, message=print):
+        message('{:<22} {:>6} {:>9} {:>9} {:>10} {:>10} {:>9}'.format('Stage', 'Calls', 'Seconds', 'Longest', 'Rows',
+                                                                     'MB', 'Peak MB'))
+        for row in self.summary():
+            peak = '' if row['peak_bytes'] is None else '{:.1f}'.format(row['peak_bytes'] / 1048576.0)
+            message('{:<22} {:>6} {:>9.2f} {:>9.2f} {:>10} {:>10.2f} {:>9}'.format(
+                row['name'], row['calls'], row['seconds'], row['max_seconds'], row['rows'],
+                row['bytes'] / 1048576.0, peak))
+
+
+def start(memory=True):
+    # Turns tracing on and returns the tracer.
+    global _active
+    if _active is not None:
+        _active.close()
+    _active = Tracer(memory)
+    return _active
+
+
+def stop():
+    # Turns tracing off and returns the tracer that was recording, or None.
+    global _active
+    tracer = _active
+    _active = None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def span(name, **args):
+    # with trace.span('request', county='085') as request_span: ... request_span.add(bytes=n)
+    if _active is None:
+        return NULL_SPAN
+    return _active.span(name, args)
+
+
+def add(**counts):
+    # Adds counts to the innermost open span on the calling thread.
+    if _active is None:
+        return
+    stack = _active.stack()
+    if stack:
+        stack[-1].add(**counts)
+
+
+def traced(name):
+    # Decorator that runs a function inside a span called name.
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.span(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# Script the pipeline tests read their variables and fields from.
+SCRIPT = os.path.join(ROOT, 'CreateTAIT_copy_tol.py')
+
+
+@pytest.fixture(scope='session')
+def census_api():
+    # The stand-in Census API (benchmarks/census_server.py), serving synthetic responses for the session.
+    import census_server
+    from tait import fetch
+
+    api_root = fetch.API_ROOT
+    with census_server.CensusServer() as server:
+        fetch.API_ROOT = server.api_root
+        yield server
+    fetch.API_ROOT = api_root
+
+
+@pytest.fixture
+def settings():
+    from tait import config
+    return config.load(SCRIPT)
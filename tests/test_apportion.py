@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tait import apportion
+
+FIELDS = [{'name': 'Sum_PWD', 'source': 'WholeTract_PWD', 'weight': 'Total_Pop'}]
+
+
+def quiet(message):
+    pass
+
+
+def frames(populations):
+    # Tract 48085000100 with three block groups and tract 48085000200 with two.
+    block_groups = pd.DataFrame({'Total_Pop': populations},
+                                index=pd.Index([480850001001, 480850001002, 480850001003, 480850002001,
+                                                480850002002], name='GEOID'))
+    tracts = pd.DataFrame({'WholeTract_PWD': [90.0, 40.0]}, index=pd.Index([48085000100, 48085000200],
+                                                                            name='Tract_GEOID'))
+    return block_groups, tracts
+
+
+def test_shares():
+    shares, num_empty = apportion.shares(np.array([1.0, 3.0, 0.0, 0.0]), np.array([0, 0, 1, 1]), 2)
+    assert shares.tolist() == [0.25, 0.75, 0.5, 0.5]
+    assert num_empty == 1
+
+
+def test_shares_of_a_zero_weight_group_can_be_zero():
+    shares, num_empty = apportion.shares(np.array([0.0, 0.0, 2.0]), np.array([0, 0, 1]), 3, 'zero')
+    assert shares.tolist() == [0.0, 0.0, 1.0]
+    assert num_empty == 1
+
+
+def test_unknown_fallback():
+    with pytest.raises(ValueError):
+        apportion.shares(np.array([0.0]), np.array([0]), 1, 'nearest')
+
+
+def test_apportion_adds_back_up_to_the_tract():
+    block_groups, tracts = frames([10, 20, 30, 5, 15])
+    result = apportion.apportion(block_groups, tracts, FIELDS, message=quiet)
+    assert result['Sum_PWD'].tolist() == [15.0, 30.0, 45.0, 10.0, 30.0]
+
+
+def test_apportion_falls_back_to_equal_shares():
+    block_groups, tracts = frames([0, 0, 0, 5, 15])
+    messages = []
+    result = apportion.apportion(block_groups, tracts, FIELDS, message=messages.append)
+    assert result['Sum_PWD'].tolist() == [30.0, 30.0, 30.0, 10.0, 30.0]
+    assert messages == ['1 tracts have no Total_Pop; their values are split equally']
+
+    result = apportion.apportion(block_groups, tracts, FIELDS, fallback='zero', message=quiet)
+    assert result['Sum_PWD'].tolist() == [0.0, 0.0, 0.0, 10.0, 30.0]
+
+
+def test_block_groups_without_a_tract_get_nan():
+    block_groups, tracts = frames([10, 20, 30, 5, 15])
+    result = apportion.apportion(block_groups, tracts.iloc[:1], FIELDS, message=quiet)
+    assert result['Sum_PWD'].tolist()[:3] == [15.0, 30.0, 45.0]
+    assert np.isnan(result['Sum_PWD'].to_numpy()[3:]).all()
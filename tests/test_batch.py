@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from tait import batch
+
+
+def quiet(message):
+    pass
+
+
+def test_parse_years():
+    assert batch.parse_years('2015-2017,2019') == ['2015', '2016', '2017', '2019']
+    assert batch.parse_years('2021') == ['2021']
+    assert batch.parse_years(' 2019 , 2018-2018') == ['2019', '2018']
+
+
+def test_geography_vintage():
+    assert batch.geography_vintage('2019') == '2010'
+    assert batch.geography_vintage(2020) == '2020'
+    assert batch.geography_vintage('2022') == '2020'
+    assert batch.geography_vintage('2010') == '2010'
+
+
+def test_long_table():
+    tables = {'2019': pd.DataFrame({'GEOID': ['480850001001', '480850001002'], 'TractID': ['000100', '000100'],
+                                    'County': ['085', '085'], 'County_Name': ['Collin', 'Collin'],
+                                    'Total_Pop': np.array([10, 20], dtype=np.int32), 'PctMin': [0.5, np.nan],
+                                    'ARP_Min': [True, False]}),
+              '2020': pd.DataFrame({'GEOID': ['480850001001'], 'TractID': ['000100'], 'County': ['085'],
+                                    'County_Name': ['Collin'], 'Total_Pop': np.array([12], dtype=np.int32),
+                                    'PctMin': [0.25], 'ARP_Min': [True]})}
+    stacked = batch.long_table(tables)
+    assert list(stacked.columns) == ['Year', 'GEOID', 'TractID', 'County', 'Field', 'Value']
+    # Two block groups by three numeric fields for 2019, one by three for 2020; names are left out.
+    assert len(stacked) == 9
+    assert stacked['Year'].dtype == np.int64
+    assert stacked['Value'].dtype == np.float64
+    assert isinstance(stacked['Field'].dtype, pd.CategoricalDtype)
+    assert stacked['Year'].tolist() == [2019] * 6 + [2020] * 3
+    assert stacked['Field'].astype(str).tolist() == ['Total_Pop', 'Total_Pop', 'PctMin', 'PctMin', 'ARP_Min',
+                                                     'ARP_Min', 'Total_Pop', 'PctMin', 'ARP_Min']
+    values = stacked['Value'].tolist()
+    assert values[:2] == [10.0, 20.0]
+    assert values[2] == 0.5 and np.isnan(values[3])
+    assert values[4:] == [1.0, 0.0, 12.0, 0.25, 1.0]
+
+
+def test_run_writes_every_year_and_the_long_table(census_api, settings, tmp_path):
+    paths = batch.run(settings, ['2019', '2020'], '48', ['085'], str(tmp_path), formats=['csv'], processes=1,
+                      message=quiet)
+    assert [os.path.relpath(path, str(tmp_path)) for path in paths] == [
+        'TAIT_2019ACS.csv', 'TAIT_2019ACS_Tract.csv', 'TAIT_2020ACS.csv', 'TAIT_2020ACS_Tract.csv',
+        'TAIT_2019_2020ACS_Long.csv']
+    stacked = pd.read_csv(paths[-1], dtype={'GEOID': str})
+    assert sorted(stacked['Year'].unique().tolist()) == [2019, 2020]
+    assert stacked['GEOID'].str.startswith('48085').all()
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from tait import builder, planner
+
+POPULATION = [{'desc_name': 'Total_Pop', 'census_name': 'B01001_001E'}]
+MINORITY = [{'desc_name': 'TotalMin', 'census_name': 'B03002_001E'}]
+
+
+def quiet(message):
+    pass
+
+
+def test_frame_builder_parses_every_response_once():
+    frame_builder = builder.FrameBuilder(POPULATION, 'tract')
+    frame_builder.add([['100', '48', '85', '100']])
+    frame_builder.add([['-666666666', '48', '085', '200'], ['7', '48', '113', '010100']])
+    frame = frame_builder.build()
+    assert frame_builder.rows == 3
+    assert frame['Total_Pop'].tolist() == [100, 0, 7]
+    assert frame['County'].tolist() == ['085', '085', '113']
+    assert frame_builder.replaced == {'Total_Pop': 1}
+
+
+def test_add_geoids_sorts_by_key():
+    frame = pd.DataFrame({'State': ['48', '48'], 'County': ['113', '085'], 'Tract': ['010100', '000100'],
+                          'BG': ['2', '1']})
+    frame = builder.add_geoids(frame, 'block group')
+    assert frame.index.tolist() == [480850001001, 481130101002]
+    assert frame['GEOID'].tolist() == ['480850001001', '481130101002']
+    assert frame['Tract_GEOID'].tolist() == ['48085000100', '48113010100']
+
+    tracts = builder.add_geoids(frame[['State', 'County', 'Tract']].copy(), 'tract')
+    assert tracts['Tract_GEOID'].tolist() == ['48085000100', '48113010100']
+    assert builder.add_geoids(pd.DataFrame({'State': ['17'], 'County': ['031']}), 'county')[
+        'County_GEOID'].tolist() == ['17031']
+
+
+def test_attach_parent():
+    block_groups = pd.DataFrame({'Total_Pop': [1, 2, 3], 'Tract_GEOID': ['48085000100', '48085000100',
+                                                                         '48085000300']},
+                                index=pd.Index([480850001001, 480850001002, 480850003001], name='key'))
+    tracts = pd.DataFrame({'Tract_GEOID': ['48085000100', '48085000200'], 'WholeTract_PWD': [40.0, 7.0]},
+                          index=pd.Index([48085000100, 48085000200], name='key'))
+    result = builder.attach_parent(block_groups, tracts, 'block group')
+    assert list(result.columns) == ['Total_Pop', 'Tract_GEOID', 'WholeTract_PWD']
+    assert result['WholeTract_PWD'].tolist()[:2] == [40.0, 40.0]
+    # The third block group's tract is not in the tract frame.
+    assert np.isnan(result['WholeTract_PWD'].tolist()[2])
+
+
+def block_group_rows(values, block_groups):
+    return [[str(value), '48', '085', '000100', block_group] for value, block_group in zip(values, block_groups)]
+
+
+def test_load_plan_places_chunks_of_the_same_rows_side_by_side():
+    plan = [planner.PlannedChunk('block group', POPULATION, False),
+            planner.PlannedChunk('block group', MINORITY, False)]
+    results = [[block_group_rows([10, 20], '12')], [block_group_rows([1, 2], '12')]]
+    frames = builder.load_plan(plan, results, message=quiet)
+    assert list(frames) == ['block group']
+    frame = frames['block group']
+    assert frame['Total_Pop'].tolist() == [10, 20]
+    assert frame['TotalMin'].tolist() == [1, 2]
+
+
+def test_load_plan_keeps_rows_that_only_some_chunks_have():
+    plan = [planner.PlannedChunk('block group', POPULATION, False),
+            planner.PlannedChunk('block group', MINORITY, False)]
+    results = [[block_group_rows([10, 20], '12')], [block_group_rows([2, 3], '23')]]
+    messages = []
+    frame = builder.load_plan(plan, results, message=messages.append)['block group']
+    assert frame['GEOID'].tolist() == ['480850001001', '480850001002', '480850001003']
+    assert frame['BG'].tolist() == ['1', '2', '3']
+    assert frame['Total_Pop'].tolist() == [10, 20, 0]
+    assert frame['TotalMin'].tolist() == [0, 2, 3]
+    assert frame['Total_Pop'].dtype == np.int64
+    assert frame['TotalMin'].dtype == np.int64
+    assert '2 block groups are missing from some responses; their values there are set to 0' in messages
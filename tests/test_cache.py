@@ -0,0 +1,45 @@
+import os
+
+from tait import cache, fetch
+
+
+def request(number):
+    return fetch.make_request('2019', ['B01001_001E'], '48', '{:03d}'.format(number), 'block group')
+
+
+def test_get_returns_what_was_put(tmp_path):
+    response_cache = cache.ResponseCache(str(tmp_path))
+    assert response_cache.get(request(1)) is None
+    response_cache.put(request(1), b'[["B01001_001E"]]')
+    assert response_cache.get(request(1)) == b'[["B01001_001E"]]'
+    assert cache.ResponseCache(str(tmp_path), refresh=True).get(request(1)) is None
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    response_cache = cache.ResponseCache(str(tmp_path), max_bytes=2500)
+    for number in range(3):
+        response_cache.put(request(number), b'x' * 1000)
+        os.utime(os.path.join(str(tmp_path), cache.request_key(request(number)) + '.json'), (number, number))
+    assert response_cache.get(request(0)) is None
+    assert response_cache.get(request(2)) == b'x' * 1000
+    assert len(os.listdir(str(tmp_path))) == 2
+
+
+def test_the_folder_is_listed_once_until_the_cap_is_reached(tmp_path, monkeypatch):
+    response_cache = cache.ResponseCache(str(tmp_path), max_bytes=10000)
+    listings = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda folder: listings.append(folder) or listdir(folder))
+    for number in range(9):
+        response_cache.put(request(number), b'x' * 1000)
+    assert listings == []
+    response_cache.put(request(1), b'x' * 2000)
+    response_cache.put(request(9), b'x' * 1000)
+    assert len(listings) == 1
+
+
+def test_a_reopened_cache_counts_what_is_already_there(tmp_path):
+    cache.ResponseCache(str(tmp_path)).put(request(1), b'x' * 1000)
+    response_cache = cache.ResponseCache(str(tmp_path), max_bytes=1500)
+    response_cache.put(request(2), b'x' * 1000)
+    assert len(os.listdir(str(tmp_path))) == 1
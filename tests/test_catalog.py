@@ -0,0 +1,31 @@
+from tait import catalog
+
+GEOGRAPHY = {'label': "Census API FIPS 'for' clause", 'concept': 'Census API Geography Specification',
+             'group': 'N/A', 'predicateType': 'fips-for'}
+
+
+def variables(labels):
+    document = {'variables': {'for': GEOGRAPHY, 'in': GEOGRAPHY, 'ucgid': GEOGRAPHY,
+                              'NAME': {'label': 'Geographic Area Name', 'group': 'N/A', 'predicateType': 'string'}}}
+    for name, label in labels.items():
+        document['variables'][name] = {'label': label, 'concept': 'SEX BY AGE', 'group': name.split('_')[0],
+                                       'predicateType': 'int'}
+    return document
+
+
+def test_pseudo_variables_are_left_out(tmp_path):
+    variable_catalog = catalog.VariableCatalog(str(tmp_path / 'catalog.sqlite'))
+    variable_catalog.load('2019', variables({'B01001_001E': 'Estimate!!Total'}))
+    assert variable_catalog.variable('2019', 'for') is None
+    assert variable_catalog.variable('2019', 'NAME').group is None
+    assert variable_catalog.concepts('2019') == ['SEX BY AGE']
+
+
+def test_compare(tmp_path):
+    variable_catalog = catalog.VariableCatalog(str(tmp_path / 'catalog.sqlite'))
+    variable_catalog.load('2019', variables({'B01001_001E': 'Estimate!!Total', 'B01001_002E': 'Estimate!!Male'}))
+    variable_catalog.load('2020', variables({'B01001_001E': 'Estimate!!Total:', 'B01001_003E': 'Estimate!!Female'}))
+    changes = variable_catalog.compare('2019', '2020')
+    assert changes['dropped'] == ['B01001_002E']
+    assert changes['added'] == ['B01001_003E']
+    assert changes['relabelled'] == [('B01001_001E', 'Estimate!!Total', 'Estimate!!Total:')]
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tait import derive
+
+SPECS = [{'desc_name': 'Male65to66', 'census_name': 'B01001_020E'},
+         {'desc_name': 'Male67to69', 'census_name': 'B01001_021E'},
+         {'desc_name': 'Fem65to66', 'census_name': 'B01001_044E'},
+         {'desc_name': 'Fem67to69', 'census_name': 'B01001_045E'}]
+
+
+def test_split_terms():
+    assert derive.split_terms('A - sum(B, C) + D') == [(1, 'A'), (-1, 'sum(B, C)'), (1, 'D')]
+    assert derive.split_terms('-A - -B') == [(-1, 'A'), (1, 'B')]
+
+
+def test_unary_plus_keeps_the_sign():
+    assert derive.split_terms('A - +B') == [(1, 'A'), (-1, 'B')]
+    assert derive.split_terms('+A + +B') == [(1, 'A'), (1, 'B')]
+
+
+@pytest.mark.parametrize('formula', ['A + (B', 'A +', ''])
+def test_malformed_formulas(formula):
+    with pytest.raises(ValueError):
+        derive.split_terms(formula)
+
+
+def test_ranges_and_continuations():
+    assert derive.expand_items('B01001_020..021, 044..045') == ['B01001_020E', 'B01001_021E', 'B01001_044E',
+                                                               'B01001_045E']
+    assert derive.expand_items('B01001_020M, 044') == ['B01001_020M', 'B01001_044E']
+    assert derive.expand_items('B01001_020..021M') == ['B01001_020M', 'B01001_021M']
+
+
+def test_ranges_need_a_table():
+    with pytest.raises(ValueError):
+        derive.expand_items('020..025')
+    with pytest.raises(ValueError):
+        derive.expand_items('044')
+
+
+def test_compile_fields_builds_one_coefficient_matrix():
+    fields = [{'name': 'Age65to69', 'formula': 'sum(B01001_020..021, 044..045)'},
+              {'name': 'Male65to69', 'formula': 'B01001_020 + B01001_021'},
+              {'name': 'Female65to69', 'formula': 'Age65to69 - Male65to69'}]
+    columns, names, coefficients = derive.compile_fields(fields, SPECS, [spec['desc_name'] for spec in SPECS])
+    assert names == ['Age65to69', 'Male65to69', 'Female65to69']
+    weights = dict((column, coefficients[i].tolist()) for i, column in enumerate(columns))
+    assert weights == {'Male65to66': [1, 1, 0], 'Male67to69': [1, 1, 0], 'Fem65to66': [1, 0, 1],
+                       'Fem67to69': [1, 0, 1]}
+
+
+def test_self_reference_is_an_error():
+    fields = [{'name': 'A', 'formula': 'B + Male65to66'}, {'name': 'B', 'formula': 'A - Male67to69'}]
+    with pytest.raises(ValueError, match='itself'):
+        derive.compile_fields(fields, SPECS, ['Male65to66', 'Male67to69'])
+
+
+def test_unknown_references_are_an_error():
+    with pytest.raises(ValueError, match='B01001_099E'):
+        derive.compile_fields([{'name': 'A', 'formula': 'B01001_099'}], SPECS, [])
+
+
+def test_derive_adds_integer_fields():
+    frame = pd.DataFrame({'Male65to66': [1, 2], 'Male67to69': [3, 4], 'Fem65to66': [5, 6], 'Fem67to69': [7, 8]})
+    fields = [{'name': 'Age65to69', 'formula': 'sum(B01001_020..021, 044..045)'},
+              {'name': 'MaleLessFemale', 'formula': 'B01001_020 + B01001_021 - sum(B01001_044, 045)'}]
+    result = derive.derive(frame, fields, SPECS)
+    assert result['Age65to69'].tolist() == [16, 20]
+    assert result['MaleLessFemale'].tolist() == [-8, -8]
+    assert result['Age65to69'].dtype == np.int64
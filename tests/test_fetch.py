@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+import census_server
+from tait import fetch
+
+POPULATION = [{'desc_name': 'Total_Pop', 'census_name': 'B01001_001E'}]
+
+
+class FlakyHandler(census_server.CensusHandler):
+    # Answers with the server's scripted statuses, one per request, before serving normally.
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.server.statuses:
+            self.respond(self.server.statuses.pop(0), b'error')
+            return
+        census_server.CensusHandler.do_GET(self)
+
+
+@pytest.fixture
+def flaky_api(monkeypatch):
+    server = census_server.CensusServer()
+    server.httpd.RequestHandlerClass = FlakyHandler
+    server.httpd.statuses = []
+    server.httpd.paths = []
+    sleeps = []
+    monkeypatch.setattr(fetch.time, 'sleep', sleeps.append)
+    with server:
+        monkeypatch.setattr(fetch, 'API_ROOT', server.api_root)
+        yield server.httpd, sleeps
+
+
+def test_build_url():
+    assert fetch.build_url(fetch.make_request(2019, POPULATION, '48', '085', 'block group')) == (
+        fetch.API_ROOT + '/2019/acs/acs5?get=B01001_001E&in=state:48%20county:085&for=block%20group')
+    assert fetch.build_url(fetch.make_request(2019, ['B01001_001E'], '48', None, 'tract')) == (
+        fetch.API_ROOT + '/2019/acs/acs5?get=B01001_001E&in=state:48&for=tract')
+    assert fetch.build_url(fetch.make_request(2019, ['B01001_001E'], '48', None, 'county')) == (
+        fetch.API_ROOT + '/2019/acs/acs5?get=B01001_001E&for=county:*&in=state:48')
+
+
+def test_results_come_back_in_request_order(census_api):
+    counties = ['085', '113', '121', '139', '231', '251', '257', '367', '397', '439', '497']
+    requests = [fetch.make_request(2019, POPULATION, '48', county, 'tract') for county in counties]
+    payloads = fetch.fetch_all(requests, max_workers=4)
+    assert [payload[0] for payload in payloads] == [['B01001_001E', 'state', 'county', 'tract']] * len(counties)
+    assert [set(row[2] for row in payload[1:]) for payload in payloads] == [set([county]) for county in counties]
+
+
+def test_server_errors_and_throttling_are_retried(flaky_api):
+    httpd, sleeps = flaky_api
+    httpd.statuses = [503, 429]
+    request = fetch.make_request(2019, POPULATION, '48', '085', 'tract')
+    payload = json.loads(fetch.fetch_body(request, retries=2))
+    assert payload[0] == ['B01001_001E', 'state', 'county', 'tract']
+    assert len(httpd.paths) == 3
+    assert sleeps == [1, 2]
+
+
+def test_retries_give_up_with_a_runtime_error(flaky_api):
+    httpd, sleeps = flaky_api
+    httpd.statuses = [503, 503, 503]
+    with pytest.raises(RuntimeError, match='503'):
+        fetch.fetch_body(fetch.make_request(2019, POPULATION, '48', '085', 'tract'), retries=2)
+    assert len(httpd.paths) == 3
+
+
+def test_client_errors_are_not_retried(flaky_api):
+    httpd, sleeps = flaky_api
+    httpd.statuses = [404]
+    with pytest.raises(RuntimeError, match='404'):
+        fetch.fetch_body(fetch.make_request(2019, POPULATION, '48', '085', 'tract'), retries=2)
+    assert len(httpd.paths) == 1
+    assert sleeps == []
+
+
+def test_an_empty_response_is_no_rows(census_api):
+    # The stand-in API, like the real one, answers a county the state does not have with an empty 204.
+    assert fetch.fetch_one(fetch.make_request(2019, POPULATION, '48', '999', 'tract')) == []
+
+
+def test_filter_counties_of_a_state_wide_response():
+    payload = [['B01001_001E', 'state', 'county', 'tract'],
+               ['1', '48', '085', '000100'], ['2', '48', '113', '000100'], ['3', '48', '085', '000200'],
+               ['4', '48', '121', '000100']]
+    assert fetch.filter_counties(payload, ['085', '121']) == [
+        ['1', '48', '085', '000100'], ['3', '48', '085', '000200'], ['4', '48', '121', '000100']]
+    assert fetch.filter_counties(payload, ['999']) == []
+    assert fetch.filter_counties(payload[:1], ['085']) == []
+
+
+def test_filter_counties_finds_the_county_column_by_name(census_api):
+    # A state-wide response from the stand-in API, with the county column after several variables.
+    request = fetch.make_request(2019, ['B01001_001E', 'B01001_002E'], '10', None, 'tract')
+    payload = fetch.fetch_one(request)
+    assert set(row[3] for row in payload[1:]) == set(['001', '003', '005'])
+    rows = fetch.filter_counties(payload, ['003'])
+    assert rows and set(row[3] for row in rows) == set(['003'])
+    assert rows == [row for row in payload[1:] if row[3] == '003']
+
+
+def test_project_a_table_response_to_the_requested_variables():
+    payload = [['GEO_ID', 'NAME', 'B16004_001E', 'B16004_001M', 'B16004_002E', 'B16004_003E', 'state', 'county',
+                'tract'],
+               ['1400000US48085000100', 'Tract 1', '10', '3', '20', '30', '48', '085', '000100'],
+               ['1400000US48085000200', 'Tract 2', '11', '4', '21', '31', '48', '085', '000200']]
+    specs = [{'desc_name': 'Speak3', 'census_name': 'B16004_003E'},
+             {'desc_name': 'Speak1', 'census_name': 'B16004_001E'}]
+    assert fetch.project(payload, specs, 'tract') == [
+        ['B16004_003E', 'B16004_001E', 'state', 'county', 'tract'],
+        ['30', '10', '48', '085', '000100'],
+        ['31', '11', '48', '085', '000200']]
+    assert fetch.project(payload[:1], specs, 'tract') == [['B16004_003E', 'B16004_001E', 'state', 'county', 'tract']]
+    assert fetch.project([], specs, 'tract') == []
+    with pytest.raises(RuntimeError, match='B16004_009E'):
+        fetch.project(payload, [{'desc_name': 'Speak9', 'census_name': 'B16004_009E'}], 'tract')
+
+
+def test_project_a_table_response_from_the_api(census_api):
+    specs = [{'desc_name': 'Speak2', 'census_name': 'B16004_002E'},
+             {'desc_name': 'Speak2_MOE', 'census_name': 'B16004_002M'}]
+    payload = fetch.fetch_one(fetch.make_request(2019, ['group(B16004)'], '48', '085', 'block group'))
+    assert payload[0][:2] == ['GEO_ID', 'NAME']
+    projected = fetch.project(payload, specs, 'block group')
+    named = fetch.fetch_one(fetch.make_request(2019, specs, '48', '085', 'block group'))
+    assert projected == named
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from tait import fips
+
+
+def test_every_state_has_its_counties():
+    table = fips.load_counties()
+    assert len(table) == 3221
+    assert table['state'].nunique() == 52
+    assert not table.duplicated(['state', 'county']).any()
+    assert len(fips.county_names('48')) == 254
+    assert len(fips.county_names('06')) == 58
+
+
+def test_county_names():
+    assert fips.county_names('17', ['031', '043']) == {'031': 'Cook', '043': 'DuPage'}
+    assert fips.county_names('24', ['005', '510']) == {'005': 'Baltimore', '510': 'Baltimore city'}
+    assert fips.county_names('22', ['071']) == {'071': 'Orleans Parish'}
+
+
+def test_unknown_counties_are_an_error():
+    with pytest.raises(ValueError, match='999'):
+        fips.county_names('48', ['085', '999'])
+    with pytest.raises(ValueError):
+        fips.county_names('99')
+
+
+def test_add_county_names():
+    frame = pd.DataFrame({'County': ['085', '113', '085'], 'Total_Pop': [1, 2, 3]})
+    result = fips.add_county_names(frame, '48')
+    assert result['CountyText'].tolist() == ['Collin', 'Dallas', 'Collin']
+    assert isinstance(result['CountyText'].dtype, pd.CategoricalDtype)
+    assert 'CountyText' not in frame.columns
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from tait import geoid
+
+
+def block_groups():
+    return pd.DataFrame({'State': ['48', '17', '06'], 'County': ['085', '031', '001'],
+                         'Tract': ['123456', '010100', '400100'], 'BG': ['1', '2', '3']})
+
+
+def test_pack_block_groups():
+    keys = geoid.pack(block_groups(), 'block group')
+    assert keys.dtype == np.int64
+    assert keys.tolist() == [480851234561, 170310101002, 60014001003]
+
+
+def test_pack_and_to_string_round_trip():
+    frame = block_groups()
+    strings = geoid.to_string(geoid.pack(frame, 'block group'), 'block group')
+    assert strings.tolist() == (frame['State'] + frame['County'] + frame['Tract'] + frame['BG']).tolist()
+    assert geoid.to_string(geoid.pack(frame, 'tract'), 'tract').tolist() == ['48085123456', '17031010100',
+                                                                             '06001400100']
+    assert geoid.to_string(np.array([], dtype=np.int64), 'county').tolist() == []
+
+
+def test_parent_keys():
+    keys = geoid.pack(block_groups(), 'block group')
+    tracts = geoid.parent(keys, 'block group')
+    assert tracts.tolist() == geoid.pack(block_groups(), 'tract').tolist()
+    assert geoid.parent(tracts, 'tract').tolist() == [48085, 17031, 6001]
+
+
+def test_lookup():
+    sorted_keys = np.array([10, 20, 30, 40], dtype=np.int64)
+    positions = geoid.lookup(sorted_keys, np.array([30, 10, 25, 50, 5, 40], dtype=np.int64))
+    assert positions.tolist() == [2, 0, -1, -1, -1, 3]
+    assert geoid.lookup(np.array([], dtype=np.int64), np.array([1, 2])).tolist() == [-1, -1]
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tait import geometry
+
+try:
+    import geopandas
+    from shapely import box
+except ImportError:
+    geopandas = None
+
+needs_geopandas = pytest.mark.skipif(geopandas is None, reason='needs geopandas')
+
+# One US survey foot, the unit of the default CRS (EPSG:2276), in metres.
+SURVEY_FOOT = 1200.0 / 3937
+
+
+def quiet(message):
+    pass
+
+
+def make_layer(crs=geometry.CRS, side=5280.0):
+    # Three side x side squares in a row.
+    return geopandas.GeoDataFrame({'GEOID10': ['480850001001', '481130001001', '481130001002'],
+                                   'COUNTYFP10': ['085', '113', '113']},
+                                  geometry=[box(i * side, 0, (i + 1) * side, side) for i in range(3)], crs=crs)
+
+
+@needs_geopandas
+def test_join_keeps_every_shape():
+    backend = geometry.GeoPandasBackend(message=quiet)
+    backend.layers['bg'] = make_layer()[['GEOID10', 'geometry']]
+    table = pd.DataFrame({'GEOID': ['481130001002', '480850001001', '489990001001'], 'Total_Pop': [30, 10, 99],
+                          'ARP_Min': [True, False, True]})
+    backend.join('bg', table, 'GEOID10')
+    layer = backend.layers['bg']
+    assert list(layer.columns) == ['GEOID10', 'geometry', 'Total_Pop', 'ARP_Min']
+    assert layer['GEOID10'].tolist() == ['480850001001', '481130001001', '481130001002']
+    assert layer['Total_Pop'].tolist()[0] == 10
+    assert np.isnan(layer['Total_Pop'].tolist()[1])
+    assert layer['Total_Pop'].tolist()[2] == 30
+    assert isinstance(layer, geopandas.GeoDataFrame)
+
+
+@needs_geopandas
+def test_join_needs_unique_keys():
+    backend = geometry.GeoPandasBackend(message=quiet)
+    backend.layers['bg'] = make_layer()
+    with pytest.raises(ValueError, match='not unique'):
+        backend.join('bg', pd.DataFrame({'GEOID': ['480850001001'] * 2, 'Total_Pop': [1, 2]}), 'GEOID10')
+
+
+@needs_geopandas
+def test_add_area_in_survey_feet():
+    backend = geometry.GeoPandasBackend(message=quiet)
+    backend.layers['bg'] = make_layer().assign(Total_Pop=[640, 0, 1280])
+    backend.add_area('bg')
+    layer = backend.layers['bg']
+    # A square of 5280 survey feet is a square survey mile, a little over an international one.
+    square_mile = (5280 * SURVEY_FOOT) ** 2 / geometry.SQUARE_METRES_PER_SQUARE_MILE
+    assert square_mile == pytest.approx(1.000004, abs=1e-6)
+    assert layer['LandSqM'].to_numpy() == pytest.approx([square_mile] * 3, rel=1e-12)
+    assert layer['PopDen'].to_numpy() == pytest.approx([640 / square_mile, 0, 1280 / square_mile], rel=1e-12)
+
+
+@needs_geopandas
+def test_add_area_in_metres():
+    # 1609.344 metres is an international mile; 640 acres make a square mile.
+    backend = geometry.GeoPandasBackend(crs=3857, message=quiet)
+    backend.layers['bg'] = make_layer(crs=3857, side=1609.344).assign(Total_Pop=[640, 0, 1])
+    backend.add_area('bg')
+    assert backend.layers['bg']['LandSqM'].to_numpy() == pytest.approx([1.0, 1.0, 1.0], rel=1e-12)
+    assert backend.layers['bg']['PopDen'].to_numpy() == pytest.approx([640.0, 0.0, 1.0], rel=1e-12)
+
+
+@needs_geopandas
+def test_add_area_of_an_empty_shape_gives_zero_density():
+    backend = geometry.GeoPandasBackend(message=quiet)
+    layer = make_layer().assign(Total_Pop=[5, 5, 5])
+    layer.loc[1, 'geometry'] = box(0, 0, 0, 0)
+    backend.layers['bg'] = layer
+    backend.add_area('bg')
+    assert backend.layers['bg']['LandSqM'].tolist()[1] == 0
+    assert backend.layers['bg']['PopDen'].tolist()[1] == 0
+
+
+@needs_geopandas
+def test_load_filters_counties(tmp_path):
+    source = str(tmp_path / 'block_groups.gpkg')
+    make_layer().iloc[::-1].to_file(source, driver='GPKG', engine='pyogrio')
+    backend = geometry.GeoPandasBackend(message=quiet)
+    backend.load(source, 'bg', 'GEOID10', 'COUNTYFP10', ['113'])
+    layer = backend.layers['bg']
+    assert list(layer.columns) == ['GEOID10', 'geometry']
+    assert layer['GEOID10'].tolist() == ['481130001001', '481130001002']
+    assert layer.crs.to_epsg() == geometry.CRS
+
+
+def test_county_where():
+    assert geometry.county_where('COUNTYFP10', ['085', '113']) == "COUNTYFP10 IN ('085','113')"
+
+
+def test_structured_array():
+    frame = pd.DataFrame({'GEOID': ['480850001001', '481130001001', None],
+                          'County_Name': pd.Categorical(['Collin', 'Dallas', 'Dallas']),
+                          'Total_Pop': np.array([1200, 0, 35], dtype=np.int64),
+                          'Small': np.array([1, 2, 3], dtype=np.uint8),
+                          'Big': np.array([1, 2 ** 31, -5], dtype=np.int64),
+                          'PctMin': [0.25, np.nan, 1.0],
+                          'ARP_Min': [True, False, True]})
+    array = geometry.structured_array(frame)
+    assert array.dtype.names == tuple(frame.columns)
+    assert [array.dtype[name] for name in array.dtype.names] == [
+        np.dtype('<U12'), np.dtype('<U6'), np.dtype('<i4'), np.dtype('<i4'), np.dtype('<f8'), np.dtype('<f8'),
+        np.dtype('<U1')]
+    assert array['GEOID'].tolist() == ['480850001001', '481130001001', '']
+    assert array['County_Name'].tolist() == ['Collin', 'Dallas', 'Dallas']
+    assert array['Total_Pop'].tolist() == [1200, 0, 35]
+    assert array['Small'].tolist() == [1, 2, 3]
+    assert array['Big'].tolist() == [1.0, 2.0 ** 31, -5.0]
+    assert array['PctMin'][[0, 2]].tolist() == [0.25, 1.0]
+    assert np.isnan(array['PctMin'][1])
+    assert array['ARP_Min'].tolist() == ['Y', 'N', 'Y']
+
+
+def test_structured_array_of_no_rows():
+    array = geometry.structured_array(pd.DataFrame({'Total_Pop': np.array([], dtype=np.int64),
+                                                    'ARP_Min': np.array([], dtype=bool)}))
+    assert len(array) == 0
+    assert array.dtype['Total_Pop'] == np.dtype('<i4')
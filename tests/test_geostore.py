@@ -0,0 +1,39 @@
+import os
+
+from tait import geostore
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_lock_files_do_not_change_a_geodatabase_fingerprint(tmp_path):
+    gdb = tmp_path / 'tl_2020.gdb'
+    gdb.mkdir()
+    write(str(gdb / 'a00000009.gdbtable'), 'table')
+    before = geostore.fingerprint(str(gdb / 'bg'))
+    write(str(gdb / '_gdb.host.1234.5678.sr.lock'), 'lock')
+    write(str(gdb / 'a00000009.host.1234.5678.sr.lock'), 'lock')
+    assert geostore.fingerprint(str(gdb / 'bg')) == before
+
+    write(str(gdb / 'a00000009.gdbtable'), 'edited table')
+    assert geostore.fingerprint(str(gdb / 'bg')) != before
+
+
+def test_shapefiles_are_fingerprinted_with_their_sidecar_files(tmp_path):
+    for extension in ['.shp', '.dbf', '.prj']:
+        write(str(tmp_path / ('bg' + extension)), 'x')
+    write(str(tmp_path / 'other.shp'), 'other')
+    path, size, modified = geostore.fingerprint(str(tmp_path / 'bg.shp'))
+    assert path == os.path.abspath(str(tmp_path / 'bg.shp'))
+    assert size == 3
+
+
+def test_keys_depend_on_the_counties_but_not_their_order(tmp_path):
+    write(str(tmp_path / 'bg.shp'), 'x')
+    store = geostore.GeographyStore(str(tmp_path / 'store'))
+    source = str(tmp_path / 'bg.shp')
+    key = store.key(source, 2020, ['113', '085'], 'GEOID', 'COUNTYFP', 2276)
+    assert key == store.key(source, 2020, ['085', '113'], 'GEOID', 'COUNTYFP', 2276)
+    assert key != store.key(source, 2020, ['085'], 'GEOID', 'COUNTYFP', 2276)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from tait import indicators
+
+FIELDS = [{'variable': 'TotalMin', 'universe': 'Total_Pop', 'pct': 'Pct_TotMin', 'ratio': 'Rat_TotMin',
+           'arp': 'ARP_TotMin'},
+          {'variable': 'BlwPov', 'universe': 'PovUniverse', 'pct': 'Pct_BlwPov', 'ratio': 'Rat_BlwPov'}]
+
+
+def quiet(message):
+    pass
+
+
+def test_regional_rates_of_an_empty_universe_are_nan():
+    rates = indicators.regional_rates([5.0, 3.0], [10.0, 0.0])
+    assert rates[0] == 0.5
+    assert np.isnan(rates[1])
+
+
+def test_compute():
+    frame = pd.DataFrame({'TotalMin': [30, 10, 0], 'Total_Pop': [60, 40, 0], 'BlwPov': [5, 0, 0],
+                          'PovUniverse': [0, 0, 0]})
+    result = indicators.compute(frame, FIELDS, message=quiet)
+    # The region is 40 of 100, so the first block group is 1.25 times the regional share.
+    assert result['Pct_TotMin'].tolist() == [0.5, 0.25, 0.0]
+    assert result['Rat_TotMin'].tolist() == [1.25, 0.625, 0.0]
+    assert result['ARP_TotMin'].tolist() == [True, False, False]
+    # No universe anywhere: every percentage and ratio is the empty value.
+    assert result['Pct_BlwPov'].tolist() == [0.0, 0.0, 0.0]
+    assert result['Rat_BlwPov'].tolist() == [0.0, 0.0, 0.0]
+
+
+def test_compute_against_given_regional_rates():
+    frame = pd.DataFrame({'TotalMin': [30], 'Total_Pop': [60], 'BlwPov': [5], 'PovUniverse': [10]})
+    result = indicators.compute(frame, FIELDS, message=quiet, regional=np.array([0.25, np.nan]))
+    assert result['Rat_TotMin'].tolist() == [2.0]
+    assert result['Rat_BlwPov'].tolist() == [0.0]
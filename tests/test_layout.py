@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tait import fetch, layout, pipeline
+
+STATE = '48'
+COUNTIES = ['085', '113', '121']
+
+
+def quiet(message):
+    pass
+
+
+def test_compact_layout():
+    frame = pd.DataFrame({'GEOID': ['480850001001', '480850001002'], 'State': ['48', '48'],
+                          'County': ['085', '085'], 'Total_Pop': [12, 70000], 'Change': [-300, 4],
+                          'Flag': ['Y', 'N'], 'Pct_TotMin': [0.25, 0.5], 'MedianIncome': [52000.5, 0.0]})
+    compacted = layout.compact(frame, float32_columns=['Pct_TotMin'], message=quiet)
+    assert compacted['GEOID'].tolist() == [480850001001, 480850001002]
+    assert isinstance(compacted['County'].dtype, pd.CategoricalDtype)
+    assert compacted['Total_Pop'].dtype == np.uint32
+    assert compacted['Change'].dtype == np.int16
+    assert compacted['Flag'].tolist() == [True, False]
+    assert compacted['Pct_TotMin'].dtype == np.float32
+    assert compacted['MedianIncome'].dtype == np.float64
+    assert layout.table_bytes(compacted) < layout.table_bytes(frame)
+    assert layout.expand(compacted)['GEOID'].tolist() == frame['GEOID'].tolist()
+
+
+def test_count_dtype():
+    assert layout.count_dtype(np.array([0, 255])) == np.uint8
+    assert layout.count_dtype(np.array([-3, 4])) == np.int8
+    assert layout.count_dtype(np.array([-3, 200])) == np.int16
+    assert layout.count_dtype(np.array([-1, -1])) == np.int8
+    assert layout.count_dtype(np.array([-2 ** 31, 2 ** 31 - 1])) == np.int32
+
+
+def test_widen_counts():
+    frame = pd.DataFrame({'Total_Pop': np.array([1, 2], dtype=np.uint8), 'Pct': [0.5, 1.0]})
+    assert layout.widen_counts(frame).dtypes.tolist() == [np.int64, np.float64]
+
+
+def comparable(frame):
+    # frame with packed GEOIDs as strings and every column at its widest type.
+    frame = layout.widen_counts(layout.expand(frame))
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            columns[column] = values.astype(str)
+        elif values.dtype.kind == 'f':
+            columns[column] = values.astype(np.float64)
+    return frame.assign(**columns)
+
+
+def test_compact_tables_give_the_same_results(census_api, settings):
+    request_plan = pipeline.plan(settings, STATE, COUNTIES)
+    results = fetch.fetch_plan('2019', STATE, COUNTIES, request_plan, message=quiet)
+    bg, tract = pipeline.calculate(settings, request_plan, results, STATE, message=quiet)
+    compact_bg, compact_tract = pipeline.calculate(dict(settings, compact_tables=True), request_plan, results, STATE,
+                                                   message=quiet)
+
+    assert layout.table_bytes(compact_bg) < layout.table_bytes(bg)
+    for expected, actual in [[tract, compact_tract], [bg, compact_bg]]:
+        expected, actual = comparable(expected), comparable(actual)
+        assert list(actual.columns) == list(expected.columns)
+        assert actual.index.tolist() == expected.index.tolist()
+        for column in expected.columns:
+            if expected[column].dtype.kind == 'f':
+                # float32 keeps about 7 significant digits.
+                assert actual[column].to_numpy() == pytest.approx(expected[column].to_numpy(), rel=1e-6, nan_ok=True)
+            else:
+                assert actual[column].tolist() == expected[column].tolist(), column
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tait import apportion, derive, indicators, moe
+
+SPECS = [{'desc_name': 'SpanishLEP', 'census_name': 'C16001_005E'},
+         {'desc_name': 'AsianLEP', 'census_name': 'C16001_023E'}]
+
+
+def quiet(message):
+    pass
+
+
+def test_with_moe_adds_the_margin_after_each_estimate():
+    specs = moe.with_moe(SPECS)
+    assert [spec['census_name'] for spec in specs] == ['C16001_005E', 'C16001_005M', 'C16001_023E', 'C16001_023M']
+    assert specs[1]['desc_name'] == 'SpanishLEP_MOE'
+    assert [moe.is_moe(spec) for spec in specs] == [False, True, False, True]
+
+
+def test_output_columns():
+    assert moe.output_columns(['A', 'B'], ['A', 'A_MOE', 'B']) == ['A', 'A_MOE', 'B']
+
+
+def test_sum_of_squares():
+    assert moe.sum_of_squares(np.array([[3.0, 1.0], [4.0, np.nan]])).tolist() == [25.0, 1.0]
+
+
+def test_proportion():
+    # p = 20 / 100 with margins 6 and 10: sqrt(36 - 0.04 * 100) / 100.
+    assert moe.proportion(0.2, 6.0, 10.0, 100.0) == pytest.approx(np.sqrt(32.0) / 100)
+    # The radicand 1 - 0.64 * 100 is negative, so the ratio formula is used instead.
+    assert moe.proportion(0.8, 1.0, 10.0, 100.0) == pytest.approx(np.sqrt(65.0) / 100)
+    assert np.isnan(moe.proportion(np.array([0.0]), np.array([5.0]), np.array([5.0]), np.array([0.0]), np.nan)[0])
+
+
+def test_ratio():
+    # r = 50 / 25 with margins 3 and 4: sqrt(9 + 4 * 16) / 25.
+    assert moe.ratio(2.0, 3.0, 4.0, 25.0) == pytest.approx(np.sqrt(73.0) / 25)
+    assert moe.ratio(np.array([2.0]), np.array([3.0]), np.array([4.0]), np.array([0.0]), -1.0).tolist() == [-1.0]
+
+
+def test_derived_sums_take_the_root_sum_of_squares():
+    frame = pd.DataFrame({'SpanishLEP': [10, 20], 'SpanishLEP_MOE': [3, 5], 'AsianLEP': [4, 2],
+                          'AsianLEP_MOE': [4, 12], 'Other': [1, 1]})
+    result = derive.derive(frame, [{'name': 'TotalLEP', 'formula': 'SpanishLEP + AsianLEP'},
+                                   {'name': 'Difference', 'formula': 'SpanishLEP - AsianLEP'},
+                                   {'name': 'WithOther', 'formula': 'SpanishLEP + Other'}], SPECS)
+    assert result['TotalLEP_MOE'].tolist() == [5.0, 13.0]
+    assert result['Difference_MOE'].tolist() == [5.0, 13.0]
+    assert 'WithOther_MOE' not in result.columns
+
+
+def test_apportioned_margins_are_scaled_by_the_same_share():
+    block_groups = pd.DataFrame({'Total_Pop': [10, 30]}, index=pd.Index([480850001001, 480850001002]))
+    tracts = pd.DataFrame({'WholeTract_PWD': [80.0], 'WholeTract_PWD_MOE': [20.0]}, index=pd.Index([48085000100]))
+    result = apportion.apportion(block_groups, tracts,
+                                 [{'name': 'Sum_PWD', 'source': 'WholeTract_PWD', 'weight': 'Total_Pop'}],
+                                 message=quiet)
+    assert result['Sum_PWD'].tolist() == [20.0, 60.0]
+    assert result['Sum_PWD_MOE'].tolist() == [5.0, 15.0]
+
+
+def test_indicator_margins():
+    fields = [{'variable': 'TotalMin', 'universe': 'Total_Pop', 'pct': 'Pct_TotMin', 'ratio': 'Rat_TotMin'}]
+    frame = pd.DataFrame({'TotalMin': [20.0, 30.0], 'TotalMin_MOE': [6.0, 0.0], 'Total_Pop': [100.0, 100.0],
+                          'Total_Pop_MOE': [10.0, 0.0]})
+    result = indicators.compute(frame, fields, message=quiet)
+    pct_moe = moe.proportion(0.2, 6.0, 10.0, 100.0)
+    regional_moe = moe.proportion(0.25, 6.0, 10.0, 200.0)
+    assert result['Pct_TotMin_MOE'][0] == pytest.approx(pct_moe)
+    assert result['Rat_TotMin_MOE'][0] == pytest.approx(moe.ratio(0.8, pct_moe, regional_moe, 0.25))
+    assert result['Pct_TotMin_MOE'][1] == 0.0
+
+
+def test_ratio_margins_of_an_empty_region_are_the_empty_value():
+    fields = [{'variable': 'BlwPov', 'universe': 'PovUniverse', 'pct': 'Pct_BlwPov', 'ratio': 'Rat_BlwPov'}]
+    frame = pd.DataFrame({'BlwPov': [0.0], 'BlwPov_MOE': [12.0], 'PovUniverse': [0.0], 'PovUniverse_MOE': [12.0]})
+    result = indicators.compute(frame, fields, message=quiet)
+    assert result['Rat_BlwPov_MOE'].tolist() == [0.0]
@@ -0,0 +1,14 @@
+import numpy as np
+
+from tait import numeric
+
+
+def test_safe_divide_zero_denominators():
+    result = numeric.safe_divide([1.0, 2.0, 0.0, 3.0], [2.0, 0.0, 0.0, 4.0])
+    assert result.tolist() == [0.5, 0.0, 0.0, 0.75]
+    assert np.isnan(numeric.safe_divide([1.0], [0.0], np.nan)[0])
+
+
+def test_safe_divide_broadcasts():
+    result = numeric.safe_divide(np.array([[1.0, 2.0], [3.0, 4.0]]), np.array([2.0, 0.0]), -1.0)
+    assert result.tolist() == [[0.5, -1.0], [1.5, -1.0]]
@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tait import output
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def quiet(message):
+    pass
+
+
+def make_frame():
+    return pd.DataFrame({'GEOID': ['481130001001', '480850001001', '481130001002', '480850002001'],
+                         'County': ['113', '085', '113', '085'],
+                         'County_Name': pd.Categorical(['Dallas', 'Collin', 'Dallas', 'Collin']),
+                         'Total_Pop': np.array([1200, 800, 0, 950], dtype=np.int32),
+                         'PctMin': [0.25, 0.5, np.nan, 0.125],
+                         'ARP_Min': [True, False, False, True]})
+
+
+def by_county(frame):
+    return frame.sort_values('County', kind='stable').reset_index(drop=True)
+
+
+def test_parquet_round_trip_has_a_row_group_per_county(tmp_path):
+    frame = make_frame()
+    path = str(tmp_path / 'table.parquet')
+    output.write_parquet(frame, path, 'County')
+    assert pq.ParquetFile(path).num_row_groups == 2
+    assert pq.ParquetFile(path).metadata.row_group(0).num_rows == 2
+    result = pd.read_parquet(path)
+    assert result.dtypes.to_dict() == frame.dtypes.to_dict()
+    pd.testing.assert_frame_equal(result, by_county(frame))
+
+
+def test_feather_round_trip_has_a_record_batch_per_county(tmp_path):
+    frame = make_frame()
+    path = str(tmp_path / 'table.feather')
+    output.write_feather(frame, path, 'County')
+    assert pa.ipc.open_file(path).num_record_batches == 2
+    pd.testing.assert_frame_equal(pd.read_feather(path), by_county(frame))
+
+
+def test_csv_keeps_the_frame_order(tmp_path):
+    frame = make_frame()
+    path = str(tmp_path / 'table.csv')
+    output.write_csv(frame, path, 'County')
+    result = pd.read_csv(path, dtype={'GEOID': str, 'County': str})
+    assert result['GEOID'].tolist() == frame['GEOID'].tolist()
+    assert result['Total_Pop'].tolist() == [1200, 800, 0, 950]
+    assert result['ARP_Min'].tolist() == [True, False, False, True]
+
+
+def test_write_tables(tmp_path):
+    frame = make_frame()
+    futures = output.write_tables([[frame, str(tmp_path / 'blocks')], [frame.head(1), str(tmp_path / 'one')]],
+                                  ['parquet', 'csv'], message=quiet)
+    assert [future.result() for future in futures] == [
+        [str(tmp_path / 'blocks.parquet'), str(tmp_path / 'blocks.csv')],
+        [str(tmp_path / 'one.parquet'), str(tmp_path / 'one.csv')]]
+    assert len(pd.read_parquet(str(tmp_path / 'one.parquet'))) == 1
+
+
+def test_write_tables_raises_writer_errors_from_result(tmp_path):
+    futures = output.write_tables([[make_frame(), str(tmp_path / 'missing' / 'table')]], ['parquet'], message=quiet)
+    with pytest.raises(OSError):
+        futures[0].result()
+
+
+def test_table_writer_appends_parts(tmp_path):
+    frame = make_frame()
+    first = frame.iloc[:2].copy()
+    second = frame.iloc[2:].copy()
+    # Later parts are cast to the first part's schema.
+    second['Total_Pop'] = second['Total_Pop'].astype(np.int64)
+    second['County_Name'] = second['County_Name'].cat.remove_unused_categories()
+
+    messages = []
+    writer = output.TableWriter(str(tmp_path / 'table'), ['parquet', 'feather', 'csv'],
+                                categories={'County_Name': ['Collin', 'Dallas']}, message=messages.append)
+    writer.write(first)
+    writer.write(second)
+    paths = writer.close()
+    assert paths == [str(tmp_path / 'table') + extension for extension in ['.parquet', '.feather', '.csv']]
+    assert messages[0] == 'Wrote 4 rows to table.parquet'
+
+    assert pq.ParquetFile(paths[0]).num_row_groups == 2
+    for result in [pd.read_parquet(paths[0]), pd.read_feather(paths[1])]:
+        assert result['Total_Pop'].dtype == np.int32
+        assert list(result['County_Name'].cat.categories) == ['Collin', 'Dallas']
+        assert result['County_Name'].tolist() == ['Dallas', 'Collin', 'Dallas', 'Collin']
+        assert result['GEOID'].tolist() == frame['GEOID'].tolist()
+
+    with open(paths[2]) as csv_file:
+        lines = csv_file.read().splitlines()
+    assert len(lines) == 5
+    assert lines[0] == ','.join(frame.columns)
+    assert lines[3].startswith('481130001002,113,Dallas,0,')
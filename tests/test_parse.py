@@ -0,0 +1,45 @@
+import numpy as np
+
+from tait import parse
+
+SPECS = [{'desc_name': 'Total_Pop', 'census_name': 'B01001_001E'},
+         {'desc_name': 'MedianIncome', 'census_name': 'B19013_001E', 'dtype': 'float64'}]
+
+
+def test_annotation_sentinels_and_nulls_are_replaced_and_counted():
+    column = np.array(['12', '-666666666', None, '-222222222', 'x', '-999999999', '0', '-5'], dtype=object)
+    values, count = parse.parse_values(column)
+    assert values.dtype == np.int64
+    assert values.tolist() == [12, 0, 0, 0, 0, 0, 0, -5]
+    assert count == 5
+
+
+def test_every_annotation_value_is_masked():
+    column = np.array([str(value) for value in parse.ANNOTATION_VALUES], dtype=object)
+    values, count = parse.parse_values(column)
+    assert count == len(parse.ANNOTATION_VALUES)
+    assert not values.any()
+
+
+def test_fractional_counts_are_kept():
+    values, count = parse.parse_values(np.array(['1.5', '2'], dtype=object))
+    assert values.tolist() == [1.5, 2.0]
+    assert count == 0
+
+
+def test_parse_rows_types_columns_and_pads_geography():
+    rows = [['1200', '-666666666', '17', '31', '10100', '1'],
+            ['300', '52000.5', '17', '031', '010100', '2']]
+    frame, replaced = parse.parse_rows(rows, SPECS, 'block group')
+    assert frame['Total_Pop'].tolist() == [1200, 300]
+    assert frame['MedianIncome'].tolist() == [0.0, 52000.5]
+    assert frame['County'].tolist() == ['031', '031']
+    assert frame['Tract'].tolist() == ['010100', '010100']
+    assert replaced == {'MedianIncome': 1}
+
+
+def test_parse_rows_of_no_rows():
+    frame, replaced = parse.parse_rows([], SPECS, 'tract')
+    assert len(frame) == 0
+    assert list(frame.columns) == ['Total_Pop', 'MedianIncome', 'State', 'County', 'Tract']
+    assert replaced == {}
@@ -0,0 +1,96 @@
+from tait import moe, planner
+
+
+def make_specs(table, count, start=1):
+    return [{'desc_name': '{}_{}'.format(table, number), 'census_name': '{}_{:03d}E'.format(table, number)}
+            for number in range(start, start + count)]
+
+
+def test_block_group_requests_leave_room_for_the_geography_columns():
+    plan = planner.plan_requests([[make_specs('B01001', 120), 'block group']])
+    # 50 names less State, County, Tract and BG leaves 46 variables a request.
+    assert [len(chunk.specs) for chunk in plan] == [46, 46, 28]
+    assert all(len(chunk.specs) + len(planner.GEOGRAPHY_COLUMNS['block group']) <= planner.MAX_VARIABLES
+               for chunk in plan)
+
+
+def test_tract_requests_fit_47_variables():
+    plan = planner.plan_requests([[make_specs('B18101', 47), 'tract']])
+    assert [len(chunk.specs) for chunk in plan] == [47]
+    plan = planner.plan_requests([[make_specs('B18101', 48), 'tract']])
+    assert [len(chunk.specs) for chunk in plan] == [47, 1]
+
+
+def test_every_variable_is_planned_once_and_tables_are_kept_together():
+    specs = make_specs('B01001', 30) + make_specs('B03002', 30) + make_specs('B01001', 10, start=31)
+    plan = planner.plan_requests([[specs, 'block group'], [make_specs('B01001', 5), 1]])
+    planned = [spec['census_name'] for chunk in plan for spec in chunk.specs]
+    assert sorted(planned) == sorted(set(spec['census_name'] for spec in specs))
+    assert planned[:40] == ['B01001_{:03d}E'.format(number) for number in range(1, 41)]
+
+
+def test_geographies_are_planned_finest_first():
+    plan = planner.plan_requests([[make_specs('B18101', 3), 'tract'], [make_specs('B01001', 3), 'block group']])
+    assert [chunk.geography for chunk in plan] == ['block group', 'tract']
+
+
+def test_state_wide_is_only_used_for_geographies_that_allow_it():
+    plan = planner.plan_requests([[make_specs('B18101', 3), 'tract'], [make_specs('B01001', 3), 'block group']],
+                                 state_wide=True)
+    assert dict((chunk.geography, chunk.state_wide) for chunk in plan) == {'block group': False, 'tract': True}
+
+
+def test_use_state_wide():
+    assert not planner.use_state_wide('48', 1)
+    assert planner.use_state_wide('48', 16)
+    assert planner.use_state_wide('17', 102)
+    assert not planner.use_state_wide('99', 500)
+
+
+def test_use_state_wide_thresholds():
+    # Texas' 254 counties make a state-wide response worth 1 + 254 * 0.02 = 6.08 county requests.
+    assert not planner.use_state_wide('48', 6)
+    assert planner.use_state_wide('48', 7)
+    # Delaware's is worth 1.06, so any second county tips it; asking for every county always does.
+    assert not planner.use_state_wide('10', 1)
+    assert planner.use_state_wide('10', 2)
+    assert planner.use_state_wide('11', 1)
+    assert planner.use_state_wide(48, 300)
+
+
+def test_mostly_requested_tables_are_fetched_whole():
+    specs = make_specs('B16004', 40) + make_specs('B01001', 3)
+    plan = planner.plan_requests([[specs, 'block group']], state_wide=False, table_sizes={'B16004': 67, 'B01001': 49})
+    assert [(chunk.group, len(chunk.specs)) for chunk in plan] == [('B16004', 40), (None, 3)]
+
+
+def test_margins_of_error_do_not_count_towards_a_table_share():
+    specs = moe.with_moe(make_specs('B16004', 20))
+    whole, rest = planner.group_tables(specs, {'B16004': 67})
+    assert not whole
+    assert len(rest) == 40
+
+
+def test_group_threshold():
+    # Half of a 67 estimate table is 33.5 variables.
+    whole, rest = planner.group_tables(make_specs('B16004', 34), {'B16004': 67})
+    assert list(whole) == ['B16004'] and not rest
+    whole, rest = planner.group_tables(make_specs('B16004', 33), {'B16004': 67})
+    assert not whole and len(rest) == 33
+    # Small tables need GROUP_MIN_VARIABLES however much of them is asked for.
+    whole, rest = planner.group_tables(make_specs('B08006', 9), {'B08006': 12})
+    assert not whole
+    whole, rest = planner.group_tables(make_specs('B08006', 10), {'B08006': 12})
+    assert list(whole) == ['B08006']
+    # Tables of unknown size are never fetched whole.
+    whole, rest = planner.group_tables(make_specs('B16004', 67), {})
+    assert not whole and len(rest) == 67
+    whole, rest = planner.group_tables(make_specs('B16004', 67), None)
+    assert not whole
+
+
+def test_group_tables_keeps_the_other_tables_in_order():
+    specs = make_specs('B01001', 2) + make_specs('B16004', 40) + make_specs('B03002', 2)
+    whole, rest = planner.group_tables(specs, {'B16004': 67, 'B01001': 49, 'B03002': 21})
+    assert [spec['census_name'] for spec in whole['B16004']] == [spec['census_name'] for spec in specs[2:42]]
+    assert rest == specs[:2] + specs[42:]
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tait import ranking
+
+
+def test_ties_rules():
+    values = np.array([10.0, 20.0, 20.0, 30.0])
+    assert ranking.percentile_ranks(values).tolist() == [0.0, 1 / 3, 1 / 3, 1.0]
+    assert ranking.percentile_ranks(values, ties='average').tolist() == [0.0, 0.5, 0.5, 1.0]
+    assert ranking.percentile_ranks(values, ties='max').tolist() == [0.0, 2 / 3, 2 / 3, 1.0]
+
+
+def test_unknown_ties_rule():
+    with pytest.raises(ValueError):
+        ranking.percentile_ranks(np.array([1.0]), ties='dense')
+
+
+def test_missing_values_get_no_rank_and_are_left_out():
+    ranks = ranking.percentile_ranks(np.array([np.nan, 5.0, 1.0, np.nan, 3.0]))
+    assert np.isnan(ranks[[0, 3]]).all()
+    assert ranks[[2, 4, 1]].tolist() == [0.0, 0.5, 1.0]
+
+
+def test_every_column_is_ranked_on_its_own():
+    matrix = np.array([[1.0, 30.0], [2.0, 20.0], [3.0, 10.0]])
+    assert ranking.percentile_ranks(matrix).tolist() == [[0.0, 1.0], [0.5, 0.5], [1.0, 0.0]]
+
+
+def test_weighted_ranks_are_shares_of_the_weight_below():
+    # Block groups of 100, 300 and 600 people: the highest value has 400 of the other 400 below it.
+    ranks = ranking.percentile_ranks(np.array([1.0, 2.0, 3.0]), weights=np.array([100.0, 300.0, 600.0]))
+    assert ranks.tolist() == [0.0, 100 / 700, 1.0]
+
+
+def test_a_single_value_and_no_values():
+    assert ranking.percentile_ranks(np.array([7.0])).tolist() == [0.0]
+    assert ranking.percentile_ranks(np.empty((0, 2))).shape == (0, 2)
+
+
+def frame():
+    return pd.DataFrame({'Pct_TotMin': [0.1, 0.5, 0.3, np.nan, 0.9], 'Pct_BlwPov': [0.4, 0.2, 0.3, 0.1, 0.5],
+                         'County': ['085', '085', '113', '113', '121']})
+
+
+RANKED_FIELDS = [{'field': 'Pct_TotMin', 'rank': 'Min_RegPct'}, {'field': 'Pct_BlwPov', 'rank': 'Pov_RegPct'}]
+COMPOSITE_INDICES = [{'name': 'Both_RegPct', 'ranks': ['Min_RegPct', 'Pov_RegPct']}]
+
+
+def test_composite_indices_rank_the_sum_of_their_ranks():
+    ranks = ranking.Ranker(frame(), RANKED_FIELDS, COMPOSITE_INDICES).rank()
+    assert list(ranks.columns) == ['Min_RegPct', 'Pov_RegPct', 'Both_RegPct']
+    assert ranks['Min_RegPct'].tolist()[:3] == [0.0, 2 / 3, 1 / 3]
+    # Sums of ranks: 0.75, 0.92, 0.83, NaN and 2; the block group without a minority share gets no composite.
+    assert np.isnan(ranks['Both_RegPct'][3])
+    assert ranks['Both_RegPct'].tolist()[:3] + ranks['Both_RegPct'].tolist()[4:] == [0.0, 2 / 3, 1 / 3, 1.0]
+
+
+def test_composites_need_earlier_ranks():
+    with pytest.raises(ValueError, match='Pov_RegPct'):
+        ranking.Ranker(frame(), RANKED_FIELDS[:1], COMPOSITE_INDICES)
+
+
+def test_ranks_of_a_subset_of_counties_match_ranking_it_alone():
+    subset = ranking.Ranker(frame(), RANKED_FIELDS, COMPOSITE_INDICES).rank(counties=['085', '121'])
+    alone = ranking.Ranker(frame().iloc[[0, 1, 4]], RANKED_FIELDS, COMPOSITE_INDICES).rank()
+    assert np.isnan(subset.iloc[[2, 3]].to_numpy()).all()
+    assert np.array_equal(subset.iloc[[0, 1, 4]].to_numpy(), alone.to_numpy())
+
+
+def test_add_ranks_replaces_earlier_ranks():
+    result = ranking.add_ranks(frame().assign(Min_RegPct=-1.0), RANKED_FIELDS)
+    assert list(result.columns) == ['Pct_TotMin', 'Pct_BlwPov', 'County', 'Min_RegPct', 'Pov_RegPct']
+    assert result['Min_RegPct'].max() == 1.0
@@ -0,0 +1,54 @@
+import json
+import os
+
+import pytest
+
+from tait import regions
+
+
+def write_profile(tmp_path, **changes):
+    profile = {'name': 'DFW', 'state': '48', 'counties': {'085': 'Collin', '113': 'Dallas'},
+               'script': 'CreateTAIT_copy_tol.py', 'crs': 2276}
+    profile.update(changes)
+    path = str(tmp_path / 'dfw.json')
+    with open(path, 'w') as profile_file:
+        json.dump(profile, profile_file)
+    return path
+
+
+def test_bundled_profiles_load():
+    assert regions.profile_names() == ['cmap', 'nctcog']
+    nctcog = regions.load_profile('nctcog')
+    assert nctcog['name'] == 'NCTCOG'
+    assert nctcog['state'] == '48'
+    assert len(nctcog['counties']) == 16
+    assert nctcog['settings']['bg_desired_columns']
+    cmap = regions.load_profile('CMAP')
+    assert cmap['state'] == '17'
+    assert sorted(cmap['counties']) == ['031', '043', '089', '093', '097', '111', '197']
+    assert cmap['crs'] == 3435
+    assert cmap['output_name'] == 'TAIT_CMAP_{year}ACS'
+    assert cmap['geography_fields']['2010'] == ['GEOID10', 'COUNTYFP10']
+
+
+def test_profile_files(tmp_path):
+    region = regions.load_profile(write_profile(tmp_path, description='Two counties'))
+    assert region['name'] == 'DFW'
+    assert region['counties'] == {'085': 'Collin', '113': 'Dallas'}
+    assert region['description'] == 'Two counties'
+    assert region['output_name'] == 'TAIT_{year}ACS'
+    assert region['geography'] == {}
+
+
+def test_unknown_profiles():
+    with pytest.raises(ValueError, match='bundled profiles: cmap, nctcog'):
+        regions.load_profile('atlanta')
+    with pytest.raises(ValueError, match='No region profile'):
+        regions.load_profile(os.path.join('missing', 'atlanta.json'))
+
+
+def test_county_names_are_checked(tmp_path):
+    with pytest.raises(ValueError, match='113'):
+        regions.load_profile(write_profile(tmp_path, counties={'085': 'Collin', '113': 'Tarrant'}))
+    with pytest.raises(ValueError):
+        regions.load_profile(write_profile(tmp_path, counties={'085': 'Collin', '998': 'Nowhere'}))
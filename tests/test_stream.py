@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from tait import fetch, pipeline, stream
+
+STATE = '48'
+COUNTIES = ['085', '113', '121', '139']
+
+
+def quiet(message):
+    pass
+
+
+def test_county_partitions():
+    assert stream.county_partitions([['48', ['085', '113', '121']], ['17', ['031']]], 2) == [
+        ['48', ['085', '113']], ['48', ['121']], ['17', ['031']]]
+
+
+def test_ranked_fields_are_turned_away(settings, tmp_path):
+    settings['ranked_fields'] = [{'field': 'Pct_TotMin', 'rank': 'Min_RegPct'}]
+    with pytest.raises(ValueError):
+        stream.run(settings, '2019', [[STATE, COUNTIES]], str(tmp_path / 'TAIT'), message=quiet)
+
+
+def whole_region(settings):
+    request_plan = pipeline.plan(settings, STATE, COUNTIES, state_wide=False)
+    results = fetch.fetch_plan('2019', STATE, COUNTIES, request_plan, message=quiet)
+    bg, tract = pipeline.calculate(settings, request_plan, results, STATE, message=quiet)
+    return pipeline.bg_output(settings, bg), tract
+
+
+def plain_table(frame):
+    # frame with a plain index and string categories, as the Parquet round trip gives them. Partitions are written
+    # in county order and each one sorted by GEOID, so the rows are in the whole-region run's order already.
+    frame = frame.reset_index(drop=True)
+    columns = dict((name, frame[name].astype(str)) for name in frame.columns
+                   if isinstance(frame[name].dtype, pd.CategoricalDtype))
+    return frame.assign(**columns)
+
+
+@pytest.mark.parametrize('partition_size', [1, 3])
+def test_streamed_output_matches_a_whole_region_run(census_api, settings, tmp_path, partition_size):
+    bg, tract = whole_region(settings)
+    bg_path, tract_path = stream.run(settings, '2019', [[STATE, COUNTIES]], str(tmp_path / 'TAIT'), ['parquet'],
+                                     partition_size, prefetch=2, message=quiet)
+
+    for path, expected in [[bg_path, bg], [tract_path, tract]]:
+        pd.testing.assert_frame_equal(plain_table(pd.read_parquet(path)), plain_table(expected), check_dtype=False,
+                                      check_categorical=False)
@@ -0,0 +1,136 @@
+import json
+import threading
+
+import pytest
+
+from tait import fetch, trace
+
+POPULATION = [{'desc_name': 'Total_Pop', 'census_name': 'B01001_001E'}]
+
+
+@pytest.fixture
+def tracer():
+    tracer = trace.start(memory=False)
+    yield tracer
+    trace.stop()
+
+
+def test_spans_nest(tracer):
+    with trace.span('outer', county='085') as outer:
+        assert tracer.stack() == [outer]
+        with trace.span('inner') as inner:
+            assert tracer.stack() == [outer, inner]
+            trace.add(rows=5)
+            trace.add(rows=2, bytes=10)
+        trace.add(rows=1)
+    assert tracer.stack() == []
+    assert outer.args == {'county': '085', 'rows': 1}
+    assert inner.args == {'rows': 7, 'bytes': 10}
+    # Spans are recorded as they close.
+    assert tracer.spans == [inner, outer]
+    assert outer.start <= inner.start <= inner.end <= outer.end
+
+
+def test_errors_are_recorded(tracer):
+    with pytest.raises(KeyError):
+        with trace.span('parse'):
+            raise KeyError('B01001_001E')
+    assert tracer.spans[0].args == {'error': 'KeyError'}
+    assert tracer.stack() == []
+
+
+def test_every_thread_has_its_own_stack(tracer):
+    seen = {}
+
+    def worker():
+        with trace.span('request') as request_span:
+            seen['stack'] = list(tracer.stack())
+            trace.add(bytes=3)
+        seen['thread'] = request_span.thread
+
+    with trace.span('fetch') as fetch_span:
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert tracer.stack() == [fetch_span]
+    assert [span.name for span in seen['stack']] == ['request']
+    assert fetch_span.args == {}
+    assert seen['thread'] != fetch_span.thread
+    assert sorted(span.name for span in tracer.spans) == ['fetch', 'request']
+
+
+def test_summary_adds_up_spans_of_the_same_name(tracer):
+    for rows in [3, 4]:
+        with trace.span('parse') as parse_span:
+            parse_span.add(rows=rows, bytes=100)
+    with trace.span('write'):
+        pass
+    with trace.span('parse'):
+        pass
+    rows = trace.stop().summary()
+    assert [row['name'] for row in rows] == ['parse', 'write']
+    assert rows[0]['calls'] == 3
+    assert rows[0]['rows'] == 7
+    assert rows[0]['bytes'] == 200
+    assert rows[0]['max_seconds'] <= rows[0]['seconds']
+    assert rows[0]['peak_bytes'] is None
+    assert rows[1]['calls'] == 1 and rows[1]['rows'] == 0
+
+
+def test_summary_of_requests(census_api, tracer):
+    requests = [fetch.make_request(2019, POPULATION, '48', county, 'tract') for county in ['085', '113', '999']]
+    payloads = fetch.fetch_all(requests)
+    summary = dict((row['name'], row) for row in trace.stop().summary())
+    assert summary['request']['calls'] == 3
+    assert summary['request']['bytes'] == sum(len(fetch.fetch_body(request)) for request in requests)
+    assert summary['request']['rows'] == sum(len(payload) - 1 for payload in payloads if payload)
+
+
+def test_events_are_chrome_trace_complete_events(tracer, tmp_path):
+    with trace.span('fetch'):
+        with trace.span('request', county='085') as request_span:
+            request_span.add(bytes=20)
+    events = tracer.events()
+    assert [event['name'] for event in events] == ['fetch', 'request']
+    assert set(events[1]) == set(['name', 'ph', 'pid', 'tid', 'ts', 'dur', 'args'])
+    assert events[1]['ph'] == 'X'
+    assert events[1]['args'] == {'county': '085', 'bytes': 20}
+    assert events[0]['ts'] <= events[1]['ts']
+    assert events[1]['ts'] + events[1]['dur'] <= events[0]['ts'] + events[0]['dur'] + 0.2
+
+    path = tracer.write(str(tmp_path / 'trace.json'))
+    with open(path) as trace_file:
+        written = json.load(trace_file)
+    assert written == {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def test_memory_peaks_are_recorded_on_the_tracing_thread():
+    tracer = trace.start()
+    try:
+        with trace.span('derive') as derive_span:
+            data = bytearray(1 << 20)
+        del data
+    finally:
+        trace.stop()
+    assert derive_span.peak >= 1 << 20
+    assert tracer.events()[0]['args']['peak_bytes'] == derive_span.peak
+
+
+def test_nothing_is_recorded_while_tracing_is_off():
+    assert trace.stop() is None
+
+    @trace.traced('derive')
+    def derive(value):
+        trace.add(rows=1)
+        return value * 2
+
+    assert derive(21) == 42
+    assert trace.span('parse') is trace.NULL_SPAN
+    with trace.span('parse', county='085') as parse_span:
+        parse_span.add(rows=3)
+
+    tracer = trace.start(memory=False)
+    assert derive(1) == 2
+    trace.stop()
+    assert [(span.name, span.args) for span in tracer.spans] == [('derive', {'rows': 1})]
+    assert derive.__name__ == 'derive'